@@ -0,0 +1,398 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import DateTime, Float, Integer, and_, bindparam, case, delete, literal, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select, func, insert
+from models import (
+    Auto, Venta, ResumenVentasModelo, ResumenVentasMensual, ConteoFilas,
+    VentasPorMarca, VentasPorModelo, VentasMensuales, InventarioPorMarca, utcnow
+)
+
+# INSERT con soporte de ON CONFLICT según el motor
+def insert_on_conflict(session: Session, model):
+    dialects = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+    return dialects[session.get_bind().dialect.name](model)
+
+def periodo_of(fecha: datetime) -> str:
+    return fecha.strftime("%Y-%m")
+
+def _periodo_column(session: Session, columna):
+    if session.get_bind().dialect.name == "postgresql":
+        return func.to_char(columna, "YYYY-MM")
+    return func.strftime("%Y-%m", columna)
+
+# Mantenimiento incremental de los resúmenes
+@dataclass
+class ResumenAutoDelta:
+    """Variación del resumen de ventas de un auto (columnas `ventas_count`, `total_ventas`, `ultima_venta_*`)."""
+    cantidad: int = 0
+    total: float = 0.0
+    # Venta más reciente entre las agregadas: reemplaza a la última del auto si no es anterior
+    ultima: Optional[Tuple[datetime, float]] = None
+    # Se quitó una venta (baja o modificación): la última se vuelve a buscar en la tabla
+    recalcular: bool = False
+
+class VentaDeltas:
+    """
+    Acumula variaciones de (cantidad, total) por modelo y por mes para aplicarlas con un upsert por tabla, y
+    del resumen de ventas de cada auto para aplicarlas con un UPDATE de `auto`.
+    """
+
+    def __init__(self):
+        self.por_modelo: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0])
+        self.por_mes: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self.por_auto: Dict[int, List[float]] = defaultdict(lambda: [0, 0.0])
+        self.resumen_auto: Dict[int, ResumenAutoDelta] = defaultdict(ResumenAutoDelta)
+
+    def add_modelo(self, marca: str, modelo: str, cantidad: int, total: float):
+        acumulado = self.por_modelo[(marca, modelo)]
+        acumulado[0] += cantidad
+        acumulado[1] += total
+
+    def add_mes(self, periodo: str, cantidad: int, total: float):
+        acumulado = self.por_mes[periodo]
+        acumulado[0] += cantidad
+        acumulado[1] += total
+
+    def add_resumen_auto(self, auto_id: int, fecha_venta: datetime, precio: float, signo: int = 1):
+        resumen = self.resumen_auto[auto_id]
+        resumen.cantidad += signo
+        resumen.total += signo * precio
+        if signo < 0:
+            resumen.recalcular = True
+        elif resumen.ultima is None or fecha_venta >= resumen.ultima[0]:
+            resumen.ultima = (fecha_venta, precio)
+
+    def add(self, marca: str, modelo: str, fecha_venta: datetime, precio: float, signo: int = 1, auto_id: Optional[int] = None):
+        self.add_modelo(marca, modelo, signo, signo * precio)
+        self.add_mes(periodo_of(fecha_venta), signo, signo * precio)
+        if auto_id is not None:
+            self.add_resumen_auto(auto_id, fecha_venta, precio, signo)
+
+    def add_venta(self, auto_id: int, fecha_venta: datetime, precio: float, signo: int = 1):
+        """Como `add`, pero sin leer el auto: la marca/modelo se resuelven en el mismo upsert (INSERT ... SELECT)."""
+        acumulado = self.por_auto[auto_id]
+        acumulado[0] += signo
+        acumulado[1] += signo * precio
+        self.add_mes(periodo_of(fecha_venta), signo, signo * precio)
+        self.add_resumen_auto(auto_id, fecha_venta, precio, signo)
+
+    def add_auto(self, session: Session, auto: Auto, signo: int = 1, meses: bool = True):
+        """Suma (o resta) todas las ventas de un auto con una consulta agrupada por mes."""
+        periodo = _periodo_column(session, Venta.fecha_venta)
+        statement = (
+            select(periodo, func.count(Venta.id), func.sum(Venta.precio))
+            .where(Venta.auto_id == auto.id)
+            .group_by(periodo)
+        )
+        for mes, cantidad, total in session.exec(statement).all():
+            self.add_modelo(auto.marca, auto.modelo, signo * cantidad, signo * total)
+            if meses:
+                self.add_mes(mes, signo * cantidad, signo * total)
+
+    def apply(self, session: Session):
+        """Aplica las variaciones dentro de la transacción en curso (el commit lo hace el repositorio)."""
+        self._upsert(session, ResumenVentasModelo, ["marca", "modelo"], [
+            {"marca": marca, "modelo": modelo, "cantidad": c, "total": t}
+            for (marca, modelo), (c, t) in sorted(self.por_modelo.items()) if c or t
+        ])
+        for auto_id, (c, t) in sorted(self.por_auto.items()):
+            if c or t:
+                por_auto = select(Auto.marca, Auto.modelo, literal(c), literal(t, Float)).where(Auto.id == auto_id)
+                statement = insert_on_conflict(session, ResumenVentasModelo).from_select(["marca", "modelo", "cantidad", "total"], por_auto)
+                session.exec(VentaDeltas._sumar(statement, ResumenVentasModelo, ["marca", "modelo"]))
+        self._upsert(session, ResumenVentasMensual, ["periodo"], [
+            {"periodo": periodo, "cantidad": c, "total": t}
+            for periodo, (c, t) in sorted(self.por_mes.items()) if c or t
+        ])
+        self._apply_resumen_auto(session)
+
+    def _apply_resumen_auto(self, session: Session):
+        if not self.resumen_auto:
+            return
+        # Un UPDATE por auto en orden de id (orden de bloqueo estable entre transacciones), enviados como executemany.
+        # La última venta se compara con la del auto en la fila bloqueada: dos altas concurrentes no se pisan.
+        tabla = Auto.__table__
+        fecha = bindparam("b_fecha", type_=DateTime)
+        nueva = and_(fecha.isnot(None), or_(tabla.c.ultima_venta_fecha.is_(None), fecha >= tabla.c.ultima_venta_fecha))
+        statement = (
+            update(tabla)
+            .where(tabla.c.id == bindparam("b_id"))
+            .values(
+                ventas_count=tabla.c.ventas_count + bindparam("b_cantidad", type_=Integer),
+                total_ventas=tabla.c.total_ventas + bindparam("b_total", type_=Float),
+                ultima_venta_fecha=case((nueva, fecha), else_=tabla.c.ultima_venta_fecha),
+                ultimo_precio=case((nueva, bindparam("b_precio", type_=Float)), else_=tabla.c.ultimo_precio),
+                updated_at=utcnow(),
+            )
+        )
+        autos = sorted(self.resumen_auto.items())
+        filas = [
+            {
+                "b_id": auto_id,
+                "b_cantidad": r.cantidad,
+                "b_total": r.total,
+                "b_fecha": None if r.recalcular or r.ultima is None else r.ultima[0],
+                "b_precio": None if r.recalcular or r.ultima is None else r.ultima[1],
+            }
+            for auto_id, r in autos
+        ]
+        session.connection().execute(statement, filas)
+        recalcular = [auto_id for auto_id, r in autos if r.recalcular]
+        if recalcular:
+            # Sentencia aparte: en READ COMMITTED ve las ventas que otras transacciones confirmaron mientras
+            # se esperaba el bloqueo de la fila del auto
+            session.connection().execute(last_sale_update().where(tabla.c.id.in_(recalcular)))
+
+    @staticmethod
+    def _sumar(statement, model, claves: List[str]):
+        # ON CONFLICT: suma la variación a la fila existente
+        return statement.on_conflict_do_update(
+            index_elements=claves,
+            set_={
+                "cantidad": model.cantidad + statement.excluded.cantidad,
+                "total": model.total + statement.excluded.total,
+            },
+        )
+
+    @staticmethod
+    def _upsert(session: Session, model, claves: List[str], filas: List[dict]):
+        if not filas:
+            return
+        statement = insert_on_conflict(session, model).values(filas)
+        session.exec(VentaDeltas._sumar(statement, model, claves))
+
+# Contadores de filas
+def add_row_count(session: Session, tabla: str, delta: int):
+    """Suma `delta` al contador de filas de `tabla` dentro de la transacción en curso (el commit lo hace el repositorio)."""
+    if not delta:
+        return
+    statement = insert_on_conflict(session, ConteoFilas).values(tabla=tabla, cantidad=delta)
+    session.exec(statement.on_conflict_do_update(
+        index_elements=["tabla"],
+        set_={"cantidad": ConteoFilas.cantidad + statement.excluded.cantidad},
+    ))
+
+# Resumen de ventas por auto
+def last_sale_update():
+    """UPDATE de `auto` con la venta más reciente de cada auto (índice (auto_id, fecha_venta); NULL si no tiene ventas)."""
+    tabla = Auto.__table__
+    ultima = (
+        select(Venta.fecha_venta, Venta.precio)
+        .where(Venta.auto_id == tabla.c.id)
+        .order_by(Venta.fecha_venta.desc(), Venta.id.desc())
+        .limit(1)
+    )
+    return update(tabla).values(
+        ultima_venta_fecha=ultima.with_only_columns(Venta.fecha_venta).scalar_subquery(),
+        ultimo_precio=ultima.with_only_columns(Venta.precio).scalar_subquery(),
+        updated_at=utcnow(),
+    )
+
+def _resumen_auto_calculado():
+    """Resumen de ventas de cada auto con ventas, calculado desde `venta` (cantidad, total y la última venta)."""
+    agregado = (
+        select(Venta.auto_id, func.count(Venta.id).label("cantidad"), func.sum(Venta.precio).label("total"))
+        .group_by(Venta.auto_id)
+        .subquery()
+    )
+    orden = func.row_number().over(partition_by=Venta.auto_id, order_by=(Venta.fecha_venta.desc(), Venta.id.desc()))
+    ultimas = select(Venta.auto_id, Venta.fecha_venta, Venta.precio, orden.label("n")).subquery()
+    return (
+        select(agregado.c.auto_id, agregado.c.cantidad, agregado.c.total, ultimas.c.fecha_venta, ultimas.c.precio)
+        .join(ultimas, and_(ultimas.c.auto_id == agregado.c.auto_id, ultimas.c.n == 1))
+        .subquery()
+    )
+
+def auto_summary_mismatches(session: Session, limit: Optional[int] = None) -> List[int]:
+    """Ids de los autos cuyo resumen de ventas no coincide con la tabla `venta` (en orden de id)."""
+    calculado = _resumen_auto_calculado()
+    statement = (
+        select(Auto.id)
+        .outerjoin(calculado, calculado.c.auto_id == Auto.id)
+        .where(or_(
+            Auto.ventas_count != func.coalesce(calculado.c.cantidad, 0),
+            func.abs(Auto.total_ventas - func.coalesce(calculado.c.total, 0)) > 0.005,
+            Auto.ultima_venta_fecha.is_distinct_from(calculado.c.fecha_venta),
+            Auto.ultimo_precio.is_distinct_from(calculado.c.precio),
+        ))
+        .order_by(Auto.id)
+        .limit(limit)
+    )
+    return list(session.exec(statement).all())
+
+def rebuild_auto_summaries(session: Session, auto_ids: Optional[List[int]] = None) -> None:
+    """
+    Recalcula en bloque el resumen de ventas de los autos (de todos, o de `auto_ids`) dentro de la transacción
+    en curso: una sentencia pone en cero a los que no tienen ventas y un UPDATE ... FROM carga el resto.
+    """
+    tabla = Auto.__table__
+    calculado = _resumen_auto_calculado()
+    sin_ventas = (
+        update(tabla)
+        .where(~select(Venta.id).where(Venta.auto_id == tabla.c.id).exists())
+        .values(ventas_count=0, total_ventas=0.0, ultima_venta_fecha=None, ultimo_precio=None)
+    )
+    con_ventas = (
+        update(tabla)
+        .where(tabla.c.id == calculado.c.auto_id)
+        .values(
+            ventas_count=calculado.c.cantidad,
+            total_ventas=calculado.c.total,
+            ultima_venta_fecha=calculado.c.fecha_venta,
+            ultimo_precio=calculado.c.precio,
+        )
+    )
+    if auto_ids is not None:
+        sin_ventas = sin_ventas.where(tabla.c.id.in_(auto_ids))
+        con_ventas = con_ventas.where(tabla.c.id.in_(auto_ids))
+    session.connection().execute(sin_ventas)
+    session.connection().execute(con_ventas)
+
+# Reconstrucción completa
+def rebuild_summaries(session: Session) -> None:
+    """Recalcula los resúmenes, el resumen de ventas de cada auto y el contador de autos desde cero a partir de las tablas."""
+    session.exec(delete(ResumenVentasModelo))
+    session.exec(delete(ResumenVentasMensual))
+    session.exec(delete(ConteoFilas).where(ConteoFilas.tabla == "auto"))
+    session.exec(insert(ConteoFilas).from_select(["tabla", "cantidad"], select(literal("auto"), func.count(Auto.id))))
+    session.exec(insert(ResumenVentasModelo).from_select(
+        ["marca", "modelo", "cantidad", "total"],
+        select(Auto.marca, Auto.modelo, func.count(Venta.id), func.sum(Venta.precio))
+        .join(Auto, Auto.id == Venta.auto_id)
+        .group_by(Auto.marca, Auto.modelo)
+    ))
+    periodo = _periodo_column(session, Venta.fecha_venta)
+    session.exec(insert(ResumenVentasMensual).from_select(
+        ["periodo", "cantidad", "total"],
+        select(periodo, func.count(Venta.id), func.sum(Venta.precio)).group_by(periodo)
+    ))
+    rebuild_auto_summaries(session)
+    session.commit()
+
+def ensure_summaries(session: Session) -> None:
+    """Carga los resúmenes si están vacíos y ya existen ventas (por ejemplo, al incorporarlos a una base existente)."""
+    vacios = session.exec(select(ResumenVentasModelo.marca).limit(1)).first() is None
+    if vacios and session.exec(select(Venta.id).limit(1)).first() is not None:
+        rebuild_summaries(session)
+
+# Consultas
+def _promedio(cantidad: int, total: float) -> float:
+    return round(total / cantidad, 2) if cantidad else 0.0
+
+def _percentiles_by_marca(session: Session) -> Dict[str, Tuple[float, float]]:
+    if session.get_bind().dialect.name == "postgresql":
+        statement = (
+            select(
+                Auto.marca,
+                func.percentile_disc(0.5).within_group(Venta.precio),
+                func.percentile_disc(0.9).within_group(Venta.precio),
+            )
+            .join(Auto, Auto.id == Venta.auto_id)
+            .group_by(Auto.marca)
+        )
+    else:
+        # Percentil por rango más cercano (equivalente a percentile_disc) con funciones de ventana
+        ordenadas = (
+            select(
+                Auto.marca,
+                Venta.precio,
+                func.row_number().over(partition_by=Auto.marca, order_by=Venta.precio).label("rn"),
+                func.count().over(partition_by=Auto.marca).label("n"),
+            )
+            .join(Auto, Auto.id == Venta.auto_id)
+            .subquery()
+        )
+        statement = select(
+            ordenadas.c.marca,
+            func.min(case((ordenadas.c.rn >= 0.5 * ordenadas.c.n, ordenadas.c.precio))),
+            func.min(case((ordenadas.c.rn >= 0.9 * ordenadas.c.n, ordenadas.c.precio))),
+        ).group_by(ordenadas.c.marca)
+    return {marca: (p50, p90) for marca, p50, p90 in session.exec(statement).all()}
+
+def ventas_by_marca(session: Session, percentiles: bool = False) -> List[VentasPorMarca]:
+    cantidad = func.sum(ResumenVentasModelo.cantidad)
+    total = func.sum(ResumenVentasModelo.total)
+    statement = (
+        select(ResumenVentasModelo.marca, cantidad, total)
+        .group_by(ResumenVentasModelo.marca)
+        .having(cantidad > 0)
+        .order_by(total.desc())
+    )
+    por_marca = percentiles and _percentiles_by_marca(session)
+    resultado = []
+    for marca, c, t in session.exec(statement).all():
+        p50, p90 = por_marca.get(marca, (None, None)) if por_marca else (None, None)
+        resultado.append(VentasPorMarca(marca=marca, cantidad=c, total=round(t, 2), promedio=_promedio(c, t), p50=p50, p90=p90))
+    return resultado
+
+def ventas_by_modelo(session: Session, marca: Optional[str] = None) -> List[VentasPorModelo]:
+    statement = (
+        select(ResumenVentasModelo)
+        .where(ResumenVentasModelo.cantidad > 0)
+        .order_by(ResumenVentasModelo.total.desc())
+    )
+    if marca:
+        statement = statement.where(ResumenVentasModelo.marca == marca)
+    return [
+        VentasPorModelo(marca=r.marca, modelo=r.modelo, cantidad=r.cantidad, total=round(r.total, 2), promedio=_promedio(r.cantidad, r.total))
+        for r in session.exec(statement).all()
+    ]
+
+def ventas_monthly(session: Session, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[VentasMensuales]:
+    statement = (
+        select(ResumenVentasMensual)
+        .where(ResumenVentasMensual.cantidad > 0)
+        .order_by(ResumenVentasMensual.periodo)
+    )
+    if desde:
+        statement = statement.where(ResumenVentasMensual.periodo >= desde)
+    if hasta:
+        statement = statement.where(ResumenVentasMensual.periodo <= hasta)
+    return [
+        VentasMensuales(periodo=r.periodo, cantidad=r.cantidad, total=round(r.total, 2), promedio=_promedio(r.cantidad, r.total))
+        for r in session.exec(statement).all()
+    ]
+
+def autos_inventory(session: Session) -> List[InventarioPorMarca]:
+    # Del resumen de ventas del auto, sin consultar `venta`
+    vendido = case((Auto.ventas_count > 0, 1), else_=0)
+    statement = (
+        select(Auto.marca, func.count(Auto.id), func.sum(vendido), func.avg(Auto.anio))
+        .group_by(Auto.marca)
+        .order_by(Auto.marca)
+    )
+    return [
+        InventarioPorMarca(marca=marca, autos=autos, vendidos=vendidos, disponibles=autos - vendidos, anio_promedio=round(anio, 1))
+        for marca, autos, vendidos, anio in session.exec(statement).all()
+    ]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resúmenes de ventas (por modelo, por mes y por auto)")
+    comandos = parser.add_subparsers(dest="comando")
+    comandos.add_parser("reconstruir", help="Recalcula todos los resúmenes desde cero (por defecto)")
+    verificar = comandos.add_parser("verificar", help="Compara el resumen de ventas de cada auto con la tabla venta")
+    verificar.add_argument("--reparar", action="store_true", help="Recalcula el resumen de los autos que no coinciden")
+    args = parser.parse_args()
+    from database import engine
+
+    with Session(engine) as session:
+        if args.comando == "verificar":
+            distintos = auto_summary_mismatches(session)
+            if not distintos:
+                print("El resumen de ventas de todos los autos coincide con la tabla venta.")
+            elif args.reparar:
+                for desde in range(0, len(distintos), 10_000):
+                    rebuild_auto_summaries(session, distintos[desde:desde + 10_000])
+                session.commit()
+                print(f"Resumen de ventas recalculado en {len(distintos)} autos.")
+            else:
+                muestra = ", ".join(map(str, distintos[:20]))
+                raise SystemExit(f"{len(distintos)} autos con el resumen de ventas desactualizado (ids: {muestra}...). Usar --reparar")
+        else:
+            rebuild_summaries(session)
+            print("Resúmenes de ventas reconstruidos.")
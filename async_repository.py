@@ -0,0 +1,219 @@
+from typing import Optional, List, Protocol, AsyncIterator, Mapping, Sequence
+from datetime import datetime
+from sqlalchemy import Row
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Auto, Venta, AutoCreate, AutoUpdate, VentaCreate, VentaUpdate
+from repository import PostgresAutoRepository, PostgresVentaRepository, CollectionVersion, OnInsert
+from cache import auto_repository, venta_repository
+from replicas import get_replicas
+from batching import get_venta_writer
+from export import EXPORT_BATCH_SIZE
+
+# Interfaces (versión asíncrona de AutoRepository / VentaRepository)
+class AsyncAutoRepository(Protocol):
+    async def create(self, auto: AutoCreate, on_insert: Optional[OnInsert] = None) -> Auto: ...
+    async def get_by_id(self, auto_id: int) -> Optional[Auto]: ...
+    async def get_with_ventas(self, auto_id: int) -> Auto: ...
+    async def get_all(self, skip: int, limit: int, marca: Optional[str] = None, modelo: Optional[str] = None, cursor: Optional[str] = None, with_ventas: bool = False) -> List[Auto]: ...
+    async def get_rows(self, skip: int, limit: int, marca: Optional[str] = None, modelo: Optional[str] = None, cursor: Optional[str] = None, orden: str = "id", resumen: bool = False) -> List[Row]: ...
+    def next_cursor(self, autos: List[Auto], limit: int, orden: str = "id") -> Optional[str]: ...
+    async def collection_version(self, marca: Optional[str] = None, modelo: Optional[str] = None, with_total: bool = False) -> CollectionVersion: ...
+    async def estimate_count(self, marca: Optional[str] = None, modelo: Optional[str] = None) -> Optional[int]: ...
+    async def update(self, auto_id: int, auto_update: AutoUpdate, expected_versions: Optional[Sequence[int]] = None) -> Optional[Auto]: ...
+    async def delete(self, auto_id: int) -> bool: ...
+    async def get_by_chasis(self, numero_chasis: str) -> Optional[Auto]: ...
+    async def get_many(self, ids: Optional[List[int]] = None, numeros_chasis: Optional[List[str]] = None) -> List[Optional[Auto]]: ...
+    async def search(self, q: str, limit: int) -> List[Auto]: ...
+    async def bulk_create(self, autos: List[AutoCreate]) -> List[Optional[str]]: ...
+    def export(self, marca: Optional[str] = None, modelo: Optional[str] = None) -> AsyncIterator[List[Mapping]]: ...
+
+class AsyncVentaRepository(Protocol):
+    async def create(self, venta: VentaCreate, on_insert: Optional[OnInsert] = None) -> Venta: ...
+    async def get_by_id(self, venta_id: int) -> Optional[Venta]: ...
+    async def get_with_auto(self, venta_id: int) -> Venta: ...
+    async def get_many(self, ids: List[int]) -> List[Optional[Venta]]: ...
+    async def get_all(self, skip: int, limit: int, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, cursor: Optional[str] = None) -> List[Venta]: ...
+    async def get_rows(self, skip: int, limit: int, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, cursor: Optional[str] = None) -> List[Row]: ...
+    def next_cursor(self, ventas: List[Venta], limit: int) -> Optional[str]: ...
+    async def collection_version(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, with_total: bool = False) -> CollectionVersion: ...
+    async def estimate_count(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> Optional[int]: ...
+    async def update(self, venta_id: int, venta_update: VentaUpdate, expected_versions: Optional[Sequence[int]] = None) -> Optional[Venta]: ...
+    async def delete(self, venta_id: int) -> bool: ...
+    async def get_by_auto_id(self, auto_id: int) -> List[Venta]: ...
+    async def get_by_comprador(self, nombre: str) -> List[Venta]: ...
+    async def search(self, q: str, limit: int) -> List[Venta]: ...
+    async def bulk_create(self, ventas: List[VentaCreate]) -> List[Optional[str]]: ...
+    def export(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> AsyncIterator[List[Mapping]]: ...
+
+# Clases
+# Las consultas se escriben una sola vez en los repositorios sincrónicos y se ejecutan con
+# `AsyncSession.run_sync`, que corre el código sincrónico sobre la conexión asíncrona
+# (asyncpg / aiosqlite) sin ocupar un hilo del threadpool. Las lecturas por id / chasis pasan
+# por la caché configurada (ver cache.py).
+#
+# Las lecturas pesadas (`_read`) usan `read_session`, que con réplicas configuradas está sobre una
+# réplica (ver replicas.py); las escrituras y las lecturas que llenan la caché usan la primaria.
+async def _run_on(session: AsyncSession, factory, method: str, *args, **kwargs):
+    return await session.run_sync(lambda sync_session: getattr(factory(sync_session), method)(*args, **kwargs))
+
+async def _read_on(session: AsyncSession, read_session: AsyncSession, factory, method: str, *args, **kwargs):
+    if read_session is session:
+        return await _run_on(session, factory, method, *args, **kwargs)
+    try:
+        return await _run_on(read_session, factory, method, *args, **kwargs)
+    except (OperationalError, InterfaceError):
+        # Réplica caída o conexión cortada: la lectura se repite en la primaria y la réplica se verifica
+        await read_session.rollback()
+        if (replicas := get_replicas()) is not None:
+            await replicas.report_failure(read_session.bind)
+        return await _run_on(session, factory, method, *args, **kwargs)
+
+async def _stream(session: AsyncSession, statement, batch_size: int) -> AsyncIterator[List[Mapping]]:
+    # Cursor del lado del servidor: las filas se leen de a `batch_size` sin materializar el resultado
+    result = await session.stream(statement.execution_options(yield_per=batch_size))
+    async for filas in result.mappings().partitions():
+        yield filas
+
+class AsyncPostgresAutoRepository:
+
+    def __init__(self, session: AsyncSession, read_session: Optional[AsyncSession] = None):
+        self.session = session
+        self.read_session = read_session or session
+
+    async def _run(self, method: str, *args, **kwargs):
+        return await _run_on(self.session, auto_repository, method, *args, **kwargs)
+
+    async def _read(self, method: str, *args, **kwargs):
+        return await _read_on(self.session, self.read_session, auto_repository, method, *args, **kwargs)
+
+    async def create(self, auto: AutoCreate, on_insert: Optional[OnInsert] = None) -> Auto:
+        return await self._run("create", auto, on_insert)
+
+    async def get_by_id(self, auto_id: int) -> Optional[Auto]:
+        return await self._run("get_by_id", auto_id)
+
+    async def get_with_ventas(self, auto_id: int) -> Auto:
+        return await self._read("get_by_id", auto_id, with_ventas=True)
+
+    async def get_all(self, skip: int = 0, limit: int = 100, marca: Optional[str] = None, modelo: Optional[str] = None, cursor: Optional[str] = None, with_ventas: bool = False) -> List[Auto]:
+        return await self._read("get_all", skip=skip, limit=limit, marca=marca, modelo=modelo, cursor=cursor, with_ventas=with_ventas)
+
+    async def get_rows(self, skip: int = 0, limit: int = 100, marca: Optional[str] = None, modelo: Optional[str] = None, cursor: Optional[str] = None, orden: str = "id", resumen: bool = False) -> List[Row]:
+        return await self._read("get_rows", skip=skip, limit=limit, marca=marca, modelo=modelo, cursor=cursor, orden=orden, resumen=resumen)
+
+    def next_cursor(self, autos: List[Auto], limit: int, orden: str = "id") -> Optional[str]:
+        return PostgresAutoRepository.next_cursor(autos, limit, orden)
+
+    async def collection_version(self, marca: Optional[str] = None, modelo: Optional[str] = None, with_total: bool = False) -> CollectionVersion:
+        return await self._read("collection_version", marca=marca, modelo=modelo, with_total=with_total)
+
+    async def estimate_count(self, marca: Optional[str] = None, modelo: Optional[str] = None) -> Optional[int]:
+        return await self._read("estimate_count", marca=marca, modelo=modelo)
+
+    async def update(self, auto_id: int, auto_update: AutoUpdate, expected_versions: Optional[Sequence[int]] = None) -> Auto:
+        return await self._run("update", auto_id, auto_update, expected_versions)
+
+    async def delete(self, auto_id: int) -> bool:
+        return await self._run("delete", auto_id)
+
+    async def get_by_chasis(self, numero_chasis: str) -> Optional[Auto]:
+        return await self._run("get_by_chasis", numero_chasis)
+
+    async def get_many(self, ids: Optional[List[int]] = None, numeros_chasis: Optional[List[str]] = None) -> List[Optional[Auto]]:
+        return await self._run("get_many", ids=ids, numeros_chasis=numeros_chasis)
+
+    async def search(self, q: str, limit: int = 20) -> List[Auto]:
+        return await self._read("search", q, limit)
+
+    async def bulk_create(self, autos: List[AutoCreate]) -> List[Optional[str]]:
+        return await self._run("bulk_create", autos)
+
+    async def export(self, marca: Optional[str] = None, modelo: Optional[str] = None, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[Mapping]]:
+        statement = await self._read("export_statement", marca=marca, modelo=modelo)
+        async for filas in _stream(self.read_session, statement, batch_size):
+            yield filas
+
+class AsyncPostgresVentaRepository:
+
+    def __init__(self, session: AsyncSession, read_session: Optional[AsyncSession] = None):
+        self.session = session
+        self.read_session = read_session or session
+
+    async def _run(self, method: str, *args, **kwargs):
+        return await _run_on(self.session, venta_repository, method, *args, **kwargs)
+
+    async def _read(self, method: str, *args, **kwargs):
+        return await _read_on(self.session, self.read_session, venta_repository, method, *args, **kwargs)
+
+    async def create(self, venta: VentaCreate, on_insert: Optional[OnInsert] = None) -> Venta:
+        # Con VENTA_BATCHING la venta se inserta junto con las demás altas concurrentes (ver batching.py). Las
+        # que traen `on_insert` (Idempotency-Key) van por separado: su escritura comparte la transacción del alta
+        if on_insert is None and (writer := get_venta_writer()) is not None:
+            return await writer.create(venta)
+        return await self._run("create", venta, on_insert)
+
+    async def get_by_id(self, venta_id: int) -> Optional[Venta]:
+        return await self._run("get_by_id", venta_id)
+
+    async def get_with_auto(self, venta_id: int) -> Venta:
+        return await self._read("get_by_id", venta_id, with_auto=True)
+
+    async def get_many(self, ids: List[int]) -> List[Optional[Venta]]:
+        return await self._run("get_many", ids)
+
+    async def get_all(self, skip: int = 0, limit: int = 100, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, cursor: Optional[str] = None) -> List[Venta]:
+        return await self._read(
+            "get_all",
+            skip=skip,
+            limit=limit,
+            min_precio=min_precio,
+            max_precio=max_precio,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            cursor=cursor
+        )
+
+    async def get_rows(self, skip: int = 0, limit: int = 100, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, cursor: Optional[str] = None) -> List[Row]:
+        return await self._read(
+            "get_rows",
+            skip=skip,
+            limit=limit,
+            min_precio=min_precio,
+            max_precio=max_precio,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            cursor=cursor
+        )
+
+    def next_cursor(self, ventas: List[Venta], limit: int) -> Optional[str]:
+        return PostgresVentaRepository.next_cursor(ventas, limit)
+
+    async def collection_version(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, with_total: bool = False) -> CollectionVersion:
+        return await self._read("collection_version", min_precio=min_precio, max_precio=max_precio, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, with_total=with_total)
+
+    async def estimate_count(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> Optional[int]:
+        return await self._read("estimate_count", min_precio=min_precio, max_precio=max_precio, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+
+    async def update(self, venta_id: int, venta_update: VentaUpdate, expected_versions: Optional[Sequence[int]] = None) -> Venta:
+        return await self._run("update", venta_id, venta_update, expected_versions)
+
+    async def delete(self, venta_id: int) -> bool:
+        return await self._run("delete", venta_id)
+
+    async def get_by_auto_id(self, auto_id: int) -> List[Venta]:
+        return await self._read("get_by_auto_id", auto_id)
+
+    async def get_by_comprador(self, nombre: str) -> List[Venta]:
+        return await self._read("get_by_comprador", nombre)
+
+    async def search(self, q: str, limit: int = 20) -> List[Venta]:
+        return await self._read("search", q, limit)
+
+    async def bulk_create(self, ventas: List[VentaCreate]) -> List[Optional[str]]:
+        return await self._run("bulk_create", ventas)
+
+    async def export(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[Mapping]]:
+        statement = await self._read("export_statement", min_precio=min_precio, max_precio=max_precio, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+        async for filas in _stream(self.read_session, statement, batch_size):
+            yield filas
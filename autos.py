@@ -1,18 +1,34 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, Query, status, HTTPException
-from sqlmodel import Session
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, status, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from models import ( AutoCreate, AutoResponse, AutoUpdate, AutoResponseWithVentas, VentaResponse )
+from models import ( AutoCreate, AutoResponse, AutoResponseConResumen, AutoUpdate, AutoResponseWithVentas, VentaResponse, BulkImportResult, InventarioPorMarca, AutoBatchGet, AutoBatchItem )
 
-from repository import ( PostgresAutoRepository, NotFoundException, IntegrityError )
+from repository import ( NotFoundException, IntegrityError, PreconditionFailedException, ConflictException, AUTO_SORT_KEYS )
 
-from database import get_session
+from database import get_async_session
+from replicas import get_read_session
+from bulk import detect_format, import_rows
+from export import export_response
+from http_cache import conditional, entity_etag, collection_etag, if_match_versions
+from idempotency import IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, idempotent
+from serialization import LIST_FORMATS_DOC, negotiate_format, rows_response
+from pagination import set_total
+from analytics import autos_inventory
+from async_repository import AsyncPostgresAutoRepository
 
 router = APIRouter(prefix="/autos", tags=["Autos"])
 
-def get_auto_repo(session: Session = Depends(get_session)) -> PostgresAutoRepository:
+# Valores de `orden` en el listado (ver AUTO_SORT_KEYS en repository.py)
+ORDEN_AUTOS = f"^-?({'|'.join(AUTO_SORT_KEYS)})$"
+
+def get_auto_repo(
+    session: AsyncSession = Depends(get_async_session),
+    read_session: AsyncSession = Depends(get_read_session)
+) -> AsyncPostgresAutoRepository:
     """Proporciona una instancia del repositorio de Auto."""
-    return PostgresAutoRepository(session)
+    return AsyncPostgresAutoRepository(session, read_session)
 
 # Endpoints
 
@@ -22,81 +38,237 @@ def get_auto_repo(session: Session = Depends(get_session)) -> PostgresAutoReposi
     status_code=status.HTTP_201_CREATED,
     summary="Crear un nuevo Auto"
 )
-def create_auto(
+async def create_auto(
     auto: AutoCreate,
-    repo: PostgresAutoRepository = Depends(get_auto_repo)
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, min_length=1, max_length=MAX_KEY_LENGTH, description="Clave única de la operación: los reintentos con la misma clave reciben la respuesta original"),
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
 ):
     """
     Registra un nuevo vehículo en el inventario.
     - **Valida** que el número de chasis sea único.
     - **Valida** el rango de año de fabricación.
+    - Con `Idempotency-Key`, un reintento no vuelve a crear el auto: recibe la respuesta original.
     """
-    try:
-        return repo.create(auto)
-    except IntegrityError as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    async def crear(on_insert=None):
+        try:
+            return await repo.create(auto, on_insert)
+        except ValueError as e:
+            # Sólo los errores de dominio son un 400. Los inesperados (la base caída) se propagan como 5xx: con
+            # `Idempotency-Key` liberan la clave en lugar de guardar un 400 que se repetiría a cada reintento
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return await idempotent(idempotency_key, "autos", auto, crear, AutoResponse)
+
+@router.post(
+    "/bulk",
+    response_model=BulkImportResult,
+    summary="Importación Masiva de Autos"
+)
+async def bulk_import_autos(
+    request: Request,
+    formato: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Formato del archivo. Por defecto se deduce del `Content-Type`"),
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
+):
+    """
+    Importa autos desde un archivo CSV (con encabezado) o NDJSON enviado como cuerpo del request.
+
+    - **Valida** cada fila con las mismas reglas que `POST /autos/`.
+    - **Inserta** en lotes y verifica la unicidad del chasis por lote.
+    - Las filas con error se informan en `errores` (número de línea y motivo) sin abortar el resto del archivo.
+    """
+    return await import_rows(
+        request.stream(),
+        detect_format(request.headers.get("content-type"), formato),
+        AutoCreate,
+        repo.bulk_create
+    )
+
+@router.post(
+    "/batch-get",
+    response_model=List[AutoBatchItem],
+    summary="Obtener Varios Autos por ID o Chasis"
+)
+async def batch_get_autos(
+    consulta: AutoBatchGet,
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
+):
+    """
+    Obtiene varios autos en un solo request, por `ids` o por `numeros_chasis` (hasta 500).
+
+    - Los resultados respetan el orden de las claves pedidas.
+    - Las claves inexistentes se informan con `encontrado: false`.
+    """
+    claves = consulta.ids if consulta.ids is not None else consulta.numeros_chasis
+    autos = await repo.get_many(ids=consulta.ids, numeros_chasis=consulta.numeros_chasis)
+    return [AutoBatchItem(clave=clave, encontrado=auto is not None, auto=auto) for clave, auto in zip(claves, autos)]
 
 @router.get(
     "/",
-    response_model=List[AutoResponse],
+    response_model=List[AutoResponseConResumen],
+    responses=LIST_FORMATS_DOC,
     summary="Listar Autos con Paginación y Búsqueda"
 )
-def list_autos(
-    repo: PostgresAutoRepository = Depends(get_auto_repo),
+async def list_autos(
+    request: Request,
+    response: Response,
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo),
     skip: int = Query(0, ge=0, description="Número de registros a omitir (Paginación)"),
     limit: int = Query(100, le=1000, description="Número máximo de registros a devolver"),
     marca: Optional[str] = Query(None, description="Buscar por marca (parcial)"),
     modelo: Optional[str] =  Query(None, description="Buscar por modelo (parcial)"),  
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la página siguiente (header `X-Next-Cursor`). Si se envía, se ignora `skip`"),
+    include_total: bool = Query(False, description="Informar el total de autos del filtro en el header `X-Total-Count`"),
+    orden: str = Query("id", pattern=ORDEN_AUTOS, description="Orden: `id` o un campo del resumen de ventas (`ventas_count`, `total_ventas`, `ultima_venta_fecha`, `ultimo_precio`); con `-` delante, descendente"),
+    resumen_ventas: bool = Query(False, description="Incluir el resumen de ventas de cada auto (cantidad, total, fecha y precio de la última venta)"),
 ):
     """
     Obtiene la lista de autos, permitiendo paginación y filtros por marca/modelo.
+
+    - **Paginación por cursor:** si hay más resultados, el header `X-Next-Cursor` trae el cursor de la página siguiente.
+    - **ETag:** con `If-None-Match` responde `304 Not Modified` si ningún auto cambió, sin leer la página. Con
+      filtros y sin `include_total`, el ETag cubre toda la tabla (no cuenta las filas del filtro).
+    - Las filas se leen sólo con las columnas de la respuesta y se serializan directamente (sin entidades ORM).
+    - **Total:** con `include_total=true`, `X-Total-Count` trae el total del filtro. Si el conteo exacto excede
+      el presupuesto de tiempo, es una estimación y `X-Total-Count-Exact` vale `false`.
+    - **Formato:** según `Accept`, JSON (por defecto), JSON columnar (`application/vnd.columnar+json`) o MessagePack (`application/msgpack`).
+    - **Resumen de ventas:** con `resumen_ventas=true` (o con `orden` por uno de sus campos) cada auto trae
+      `ventas_count`, `total_ventas`, `ultima_venta_fecha` y `ultimo_precio`, guardados en la fila del auto
+      (sin leer sus ventas). Los autos sin ventas van al final en orden ascendente y al principio en descendente.
     """
-    return repo.get_all(skip=skip, limit=limit, marca=marca, modelo=modelo)
+    version = await repo.collection_version(marca=marca, modelo=modelo, with_total=include_total)
+    formato = negotiate_format(request.headers.get("accept"))
+    # Cada representación es una variante distinta del recurso: su ETag también
+    if not_modified := conditional(request, response, collection_etag(*version.validador, formato)):
+        return not_modified
+    if include_total:
+        total = version.total if version.total is not None else await repo.estimate_count(marca=marca, modelo=modelo)
+        set_total(response, total, exacto=version.total is not None)
+    resumen_ventas = resumen_ventas or orden != "id"
+    autos = await repo.get_rows(skip=skip, limit=limit, marca=marca, modelo=modelo, cursor=cursor, orden=orden, resumen=resumen_ventas)
+    next_cursor = repo.next_cursor(autos, limit, orden)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    columnas = AutoResponseConResumen.model_fields if resumen_ventas else AutoResponse.model_fields
+    return rows_response(autos, list(columnas), response, formato)
+
+@router.get(
+    "/with-ventas",
+    response_model=List[AutoResponseWithVentas],
+    summary="Listar Autos con su Historial de Ventas"
+)
+async def list_autos_with_ventas(
+    response: Response,
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo),
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (Paginación)"),
+    limit: int = Query(100, le=1000, description="Número máximo de registros a devolver"),
+    marca: Optional[str] = Query(None, description="Buscar por marca (parcial)"),
+    modelo: Optional[str] =  Query(None, description="Buscar por modelo (parcial)"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la página siguiente (header `X-Next-Cursor`). Si se envía, se ignora `skip`"),
+):
+    """
+    Obtiene una página de autos junto con sus ventas.
+    Las ventas de toda la página se cargan con una única consulta adicional (sin N+1).
+    """
+    autos = await repo.get_all(skip=skip, limit=limit, marca=marca, modelo=modelo, cursor=cursor, with_ventas=True)
+    next_cursor = repo.next_cursor(autos, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return autos
+
+@router.get(
+    "/search",
+    response_model=List[AutoResponse],
+    summary="Búsqueda Aproximada de Autos"
+)
+async def search_autos(
+    q: str = Query(..., min_length=1, description="Texto a buscar en marca o modelo"),
+    limit: int = Query(20, ge=1, le=100, description="Número máximo de resultados"),
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
+):
+    """Busca autos por marca o modelo (tolera errores de tipeo), ordenados por similitud."""
+    return await repo.search(q, limit)
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    summary="Exportar Autos (NDJSON o CSV)"
+)
+async def export_autos(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato de salida"),
+    marca: Optional[str] = Query(None, description="Buscar por marca (parcial)"),
+    modelo: Optional[str] = Query(None, description="Buscar por modelo (parcial)"),
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
+):
+    """
+    Exporta todos los autos que cumplen los filtros, en streaming.
+    Las filas se leen de la base en lotes con un cursor del servidor, por lo que el consumo de memoria no depende del total exportado.
+    """
+    return export_response(repo.export(marca=marca, modelo=modelo), formato, list(AutoResponse.model_fields), "autos")
+
+@router.get(
+    "/stats/inventory",
+    response_model=List[InventarioPorMarca],
+    summary="Inventario por Marca"
+)
+async def stats_inventory(
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Cantidad de autos por marca, cuántos tienen ventas registradas y año promedio."""
+    return await session.run_sync(autos_inventory)
 
 @router.get(
     "/{auto_id}",
     response_model=AutoResponse,
     summary="Obtener Auto por ID"
 )
-def get_auto(
+async def get_auto(
     auto_id: int,
-    repo: PostgresAutoRepository = Depends(get_auto_repo)
+    request: Request,
+    response: Response,
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
 ):
-    """Buscar y retorna un auto específico por su ID."""
+    """Buscar y retorna un auto específico por su ID. Soporta `If-None-Match` / `If-Modified-Since` (304)."""
     try:
-        return repo.get_by_id(auto_id)
+        auto = await repo.get_by_id(auto_id)
     except NotFoundException as e:
         raise e
+    return conditional(request, response, entity_etag(auto), auto.updated_at) or auto
     
 @router.put(
     "/{auto_id}",
     response_model=AutoResponse,
     summary="Actualizar Auto"
 )
-def update_auto(
+async def update_auto(
     auto_id: int,
     auto_update: AutoUpdate,
-    repo: PostgresAutoRepository = Depends(get_auto_repo)
+    request: Request,
+    response: Response,
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
 ):
-    """Actualiza la información de un auto existente."""
+    """
+    Actualiza la información de un auto existente. Con `If-Match` (el `ETag` de un GET) la actualización sólo se
+    aplica si nadie modificó el auto desde esa lectura; si no, responde `412 Precondition Failed`.
+    La respuesta incluye el `ETag` de la nueva versión.
+    """
     try:
-        return repo.update(auto_id, auto_update)
-    except (NotFoundException, IntegrityError) as e:
+        auto = await repo.update(auto_id, auto_update, if_match_versions(request))
+    except (NotFoundException, IntegrityError, PreconditionFailedException, ConflictException) as e:
         raise e
+    response.headers["ETag"] = entity_etag(auto)
+    return auto
     
 @router.delete(
     "/{auto_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Eliminar Auto"
 )
-def delete_auto(
+async def delete_auto(
     auto_id: int,
-    repo: PostgresAutoRepository = Depends(get_auto_repo)
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
 ):
     """Elimina un auto por su ID."""
-    if not repo.delete(auto_id):
+    if not await repo.delete(auto_id):
         raise NotFoundException(f"Auto con ID {auto_id} no encontrado para eliminar")
     return
 
@@ -105,28 +277,30 @@ def delete_auto(
     response_model=AutoResponse,
     summary="Buscar Auto por Número de Chasis"
 )
-def get_auto_by_chasis(
+async def get_auto_by_chasis(
     numero_chasis: str,
-    repo: PostgresAutoRepository = Depends(get_auto_repo)
+    request: Request,
+    response: Response,
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
 ):
     """Busca un auto específico por su número de chasis único."""
-    auto = repo.get_by_chasis(numero_chasis)
+    auto = await repo.get_by_chasis(numero_chasis)
     if not auto:
         raise NotFoundException(f"Auto con chasis {numero_chasis} no encontrado")
-    return auto
+    return conditional(request, response, entity_etag(auto), auto.updated_at) or auto
 
 @router.get(
     "/{auto_id}/with-ventas",
     response_model=AutoResponseWithVentas,
     summary="Obtener Auto con su Historial de Ventas"
 )
-def get_auto_with_ventas(
+async def get_auto_with_ventas(
     auto_id: int,
-    repo: PostgresAutoRepository = Depends(get_auto_repo)
+    repo: AsyncPostgresAutoRepository = Depends(get_auto_repo)
 ):
     """Retorna un auto junto con la lista completa de ventas asociadas."""
     try:
-        auto = repo.get_by_id(auto_id)
+        auto = await repo.get_with_ventas(auto_id)
         return auto
     except NotFoundException as e:
         raise e
\ No newline at end of file
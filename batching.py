@@ -0,0 +1,96 @@
+"""
+Micro-batching de las altas de ventas.
+
+Con `VENTA_BATCHING=true`, `POST /ventas/` no inserta cada venta en su propia transacción: las altas que llegan
+juntas se agrupan durante a lo sumo `VENTA_BATCH_MAX_WAIT_MS` milisegundos (o hasta `VENTA_BATCH_MAX_SIZE`
+ventas) y se crean con `PostgresVentaRepository.create_many`: una consulta para validar los autos, un
+INSERT multi-fila y un solo commit. Cada request recibe su venta o su error, igual que con `create`.
+
+En ráfagas, el costo del commit (fsync) se reparte entre todo el lote. Con tráfico bajo cada venta espera
+como máximo `VENTA_BATCH_MAX_WAIT_MS` antes de insertarse.
+"""
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from cache import venta_repository
+from config import get_settings
+from database import get_async_sessionmaker
+from models import Venta, VentaCreate
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    items: int = 0
+    max_batch: int = 0
+
+    def as_dict(self) -> dict:
+        promedio = round(self.items / self.batches, 2) if self.batches else 0.0
+        return {"batches": self.batches, "items": self.items, "max_batch": self.max_batch, "avg_batch": promedio}
+
+class VentaBatchWriter:
+    """
+    Acumula las altas concurrentes y las inserta por lotes. El lote se envía cuando se cumple el tiempo
+    máximo de espera desde su primera venta o cuando alcanza el tamaño máximo; mientras un lote se
+    inserta, el siguiente ya se acumula.
+    """
+
+    def __init__(self, max_wait: float, max_size: int):
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self.stats = BatchStats()
+        self._pendientes: List[Tuple[VentaCreate, asyncio.Future]] = []
+        self._temporizador: Optional[asyncio.TimerHandle] = None
+        self._en_curso: set = set()
+
+    async def create(self, venta: VentaCreate) -> Venta:
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes.append((venta, futuro))
+        if len(self._pendientes) >= self.max_size:
+            self._flush()
+        elif self._temporizador is None:
+            self._temporizador = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await futuro
+
+    def _flush(self) -> None:
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote, self._pendientes = self._pendientes, []
+        if lote:
+            tarea = asyncio.create_task(self._write(lote))
+            self._en_curso.add(tarea)
+            tarea.add_done_callback(self._en_curso.discard)
+
+    async def _write(self, lote: List[Tuple[VentaCreate, asyncio.Future]]) -> None:
+        ventas = [venta for venta, _ in lote]
+        try:
+            async with get_async_sessionmaker()() as session:
+                resultados = await session.run_sync(lambda sync_session: venta_repository(sync_session).create_many(ventas))
+        except Exception as e:
+            resultados = [e] * len(lote)
+        self.stats.batches += 1
+        self.stats.items += len(lote)
+        self.stats.max_batch = max(self.stats.max_batch, len(lote))
+        for (_, futuro), resultado in zip(lote, resultados):
+            if futuro.done():
+                # El request se canceló (cliente desconectado): la venta igual quedó registrada
+                continue
+            if isinstance(resultado, Exception):
+                futuro.set_exception(resultado)
+            else:
+                futuro.set_result(resultado)
+
+    async def close(self) -> None:
+        """Inserta lo pendiente y espera los lotes en curso (al apagar la aplicación)."""
+        self._flush()
+        if self._en_curso:
+            await asyncio.gather(*self._en_curso, return_exceptions=True)
+
+@lru_cache
+def get_venta_writer() -> Optional[VentaBatchWriter]:
+    """Writer de ventas por lotes, o `None` si `VENTA_BATCHING` está desactivado."""
+    settings = get_settings()
+    if not settings.venta_batching:
+        return None
+    return VentaBatchWriter(max_wait=settings.venta_batch_max_wait_ms / 1000, max_size=settings.venta_batch_max_size)
@@ -0,0 +1 @@
+"""Benchmarks de la API. Se ejecutan como módulos: `python -m benchmarks.<nombre>`."""
@@ -0,0 +1,117 @@
+"""Tormenta de reintentos de `POST /ventas/`, con y sin `Idempotency-Key`.
+
+Cada una de `--operaciones` altas se envía `--reintentos` veces a la vez (un cliente que reintenta tras un
+timeout mientras el primer intento sigue en curso). Cada modo corre en un proceso nuevo con la app en el
+mismo proceso (ASGI). Sin clave cada intento inserta una venta; con clave sólo el primero la inserta y los
+demás esperan y reciben su respuesta.
+
+Informa las ventas insertadas, las respuestas repetidas (`Idempotent-Replayed`), el throughput, la latencia y
+los códigos de estado. Termina con código 1 si con clave se inserta más de una venta por operación o si los
+intentos exitosos de una operación reciben respuestas distintas (un 500 por la base no cuenta como distinta).
+
+    python -m benchmarks.bench_idempotency --db-url sqlite:///bench_idempotency.db --operaciones 200 --reintentos 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+async def _tormenta(args, con_clave: bool) -> dict:
+    from main import app
+    import httpx
+
+    latencias, estados, repetidas, distintas = [], {}, 0, 0
+
+    async def operacion(n: int, client):
+        nonlocal repetidas, distintas
+        venta = {"nombre_comprador": f"Comprador {n}", "precio": 1_000 + n, "auto_id": 1 + n % args.autos}
+        headers = {"Idempotency-Key": str(uuid.uuid4())} if con_clave else {}
+
+        async def intento():
+            inicio = time.perf_counter()
+            r = await client.post("/ventas/", json=venta, headers=headers)
+            latencias.append(time.perf_counter() - inicio)
+            estados[r.status_code] = estados.get(r.status_code, 0) + 1
+            return r
+
+        respuestas = await asyncio.gather(*(intento() for _ in range(args.reintentos)))
+        repetidas += sum(1 for r in respuestas if r.headers.get("idempotent-replayed") == "true")
+        if con_clave and len({r.text for r in respuestas if r.status_code < 500}) > 1:
+            distintas += 1
+
+    async with app.router.lifespan_context(app):
+        # Los errores de la base (p. ej. "database is locked" en SQLite) se cuentan como 500, no cortan la tormenta
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            inicio = time.perf_counter()
+            await asyncio.gather(*(operacion(n, client) for n in range(args.operaciones)))
+            duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "rps": len(latencias) / duracion,
+        "p50": statistics.median(latencias) * 1000,
+        "p99": latencias[min(len(latencias) - 1, int(0.99 * len(latencias)))] * 1000,
+        "repetidas": repetidas,
+        "distintas": distintas,
+        "estados": estados,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default="sqlite:///bench_idempotency.db")
+    parser.add_argument("--autos", type=int, default=100)
+    parser.add_argument("--operaciones", type=int, default=200)
+    parser.add_argument("--reintentos", type=int, default=10, help="Intentos simultáneos de cada alta")
+    parser.add_argument("--modo", choices=["sin-clave", "con-clave"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        # Proceso hijo: la configuración ya viene en el entorno
+        print(json.dumps(asyncio.run(_tormenta(args, args.modo == "con-clave"))))
+        return
+
+    os.environ["DATABASE_URL"] = args.db_url
+    from sqlmodel import Session, select, func
+    from database import get_engine
+    from migrations import migrate
+    from models import Auto, Venta
+    from benchmarks.seed import seed
+
+    engine = get_engine()
+    migrate(engine)
+    with Session(engine) as session:
+        if session.exec(select(func.count(Auto.id))).one() < args.autos:
+            seed(engine, args.autos, 0)
+
+    def ventas() -> int:
+        with Session(engine) as session:
+            return session.exec(select(func.count(Venta.id))).one()
+
+    print(f"{args.operaciones} altas x {args.reintentos} intentos simultáneos\n")
+    print(f"{'modo':<12}{'insertadas':>12}{'repetidas':>11}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    fallas = []
+    for modo in ("sin-clave", "con-clave"):
+        antes = ventas()
+        resultado = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_idempotency", *sys.argv[1:], "--modo", modo],
+            env=os.environ, capture_output=True, text=True,
+        )
+        if resultado.returncode != 0:
+            sys.exit(resultado.stderr)
+        r = json.loads(resultado.stdout.strip().splitlines()[-1])
+        insertadas = ventas() - antes
+        print(f"{modo:<12}{insertadas:>12}{r['repetidas']:>11}{r['rps']:>9.0f}{r['p50']:>9.1f}{r['p99']:>9.1f}   {r['estados']}")
+        if modo == "con-clave" and (insertadas > args.operaciones or r["distintas"]):
+            fallas.append(f"{insertadas} ventas para {args.operaciones} operaciones, {r['distintas']} con respuestas distintas")
+
+    if fallas:
+        sys.exit(f"\nAltas duplicadas con Idempotency-Key: {'; '.join(fallas)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Compara la latencia de página de skip/limit contra la paginación por cursor a distintas profundidades.
+
+    python -m benchmarks.bench_pagination --autos 200000 --ventas 500000
+"""
+import argparse
+import statistics
+import time
+from sqlmodel import Session
+from repository import PostgresAutoRepository, PostgresVentaRepository
+from benchmarks.seed import make_engine, seed
+
+def _medir(fn, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite://", help="URL de la base de benchmark (se crean las tablas)")
+    parser.add_argument("--autos", type=int, default=100_000)
+    parser.add_argument("--ventas", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--no-seed", action="store_true", help="Usar los datos ya cargados en --url")
+    args = parser.parse_args()
+
+    engine = make_engine(args.url)
+    if not args.no_seed:
+        seed(engine, args.autos, args.ventas)
+
+    with Session(engine) as session:
+        repos = {
+            "autos": (PostgresAutoRepository(session), args.autos),
+            "ventas": (PostgresVentaRepository(session), args.ventas),
+        }
+        print(f"{'tabla':<8}{'profundidad':>14}{'skip/limit ms':>16}{'cursor ms':>12}")
+        for nombre, (repo, total) in repos.items():
+            for fraccion in (0, 0.25, 0.5, 0.75, 0.99):
+                skip = int(total * fraccion) // args.limit * args.limit
+                # El cursor equivalente sale de la fila anterior a la página (no se mide)
+                previa = repo.get_all(skip=skip - 1, limit=1) if skip else []
+                cursor = repo.next_cursor(previa, 1)
+                offset_ms = _medir(lambda: repo.get_all(skip=skip, limit=args.limit), args.repeticiones)
+                cursor_ms = _medir(lambda: repo.get_all(limit=args.limit, cursor=cursor), args.repeticiones)
+                session.expunge_all()
+                print(f"{nombre:<8}{skip:>14}{offset_ms:>16.2f}{cursor_ms:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Mide bytes y latencia por página de los listados según el formato (`Accept`) y la compresión (`Accept-Encoding`).
+
+Para cada combinación informa los bytes transferidos, la latencia del servidor (app en el mismo proceso vía
+ASGI), el tiempo del cliente para descomprimir y decodificar, y el total estimado en un enlace de `--mbps`.
+
+    python -m benchmarks.bench_payload --db-url sqlite:///bench.db --limit 1000 --mbps 5
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+
+FORMATOS = {
+    "json": "application/json",
+    "columnar": "application/vnd.columnar+json",
+    "msgpack": "application/msgpack",
+}
+CODIFICACIONES = ("identity", "gzip", "br")
+
+def _decodificar(cuerpo: bytes, codificacion: str, formato: str):
+    if codificacion == "gzip":
+        cuerpo = gzip.decompress(cuerpo)
+    elif codificacion == "br":
+        import brotli
+        cuerpo = brotli.decompress(cuerpo)
+    if formato == "msgpack":
+        import msgpack
+        return msgpack.unpackb(cuerpo)
+    return json.loads(cuerpo)
+
+async def _medir(client, ruta: str, formato: str, codificacion: str, repeticiones: int) -> dict:
+    headers = {"accept": FORMATOS[formato], "accept-encoding": codificacion}
+    latencias, decodificacion, tamanio = [], [], 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        async with client.stream("GET", ruta, headers=headers) as r:
+            cuerpo = b"".join([parte async for parte in r.aiter_raw()])
+            recibida = r.headers.get("content-encoding", "identity")
+            tipo = r.headers.get("content-type", "")
+        latencias.append(time.perf_counter() - inicio)
+        if tipo.split(";")[0] != FORMATOS[formato] or recibida != codificacion:
+            # Formato o codificación no disponibles (p. ej. sin los paquetes msgpack / brotli)
+            return {}
+        inicio = time.perf_counter()
+        _decodificar(cuerpo, codificacion, formato)
+        decodificacion.append(time.perf_counter() - inicio)
+        tamanio = len(cuerpo)
+    return {
+        "bytes": tamanio,
+        "servidor_ms": statistics.median(latencias) * 1000,
+        "cliente_ms": statistics.median(decodificacion) * 1000,
+    }
+
+async def _correr(args):
+    from main import app
+    import httpx
+
+    print(f"{'ruta':<24}{'formato':<10}{'codif.':<10}{'bytes':>10}{'servidor ms':>13}{'cliente ms':>12}{f'total ms @{args.mbps:g}Mbps':>20}")
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for ruta in (f"/autos/?limit={args.limit}", f"/ventas/?limit={args.limit}"):
+                base = None
+                for formato in FORMATOS:
+                    for codificacion in CODIFICACIONES:
+                        m = await _medir(client, ruta, formato, codificacion, args.repeticiones)
+                        if not m:
+                            print(f"{ruta:<24}{formato:<10}{codificacion:<10}{'(no disponible)':>10}")
+                            continue
+                        transferencia_ms = m["bytes"] * 8 / (args.mbps * 1_000_000) * 1000
+                        total = m["servidor_ms"] + m["cliente_ms"] + transferencia_ms
+                        base = base or m["bytes"]
+                        print(
+                            f"{ruta:<24}{formato:<10}{codificacion:<10}{m['bytes']:>10}{m['servidor_ms']:>13.2f}"
+                            f"{m['cliente_ms']:>12.2f}{total:>20.1f}   ({m['bytes'] / base:.0%} de los bytes)"
+                        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default="sqlite:///bench_payload.db")
+    parser.add_argument("--autos", type=int, default=5_000)
+    parser.add_argument("--ventas", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--mbps", type=float, default=5.0, help="Ancho de banda del enlace para estimar el tiempo de transferencia")
+    args = parser.parse_args()
+
+    # La app lee la configuración al importarse: la URL se fija antes
+    os.environ["DATABASE_URL"] = args.db_url
+    from sqlmodel import Session, select, func
+    from database import engine
+    from migrations import migrate
+    from models import Auto
+    from benchmarks.seed import seed
+
+    migrate(engine)
+    with Session(engine) as session:
+        if not session.exec(select(func.count(Auto.id))).one():
+            print(f"Cargando {args.autos} autos y {args.ventas} ventas...", file=sys.stderr)
+            seed(engine, args.autos, args.ventas)
+    asyncio.run(_correr(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compara el CPU por fila de los listados: entidades ORM + response_model contra filas de columnas + orjson.
+
+La ruta ORM reproduce lo que hace FastAPI con `response_model=List[...]`: crea las entidades en la sesión,
+las valida contra el modelo de respuesta, las convierte a tipos JSON y las serializa con `json.dumps`.
+
+    python -m benchmarks.bench_rows --autos 20000 --ventas 100000 --limits 100 1000
+"""
+import argparse
+import statistics
+import time
+from typing import List
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlmodel import Session
+from models import AutoResponse, VentaResponse
+from repository import PostgresAutoRepository, PostgresVentaRepository
+from serialization import dumps
+from benchmarks.seed import make_engine, seed
+
+def _cpu_por_fila(fn, filas: int, repeticiones: int) -> float:
+    """Mediana del tiempo de CPU (proceso) por fila, en microsegundos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        fn()
+        tiempos.append(time.process_time() - inicio)
+    return statistics.median(tiempos) / filas * 1_000_000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite://", help="URL de la base de benchmark (se crean las tablas)")
+    parser.add_argument("--autos", type=int, default=20_000)
+    parser.add_argument("--ventas", type=int, default=100_000)
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--no-seed", action="store_true", help="Usar los datos ya cargados en --url")
+    args = parser.parse_args()
+
+    engine = make_engine(args.url)
+    if not args.no_seed:
+        seed(engine, args.autos, args.ventas)
+
+    listados = [
+        ("autos", PostgresAutoRepository, TypeAdapter(List[AutoResponse])),
+        ("ventas", PostgresVentaRepository, TypeAdapter(List[VentaResponse])),
+    ]
+    print(f"{'listado':<10}{'limit':>7}{'ORM µs/fila':>14}{'filas µs/fila':>16}{'ahorro':>9}")
+    for nombre, repositorio, adapter in listados:
+        for limit in args.limits:
+            def orm():
+                # Sesión nueva por request, como en la app: el identity map arranca vacío
+                with Session(engine) as session:
+                    entidades = repositorio(session).get_all(limit=limit)
+                    JSONResponse(adapter.dump_python(adapter.validate_python(entidades, from_attributes=True), mode="json"))
+
+            def filas():
+                with Session(engine) as session:
+                    resultado = repositorio(session).get_rows(limit=limit)
+                    columnas = resultado[0]._fields
+                    dumps([dict(zip(columnas, fila)) for fila in resultado])
+
+            orm_us = _cpu_por_fila(orm, limit, args.repeticiones)
+            filas_us = _cpu_por_fila(filas, limit, args.repeticiones)
+            print(f"{nombre:<10}{limit:>7}{orm_us:>14.2f}{filas_us:>16.2f}{1 - filas_us / orm_us:>9.0%}")
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
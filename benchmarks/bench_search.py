@@ -0,0 +1,45 @@
+"""Compara el filtro `LIKE '%x%'` sin índice contra la búsqueda indexada por trigramas al crecer la tabla.
+
+    python -m benchmarks.bench_search --tamanios 10000 100000 500000
+"""
+import argparse
+import statistics
+import time
+from sqlmodel import Session, select, func
+from models import Auto
+from search import create_search_indexes, contains
+from benchmarks.seed import make_engine, seed
+
+def _medir(fn, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite://", help="Base vacía; con varios tamaños sólo la base en memoria se recrea entre corridas")
+    parser.add_argument("--tamanios", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--texto", default="Hilux")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'autos':>10}{'LIKE ms':>12}{'trigramas ms':>15}")
+    for tamanio in args.tamanios:
+        engine = make_engine(args.url)
+        seed(engine, tamanio, 0)
+        with Session(engine) as session:
+            patron = f"%{args.texto.lower()}%"
+            sin_indice = select(func.count()).where(func.lower(Auto.modelo).like(patron))
+            like_ms = _medir(lambda: session.exec(sin_indice).one(), args.repeticiones)
+        create_search_indexes(engine)
+        with Session(engine) as session:
+            indexada = select(func.count()).where(contains(session, Auto, "modelo", args.texto))
+            trgm_ms = _medir(lambda: session.exec(indexada).one(), args.repeticiones)
+        print(f"{tamanio:>10}{like_ms:>12.2f}{trgm_ms:>15.2f}")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
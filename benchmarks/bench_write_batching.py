@@ -0,0 +1,118 @@
+"""Ráfaga de `POST /ventas/` concurrentes con y sin micro-batching (`VENTA_BATCHING`).
+
+Cada modo corre en un proceso nuevo con la app en el mismo proceso (ASGI). Informa el throughput, la latencia
+(p50 / p95 / p99) y, con batching, la cantidad y el tamaño de los lotes. Un porcentaje de las ventas usa un
+`auto_id` inexistente para verificar que cada request recibe su propio error (404) sin afectar al resto.
+
+    python -m benchmarks.bench_write_batching --db-url sqlite:///bench_writes.db --clientes 200 --ventas 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+async def _rafaga(args) -> dict:
+    from main import app
+    import httpx
+
+    latencias, estados = [], {}
+    inicio_fechas = datetime(2024, 1, 1)
+
+    async def cliente(n: int, client):
+        rng = random.Random(n)
+        for _ in range(args.ventas // args.clientes):
+            auto_id = 10**9 if rng.random() < args.invalidas else rng.randint(1, args.autos)
+            venta = {
+                "nombre_comprador": f"Comprador {rng.randint(1, 10**6)}",
+                "precio": round(rng.uniform(1_000, 50_000), 2),
+                "fecha_venta": (inicio_fechas + timedelta(minutes=rng.randint(0, 500_000))).isoformat(),
+                "auto_id": auto_id,
+            }
+            inicio = time.perf_counter()
+            r = await client.post("/ventas/", json=venta)
+            latencias.append(time.perf_counter() - inicio)
+            estados[r.status_code] = estados.get(r.status_code, 0) + 1
+            if r.status_code in (201, 404) and (r.status_code == 404) != (auto_id == 10**9):
+                raise AssertionError(f"Respuesta inesperada {r.status_code} para auto_id={auto_id}: {r.text}")
+
+    async with app.router.lifespan_context(app):
+        # Los errores de la base (p. ej. "database is locked" en SQLite) se cuentan como 500, no cortan la ráfaga
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            inicio = time.perf_counter()
+            await asyncio.gather(*(cliente(n, client) for n in range(args.clientes)))
+            duracion = time.perf_counter() - inicio
+            lotes = (await client.get("/internal/batching")).json()
+
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000
+    return {
+        "requests": len(latencias),
+        "rps": len(latencias) / duracion,
+        "p50": statistics.median(latencias) * 1000,
+        "p95": percentil(0.95),
+        "p99": percentil(0.99),
+        "estados": estados,
+        "lotes": lotes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default="sqlite:///bench_writes.db")
+    parser.add_argument("--autos", type=int, default=1_000)
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--ventas", type=int, default=5_000)
+    parser.add_argument("--invalidas", type=float, default=0.01, help="Fracción de ventas con un auto inexistente")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-size", type=int, default=500)
+    parser.add_argument("--modo", choices=["individual", "lotes"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        # Proceso hijo: la configuración ya viene en el entorno
+        print(json.dumps(asyncio.run(_rafaga(args))))
+        return
+
+    os.environ["DATABASE_URL"] = args.db_url
+    from sqlmodel import Session, select, func
+    from database import engine
+    from migrations import migrate
+    from models import Auto
+    from benchmarks.seed import seed
+
+    migrate(engine)
+    with Session(engine) as session:
+        if session.exec(select(func.count(Auto.id))).one() < args.autos:
+            print(f"Cargando {args.autos} autos...", file=sys.stderr)
+            seed(engine, args.autos, 0)
+
+    print(f"{args.ventas} altas de {args.clientes} clientes concurrentes ({args.invalidas:.0%} con auto inexistente)\n")
+    print(f"{'modo':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'lotes':>8}{'tam. prom.':>12}{'tam. máx.':>11}")
+    for modo in ("individual", "lotes"):
+        env = {
+            **os.environ,
+            "VENTA_BATCHING": "true" if modo == "lotes" else "false",
+            "VENTA_BATCH_MAX_WAIT_MS": str(args.max_wait_ms),
+            "VENTA_BATCH_MAX_SIZE": str(args.max_size),
+        }
+        resultado = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_write_batching", *sys.argv[1:], "--modo", modo],
+            env=env, capture_output=True, text=True,
+        )
+        if resultado.returncode != 0:
+            sys.exit(resultado.stderr)
+        r = json.loads(resultado.stdout.strip().splitlines()[-1])
+        lotes = r["lotes"]
+        columnas_lotes = (
+            f"{lotes['batches']:>8}{lotes['avg_batch']:>12.1f}{lotes['max_batch']:>11}" if lotes["enabled"] else f"{'-':>8}{'-':>12}{'-':>11}"
+        )
+        print(f"{modo:<12}{r['rps']:>10.0f}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{columnas_lotes}   {r['estados']}")
+
+if __name__ == "__main__":
+    main()
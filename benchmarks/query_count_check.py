@@ -0,0 +1,90 @@
+"""Regresión de consultas N+1: cuenta las sentencias SQL de los endpoints que cargan relaciones.
+
+Carga autos con ventas y llama a cada endpoint con la app en el mismo proceso (ASGI), contando los eventos
+`before_cursor_execute` de todos los motores (la primaria y las réplicas) mientras dura el request. La cantidad
+de sentencias no debe depender de cuántas filas devuelve la página: `/autos/with-ventas` usa una consulta para
+los autos y otra (`selectinload`) para sus ventas, tanto con 10 como con 200 autos.
+
+Termina con código 1 si algún endpoint ejecuta más sentencias que su máximo.
+
+    python -m benchmarks.query_count_check --db-url sqlite:///query_count_check.db
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# (ruta, máximo de sentencias)
+ENDPOINTS = [
+    ("/autos/with-ventas?limit=10", 2),
+    ("/autos/with-ventas?limit=200", 2),
+    ("/autos/1/with-ventas", 2),
+    ("/ventas/1/with-auto", 2),
+]
+
+async def _contar(rutas) -> list:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from main import app
+    import httpx
+
+    contando = False
+    sentencias = 0
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        nonlocal sentencias
+        if contando:
+            sentencias += 1
+
+    # Escucha a nivel de clase: cubre los motores que la app crea de forma diferida (primaria y réplicas)
+    event.listen(Engine, "before_cursor_execute", _before)
+    resultados = []
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+                for ruta in rutas:
+                    contando, sentencias = True, 0
+                    r = await client.get(ruta)
+                    contando = False
+                    if r.status_code != 200:
+                        sys.exit(f"{ruta} respondió {r.status_code}: {r.text}")
+                    resultados.append((ruta, len(r.json()) if isinstance(r.json(), list) else 1, sentencias))
+    finally:
+        event.remove(Engine, "before_cursor_execute", _before)
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default="sqlite:///query_count_check.db")
+    parser.add_argument("--autos", type=int, default=300)
+    parser.add_argument("--ventas", type=int, default=3_000)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.db_url
+    from sqlmodel import Session, select, func
+    from database import get_engine
+    from migrations import migrate
+    from models import Auto
+    from benchmarks.seed import seed
+
+    engine = get_engine()
+    migrate(engine)
+    with Session(engine) as session:
+        if session.exec(select(func.count(Auto.id))).one() < args.autos:
+            seed(engine, args.autos, args.ventas)
+
+    print(f"{'endpoint':<32}{'filas':>7}{'sentencias':>12}{'máximo':>8}")
+    fallas = []
+    for ruta, filas, sentencias in asyncio.run(_contar([ruta for ruta, _ in ENDPOINTS])):
+        maximo = dict(ENDPOINTS)[ruta]
+        estado = "FALLA" if sentencias > maximo else "ok"
+        print(f"{ruta:<32}{filas:>7}{sentencias:>12}{maximo:>8}   {estado}")
+        if sentencias > maximo:
+            fallas.append(f"{ruta}: {sentencias} sentencias (máximo {maximo})")
+
+    if fallas:
+        sys.exit(f"\nConsultas de más (¿N+1?): {'; '.join(fallas)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session, create_engine
+from database import sync_connect_args
+from models import Auto, Venta
+from analytics import rebuild_summaries
+
+MARCAS = {
+    "Chevrolet": ["Cruze", "Onix", "Tracker", "S10"],
+    "Ford": ["Focus", "Ranger", "Ka", "Territory"],
+    "Toyota": ["Corolla", "Hilux", "Etios", "Yaris"],
+    "Volkswagen": ["Gol", "Amarok", "Polo", "Vento"],
+    "Renault": ["Sandero", "Kangoo", "Duster", "Logan"],
+}
+COMPRADORES = ["María Giménez", "Juan Pérez", "Lucía Fernández", "Carlos Gómez", "Ana Rodríguez", "Diego Martínez"]
+
+def make_engine(url: str = "sqlite://"):
+    """Crea el motor de la base de benchmark y sus tablas."""
+    engine = create_engine(url, connect_args=sync_connect_args(url))
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+def seed(engine, autos: int, ventas: int, batch: int = 10_000, semilla: int = 42, inicio: datetime = datetime(2015, 1, 1), dias: int = 10 * 365) -> None:
+    """Carga `autos` autos y `ventas` ventas con datos sintéticos reproducibles, con fechas en los `dias` desde `inicio`."""
+    rnd = random.Random(semilla)
+    marcas = list(MARCAS)
+    with engine.begin() as conn:
+        for desde in range(0, autos, batch):
+            filas = []
+            for i in range(desde, min(desde + batch, autos)):
+                marca = rnd.choice(marcas)
+                filas.append({
+                    "id": i + 1,
+                    "marca": marca,
+                    "modelo": rnd.choice(MARCAS[marca]),
+                    "anio": rnd.randint(1995, 2024),
+                    "numero_chasis": f"CHS{i:012d}",
+                })
+            conn.execute(insert(Auto.__table__), filas)
+        for desde in range(0, ventas, batch):
+            filas = []
+            for i in range(desde, min(desde + batch, ventas)):
+                filas.append({
+                    "id": i + 1,
+                    "nombre_comprador": rnd.choice(COMPRADORES),
+                    "precio": round(rnd.uniform(5_000, 80_000), 2),
+                    "fecha_venta": inicio + timedelta(minutes=rnd.randint(0, dias * 24 * 60)),
+                    "auto_id": rnd.randint(1, autos),
+                })
+            conn.execute(insert(Venta.__table__), filas)
+        if engine.dialect.name == "postgresql":
+            # Los ids se insertaron explícitamente: las secuencias deben continuar después del último
+            for tabla in ("auto", "venta"):
+                conn.exec_driver_sql(f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), COALESCE(MAX(id), 1)) FROM {tabla}")
+    # Los resúmenes de ventas se mantienen desde el repositorio: se recalculan tras la carga directa
+    with Session(engine) as session:
+        rebuild_summaries(session)
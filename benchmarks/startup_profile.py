@@ -0,0 +1,110 @@
+"""Perfil del arranque en frío de un worker: tiempo de import por módulo y tiempo hasta el primer request.
+
+Cada medición corre en un intérprete nuevo, como un worker de uvicorn recién lanzado: import de `main`,
+arranque de la app (lifespan: esquema y precalentamiento del pool) y primer `GET /`. Se compara
+`SCHEMA_MODE=migrate` con `SCHEMA_MODE=verify`.
+
+Con `--presupuesto-ms` el script termina con código 1 si la mediana del arranque en frío de algún modo
+lo excede, para usarlo como verificación en CI:
+
+    python -m benchmarks.startup_profile --db-url sqlite:///startup.db --presupuesto-ms 2500
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Se ejecuta en el proceso hijo: mide cada fase desde adentro del worker
+_WORKER = """
+import asyncio, json, time
+inicio = time.perf_counter()
+from main import app
+importado = time.perf_counter()
+
+async def correr():
+    import httpx
+    async with app.router.lifespan_context(app):
+        iniciado = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            r = await client.get("/")
+            r.raise_for_status()
+        return iniciado, time.perf_counter()
+
+iniciado, respondido = asyncio.run(correr())
+print(json.dumps({"import": importado - inicio, "lifespan": iniciado - importado, "primer_request": respondido - iniciado}))
+"""
+
+def _entorno(db_url: str, schema_mode: str) -> dict:
+    return {**os.environ, "DATABASE_URL": db_url, "SCHEMA_MODE": schema_mode}
+
+def import_times(db_url: str) -> list:
+    """(módulo, propio_ms, acumulado_ms) de `python -X importtime -c 'import main'`."""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=RAIZ, env=_entorno(db_url, "migrate"), capture_output=True, text=True, check=True,
+    )
+    filas = []
+    for linea in resultado.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)", linea)
+        if m:
+            filas.append((m.group(3), int(m.group(1)) / 1000, int(m.group(2)) / 1000))
+    return filas
+
+def cold_start(db_url: str, schema_mode: str) -> dict:
+    """Fases de un arranque en frío; `total` incluye el inicio del intérprete."""
+    inicio = time.perf_counter()
+    resultado = subprocess.run(
+        [sys.executable, "-c", _WORKER],
+        cwd=RAIZ, env=_entorno(db_url, schema_mode), capture_output=True, text=True, check=True,
+    )
+    total = time.perf_counter() - inicio
+    fases = json.loads(resultado.stdout.strip().splitlines()[-1])
+    return {**fases, "total": total}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default="sqlite:///startup_profile.db")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Módulos a listar, por tiempo acumulado")
+    parser.add_argument("--presupuesto-ms", type=float, default=None, help="Tiempo máximo de arranque en frío (mediana)")
+    args = parser.parse_args()
+
+    # Esquema al día antes de medir: el modo verify falla sobre una base sin migrar
+    subprocess.run([sys.executable, "migrations.py"], cwd=RAIZ, env=_entorno(args.db_url, "migrate"), check=True, capture_output=True)
+
+    modulos = import_times(args.db_url)
+    propios = {p.stem for p in RAIZ.glob("*.py")}
+    print(f"Import de `main`: {max(acumulado for _, _, acumulado in modulos):.1f} ms\n")
+    print(f"{'módulo':<40}{'propio ms':>12}{'acumulado ms':>15}")
+    for nombre, propio, acumulado in sorted(modulos, key=lambda f: f[2], reverse=True)[:args.top]:
+        print(f"{nombre:<40}{propio:>12.1f}{acumulado:>15.1f}")
+    print("\nMódulos de la aplicación")
+    for nombre, propio, acumulado in sorted((f for f in modulos if f[0] in propios), key=lambda f: f[2], reverse=True):
+        print(f"{nombre:<40}{propio:>12.1f}{acumulado:>15.1f}")
+
+    print(f"\nArranque en frío (mediana de {args.repeticiones}, ms)")
+    print(f"{'modo':<10}{'import':>10}{'lifespan':>10}{'1er req':>10}{'total':>10}")
+    excedidos = []
+    for modo in ("migrate", "verify"):
+        corridas = [cold_start(args.db_url, modo) for _ in range(args.repeticiones)]
+        mediana = {fase: statistics.median(c[fase] for c in corridas) * 1000 for fase in corridas[0]}
+        print(f"{modo:<10}{mediana['import']:>10.1f}{mediana['lifespan']:>10.1f}{mediana['primer_request']:>10.1f}{mediana['total']:>10.1f}")
+        if args.presupuesto_ms is not None and mediana["total"] > args.presupuesto_ms:
+            excedidos.append(f"{modo}: {mediana['total']:.0f} ms")
+
+    if args.presupuesto_ms is not None:
+        if excedidos:
+            print(f"\nArranque en frío por encima del presupuesto de {args.presupuesto_ms:.0f} ms: {', '.join(excedidos)}")
+            sys.exit(1)
+        print(f"\nArranque en frío dentro del presupuesto de {args.presupuesto_ms:.0f} ms.")
+
+if __name__ == "__main__":
+    main()
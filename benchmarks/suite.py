@@ -0,0 +1,332 @@
+"""Suite de benchmarks de la API: recorre todas las rutas de `autos.py` y `ventas.py` con N clientes concurrentes
+y guarda p50/p95/p99, throughput y consultas por request en JSON. El modo `compare` marca regresiones entre dos corridas.
+
+    # Base de benchmark (SQLite por defecto; para PostgreSQL pasar --db-url o DATABASE_URL)
+    python -m benchmarks.suite run --autos 1000000 --ventas 5000000 --output base.json
+    # ...cambios en repository.py / models.py...
+    python -m benchmarks.suite run --output nuevo.json
+    python -m benchmarks.suite compare base.json nuevo.json --umbral 0.10
+
+Por defecto la app corre en el mismo proceso (cliente ASGI, sin red). Con `--base-url` se mide un servidor real
+(`METRICS_ENABLED=true uvicorn main:app`), que debe usar la misma base que se pasa con `--db-url` para la carga.
+Las consultas por request se leen del header `Server-Timing` (ver metrics.py); en los exports sólo incluyen las
+previas al streaming, porque el header se envía antes del cuerpo.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+
+DEFAULT_DB_URL = "sqlite:///bench.db"
+MARCA_BENCH = "(bench)"
+
+# Escenarios
+@dataclass
+class Escenario:
+    nombre: str
+    metodo: str
+    # (random, contexto de la corrida) -> (path, kwargs de httpx)
+    request: Callable[[random.Random, "Contexto"], Tuple[str, dict]]
+    # Fracción de `--requests` para rutas costosas (export, bulk)
+    peso: float = 1.0
+
+class Contexto:
+    """Datos de la corrida compartidos por los escenarios (tamaño de la base e ids creados para borrar)."""
+
+    def __init__(self, autos: int, ventas: int):
+        self.autos = autos
+        self.ventas = ventas
+        self.corrida = f"{int(time.time()):x}"
+        self.secuencia = 0
+        self.autos_creados: List[int] = []
+        self.ventas_creadas: List[int] = []
+
+    def chasis(self) -> str:
+        self.secuencia += 1
+        return f"BENCH{self.corrida}{self.secuencia:08d}".upper()
+
+def _fecha(rnd: random.Random) -> str:
+    return (datetime(2015, 1, 1) + timedelta(minutes=rnd.randint(0, 10 * 365 * 24 * 60))).isoformat()
+
+def _auto(rnd: random.Random, ctx: Contexto) -> dict:
+    from benchmarks.seed import MARCAS
+    marca = rnd.choice(list(MARCAS))
+    return {"marca": marca, "modelo": rnd.choice(MARCAS[marca]), "anio": rnd.randint(1995, 2024), "numero_chasis": ctx.chasis()}
+
+def _venta(rnd: random.Random, ctx: Contexto) -> dict:
+    from benchmarks.seed import COMPRADORES
+    return {
+        # Marcadas para distinguirlas de las ventas de la carga (ver _preparar_base)
+        "nombre_comprador": f"{rnd.choice(COMPRADORES)} {MARCA_BENCH}",
+        "precio": round(rnd.uniform(5_000, 80_000), 2),
+        "fecha_venta": _fecha(rnd),
+        "auto_id": rnd.randint(1, ctx.autos),
+    }
+
+def _csv(filas: List[dict]) -> str:
+    columnas = list(filas[0])
+    return "\n".join([",".join(columnas)] + [",".join(str(f[c]) for c in columnas) for f in filas]) + "\n"
+
+def _rango_fechas(rnd: random.Random) -> str:
+    inicio = datetime.fromisoformat(_fecha(rnd))
+    return f"fecha_inicio={inicio.isoformat()}&fecha_fin={(inicio + timedelta(days=1)).isoformat()}"
+
+ESCENARIOS: List[Escenario] = [
+    # Autos
+    Escenario("autos.create", "POST", lambda r, c: ("/autos/", {"json": _auto(r, c)})),
+    Escenario("autos.bulk", "POST", lambda r, c: ("/autos/bulk", {
+        "content": _csv([_auto(r, c) for _ in range(100)]), "headers": {"Content-Type": "text/csv"}
+    }), peso=0.1),
+    Escenario("autos.list", "GET", lambda r, c: (f"/autos/?skip={r.randint(0, max(c.autos - 100, 0))}&limit=100", {})),
+    Escenario("autos.list_filtrado", "GET", lambda r, c: ("/autos/?marca=toy&modelo=cor&limit=100", {})),
+    Escenario("autos.with_ventas", "GET", lambda r, c: (f"/autos/with-ventas?skip={r.randint(0, max(c.autos - 50, 0))}&limit=50", {})),
+    Escenario("autos.search", "GET", lambda r, c: (f"/autos/search?q={r.choice(['toyota', 'corola', 'ranger', 'amarok'])}", {})),
+    Escenario("autos.export", "GET", lambda r, c: ("/autos/export?marca=Renault&modelo=Logan", {}), peso=0.05),
+    Escenario("autos.stats_inventory", "GET", lambda r, c: ("/autos/stats/inventory", {}), peso=0.2),
+    Escenario("autos.get", "GET", lambda r, c: (f"/autos/{r.randint(1, c.autos)}", {})),
+    Escenario("autos.get_chasis", "GET", lambda r, c: (f"/autos/chasis/CHS{r.randint(0, c.autos - 1):012d}", {})),
+    Escenario("autos.get_with_ventas", "GET", lambda r, c: (f"/autos/{r.randint(1, c.autos)}/with-ventas", {})),
+    Escenario("autos.update", "PUT", lambda r, c: (f"/autos/{r.randint(1, c.autos)}", {"json": {"anio": r.randint(1995, 2024)}})),
+    # Ventas
+    Escenario("ventas.create", "POST", lambda r, c: ("/ventas/", {"json": _venta(r, c)})),
+    Escenario("ventas.bulk", "POST", lambda r, c: ("/ventas/bulk", {
+        "content": "\n".join(json.dumps(_venta(r, c)) for _ in range(100)), "headers": {"Content-Type": "application/x-ndjson"}
+    }), peso=0.1),
+    Escenario("ventas.list", "GET", lambda r, c: (f"/ventas/?skip={r.randint(0, max(c.ventas - 100, 0))}&limit=100", {})),
+    Escenario("ventas.list_filtrado", "GET", lambda r, c: (f"/ventas/?{_rango_fechas(r)}&min_precio=20000&limit=100", {})),
+    Escenario("ventas.search", "GET", lambda r, c: (f"/ventas/search?q={r.choice(['perez', 'gimenez', 'fernandes', 'gomez'])}", {})),
+    Escenario("ventas.export", "GET", lambda r, c: (f"/ventas/export?{_rango_fechas(r)}", {}), peso=0.05),
+    Escenario("ventas.stats_by_marca", "GET", lambda r, c: ("/ventas/stats/by-marca", {}), peso=0.2),
+    Escenario("ventas.stats_by_modelo", "GET", lambda r, c: ("/ventas/stats/by-modelo", {}), peso=0.2),
+    Escenario("ventas.stats_monthly", "GET", lambda r, c: ("/ventas/stats/monthly", {}), peso=0.2),
+    Escenario("ventas.get", "GET", lambda r, c: (f"/ventas/{r.randint(1, c.ventas)}", {})),
+    Escenario("ventas.by_auto", "GET", lambda r, c: (f"/ventas/auto/{r.randint(1, c.autos)}", {})),
+    Escenario("ventas.by_comprador", "GET", lambda r, c: (f"/ventas/comprador/{r.choice(['Perez', 'Gomez', 'Lucia'])}", {}), peso=0.2),
+    Escenario("ventas.get_with_auto", "GET", lambda r, c: (f"/ventas/{r.randint(1, c.ventas)}/with-auto", {})),
+    Escenario("ventas.update", "PUT", lambda r, c: (f"/ventas/{r.randint(1, c.ventas)}", {"json": {"precio": round(r.uniform(5_000, 80_000), 2)}})),
+    # Las bajas usan las filas creadas por los escenarios anteriores, para no alterar los datos de la carga
+    Escenario("ventas.delete", "DELETE", lambda r, c: (f"/ventas/{c.ventas_creadas.pop()}", {})),
+    Escenario("autos.delete", "DELETE", lambda r, c: (f"/autos/{c.autos_creados.pop()}", {})),
+]
+
+# Medición
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+def _percentil(ordenadas: List[float], p: float) -> float:
+    # Rango más cercano
+    return ordenadas[max(math.ceil(p * len(ordenadas)) - 1, 0)]
+
+async def _medir(client: httpx.AsyncClient, escenario: Escenario, ctx: Contexto, requests: int, concurrencia: int, rnd: random.Random) -> Optional[dict]:
+    latencias: List[float] = []
+    queries: List[int] = []
+    errores = 0
+    pendientes = iter(range(requests))
+
+    async def cliente():
+        nonlocal errores
+        for _ in pendientes:
+            try:
+                path, kwargs = escenario.request(rnd, ctx)
+            except IndexError:
+                # No quedan filas creadas para borrar
+                return
+            inicio = time.perf_counter()
+            try:
+                r = await client.request(escenario.metodo, path, **kwargs)
+                # Los exports se leen completos: la latencia incluye el streaming del cuerpo
+                await r.aread()
+            except httpx.HTTPError:
+                errores += 1
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            if r.status_code >= 400:
+                errores += 1
+            elif r.status_code == 201 and escenario.nombre == "autos.create":
+                ctx.autos_creados.append(r.json()["id"])
+            elif r.status_code == 201 and escenario.nombre == "ventas.create":
+                ctx.ventas_creadas.append(r.json()["id"])
+            coincidencia = _QUERIES.search(r.headers.get("server-timing", ""))
+            if coincidencia:
+                queries.append(int(coincidencia.group(1)))
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    if not latencias:
+        return None
+    latencias.sort()
+    return {
+        "requests": len(latencias),
+        "errores": errores,
+        "rps": round(len(latencias) / duracion, 2),
+        "media_ms": round(sum(latencias) / len(latencias) * 1000, 3),
+        "p50_ms": round(_percentil(latencias, 0.50) * 1000, 3),
+        "p95_ms": round(_percentil(latencias, 0.95) * 1000, 3),
+        "p99_ms": round(_percentil(latencias, 0.99) * 1000, 3),
+        "queries_por_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+# Carga de datos
+def _preparar_base(autos: int, ventas: int, recargar: bool) -> Tuple[int, int]:
+    """Crea y carga la base si está vacía (o con `--recargar`). Devuelve la cantidad de autos y ventas."""
+    from sqlmodel import Session, SQLModel, select, func
+    from database import engine
+    from migrations import migrate, schema_version
+    from models import Auto, Venta
+    from benchmarks.seed import seed
+
+    engine.echo = False
+    if recargar:
+        SQLModel.metadata.drop_all(engine)
+        schema_version.drop(engine, checkfirst=True)
+    migrate(engine)
+    with Session(engine) as session:
+        existentes = session.exec(select(func.count(Auto.id))).one()
+    if not existentes:
+        print(f"Cargando {autos} autos y {ventas} ventas...", file=sys.stderr)
+        inicio = time.perf_counter()
+        seed(engine, autos, ventas)
+        print(f"Carga completa en {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+    with Session(engine) as session:
+        # Se mide sobre los ids de la carga original (1..N): las filas creadas por corridas anteriores quedan fuera del rango
+        return (
+            session.exec(select(func.count(Auto.id)).where(Auto.numero_chasis.like("CHS%"))).one(),
+            session.exec(select(func.count(Venta.id)).where(Venta.nombre_comprador.not_like(f"%{MARCA_BENCH}"))).one(),
+        )
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args) -> dict:
+    os.environ["DATABASE_URL"] = args.db_url
+    # Las consultas por request se obtienen del header Server-Timing
+    os.environ.setdefault("METRICS_ENABLED", "true")
+
+    autos, ventas = _preparar_base(args.autos, args.ventas, args.recargar)
+    ctx = Contexto(autos, ventas)
+    rnd = random.Random(args.semilla)
+    seleccion = set(args.rutas) if args.rutas else None
+
+    from main import app
+    limites = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    resultados: Dict[str, dict] = {}
+
+    async def correr(client):
+        for escenario in ESCENARIOS:
+            if seleccion and escenario.nombre not in seleccion:
+                continue
+            requests = max(1, int(args.requests * escenario.peso))
+            resultado = await _medir(client, escenario, ctx, requests, args.concurrencia, rnd)
+            if resultado:
+                resultados[escenario.nombre] = resultado
+                print(f"{escenario.nombre:<26}{resultado['p50_ms']:>10.2f}{resultado['p95_ms']:>10.2f}{resultado['p99_ms']:>10.2f}{resultado['rps']:>10.1f}", file=sys.stderr)
+
+    print(f"{'ruta':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}", file=sys.stderr)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limites, timeout=120) as client:
+            await correr(client)
+    else:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                await correr(client)
+
+    from sqlalchemy.engine import make_url
+    return {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "base": make_url(args.db_url).get_backend_name(),
+            "autos": autos,
+            "ventas": ventas,
+            "modo": "http" if args.base_url else "asgi",
+            "concurrencia": args.concurrencia,
+            "requests": args.requests,
+            "python": platform.python_version(),
+        },
+        "rutas": resultados,
+    }
+
+# Comparación
+def compare(base: dict, nuevo: dict, umbral: float) -> List[str]:
+    """Compara dos corridas ruta por ruta. Devuelve las regresiones (p95 o req/s peor que `umbral`, o más consultas)."""
+    regresiones = []
+    print(f"{'ruta':<26}{'p95 base':>11}{'p95 nuevo':>11}{'Δ p95':>9}{'req/s Δ':>9}{'queries':>12}")
+    for nombre in sorted(set(base["rutas"]) & set(nuevo["rutas"])):
+        a, b = base["rutas"][nombre], nuevo["rutas"][nombre]
+        delta_p95 = b["p95_ms"] / a["p95_ms"] - 1 if a["p95_ms"] else 0.0
+        delta_rps = b["rps"] / a["rps"] - 1 if a["rps"] else 0.0
+        qa, qb = a.get("queries_por_request"), b.get("queries_por_request")
+        motivos = []
+        if delta_p95 > umbral:
+            motivos.append(f"p95 +{delta_p95:.0%}")
+        if delta_rps < -umbral:
+            motivos.append(f"req/s {delta_rps:.0%}")
+        if qa is not None and qb is not None and qb > qa:
+            motivos.append(f"queries {qa} -> {qb}")
+        if motivos:
+            regresiones.append(f"{nombre}: {', '.join(motivos)}")
+        queries = f"{qa}->{qb}" if qa != qb else str(qa)
+        marca = "  REGRESIÓN" if motivos else ""
+        print(f"{nombre:<26}{a['p95_ms']:>11.2f}{b['p95_ms']:>11.2f}{delta_p95:>+9.0%}{delta_rps:>+9.0%}{queries:>12}{marca}")
+    faltantes = sorted(set(base["rutas"]) ^ set(nuevo["rutas"]))
+    if faltantes:
+        print(f"\nSin comparar (medidas en una sola corrida): {', '.join(faltantes)}")
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_run = sub.add_parser("run", help="Ejecutar la suite y guardar los resultados en JSON")
+    p_run.add_argument("--db-url", default=os.environ.get("DATABASE_URL", DEFAULT_DB_URL))
+    p_run.add_argument("--autos", type=int, default=100_000, help="Autos a cargar si la base está vacía")
+    p_run.add_argument("--ventas", type=int, default=500_000, help="Ventas a cargar si la base está vacía")
+    p_run.add_argument("--recargar", action="store_true", help="Borrar las tablas y volver a cargar la base")
+    p_run.add_argument("--requests", type=int, default=200, help="Requests por ruta")
+    p_run.add_argument("--concurrencia", type=int, default=10, help="Clientes concurrentes")
+    p_run.add_argument("--rutas", nargs="*", help="Medir sólo estos escenarios (p. ej. autos.get ventas.list)")
+    p_run.add_argument("--base-url", help="Servidor HTTP a medir; por defecto la app corre en el proceso")
+    p_run.add_argument("--semilla", type=int, default=42)
+    p_run.add_argument("--output", help="Archivo JSON de salida (por defecto, stdout)")
+
+    p_cmp = sub.add_parser("compare", help="Comparar dos corridas y marcar regresiones")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("nuevo")
+    p_cmp.add_argument("--umbral", type=float, default=0.10, help="Tolerancia relativa en p95 y req/s (0.10 = 10%%)")
+
+    args = parser.parse_args()
+    if args.comando == "run":
+        resultado = asyncio.run(run(args))
+        salida = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(salida + "\n")
+        else:
+            print(salida)
+    else:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.nuevo, encoding="utf-8") as f:
+            nuevo = json.load(f)
+        regresiones = compare(base, nuevo, args.umbral)
+        if regresiones:
+            print("\nRegresiones:\n  " + "\n  ".join(regresiones))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
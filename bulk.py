@@ -0,0 +1,122 @@
+import csv
+import json
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Type
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlmodel import SQLModel
+from models import BulkImportError, BulkImportResult
+
+# Filas validadas por cada INSERT
+BATCH_SIZE = 1000
+# Máximo de errores detallados en la respuesta (el resto sólo se cuenta en `rechazados`)
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+def detect_format(content_type: Optional[str], formato: Optional[str] = None) -> str:
+    """Determina el formato del archivo: parámetro `formato` explícito o header `Content-Type`."""
+    if formato:
+        return formato
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Formato no soportado: enviar `Content-Type: text/csv` o `application/x-ndjson`."
+        )
+    return FORMATS[media_type]
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # Corta el cuerpo en líneas a medida que llega, sin cargar el archivo completo. Las líneas se decodifican
+    # en `_rows`, de modo que una línea que no es UTF-8 se rechaza sola
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *completas, buffer = buffer.split(b"\n")
+        for linea in completas:
+            yield linea.rstrip(b"\r")
+    if buffer:
+        yield buffer.rstrip(b"\r")
+
+async def _rows(chunks: AsyncIterator[bytes], formato: str) -> AsyncIterator[Tuple[int, object]]:
+    """Produce (número de línea, dict de la fila) o (número de línea, error de parseo)."""
+    encabezado = None
+    numero = 0
+    async for crudo in _lines(chunks):
+        numero += 1
+        if not crudo.strip():
+            continue
+        try:
+            # La primera línea puede traer el BOM de UTF-8 (archivos exportados desde Excel)
+            linea = crudo.decode("utf-8-sig" if numero == 1 else "utf-8", errors="strict")
+            if formato == "ndjson":
+                fila = json.loads(linea)
+                if not isinstance(fila, dict):
+                    raise ValueError("cada línea debe ser un objeto JSON")
+            elif encabezado is None:
+                encabezado = next(csv.reader([linea]))
+                continue
+            else:
+                valores = next(csv.reader([linea]))
+                if len(valores) != len(encabezado):
+                    raise ValueError(f"se esperaban {len(encabezado)} columnas y hay {len(valores)}")
+                # Las celdas vacías toman el valor por defecto del modelo
+                fila = {k: v for k, v in zip(encabezado, valores) if v != ""}
+        except (UnicodeDecodeError, ValueError, csv.Error) as e:
+            yield numero, e
+            continue
+        yield numero, fila
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'fila'}: {e['msg']}" for e in error.errors())
+
+async def import_rows(
+    chunks: AsyncIterator[bytes],
+    formato: str,
+    schema: Type[SQLModel],
+    bulk_create: Callable[[List[SQLModel]], Awaitable[List[Optional[str]]]],
+    batch_size: int = BATCH_SIZE,
+) -> BulkImportResult:
+    """
+    Importa un archivo CSV/NDJSON en streaming: valida cada fila con `schema` y la inserta en
+    lotes con `bulk_create`. Las filas inválidas se reportan sin abortar el resto del archivo.
+    """
+    resultado = BulkImportResult(total=0, insertados=0, rechazados=0)
+
+    def rechazar(fila: int, error: str):
+        resultado.rechazados += 1
+        if len(resultado.errores) < MAX_REPORTED_ERRORS:
+            resultado.errores.append(BulkImportError(fila=fila, error=error))
+
+    lote: List[Tuple[int, SQLModel]] = []
+
+    async def insertar_lote():
+        errores = await bulk_create([modelo for _, modelo in lote])
+        for (fila, _), error in zip(lote, errores):
+            if error:
+                rechazar(fila, error)
+            else:
+                resultado.insertados += 1
+        lote.clear()
+
+    async for fila, datos in _rows(chunks, formato):
+        resultado.total += 1
+        if isinstance(datos, Exception):
+            rechazar(fila, f"Fila mal formada: {datos}")
+            continue
+        try:
+            lote.append((fila, schema.model_validate(datos)))
+        except ValidationError as e:
+            rechazar(fila, _describe(e))
+            continue
+        if len(lote) >= batch_size:
+            await insertar_lote()
+
+    if lote:
+        await insertar_lote()
+    resultado.errores.sort(key=lambda e: e.fila)
+    return resultado
@@ -0,0 +1,296 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Protocol, Sequence, Set
+from sqlmodel import Session
+from models import Auto, Venta, AutoUpdate, VentaUpdate
+from repository import PostgresAutoRepository, PostgresVentaRepository
+
+# Estadísticas
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
+
+# Interfaces
+class CacheBackend(Protocol):
+    stats: CacheStats
+    def get(self, key: str) -> Optional[dict]: ...
+    def set(self, key: str, value: dict, tags: List[str] = ()) -> None: ...
+    def delete(self, *keys: str) -> None: ...
+    def invalidate_tag(self, tag: str) -> None: ...
+
+# Backends
+class LRUCache:
+    """
+    Caché en memoria del proceso con expiración (TTL) y desalojo del elemento menos usado.
+
+    Es propia de cada worker: una escritura sólo invalida la caché del worker que la atendió, los demás
+    sirven el dato anterior hasta que vence el TTL. Con varios workers se usa `RedisCache` (ver `get_cache`).
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        # clave -> (expira, valor, tags)
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, key: str) -> bool:
+        # Saca la entrada y su clave de los tags: los conjuntos de `_tags` sólo contienen claves vigentes
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return False
+        for tag in entry[2]:
+            claves = self._tags.get(tag)
+            if claves is not None:
+                claves.discard(key)
+                if not claves:
+                    del self._tags[tag]
+        return True
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            expira, value, _ = entry
+            if expira < time.monotonic():
+                self._drop(key)
+                self.stats.misses += 1
+                self.stats.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: str, value: dict, tags: List[str] = ()) -> None:
+        with self._lock:
+            self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+                self.stats.evictions += 1
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                if self._drop(key):
+                    self.stats.invalidations += 1
+
+    def invalidate_tag(self, tag: str) -> None:
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                if self._drop(key):
+                    self.stats.invalidations += 1
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value)}")
+
+class RedisCache:
+    """
+    Caché compartida entre procesos sobre el protocolo de Redis.
+    `client` es cualquier cliente compatible con redis-py (`redis.Redis`, o `fakeredis.FakeRedis` en pruebas).
+    """
+
+    def __init__(self, client, ttl: float = 300.0, prefix: str = "autos-api:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: dict, tags: List[str] = ()) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value, default=_json_default), ex=int(self.ttl))
+        for tag in tags:
+            pipe.sadd(self.prefix + "tag:" + tag, key)
+            pipe.expire(self.prefix + "tag:" + tag, int(self.ttl))
+        pipe.execute()
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.stats.invalidations += self.client.delete(*[self.prefix + k for k in keys])
+
+    def invalidate_tag(self, tag: str) -> None:
+        tag_key = self.prefix + "tag:" + tag
+        keys = [k.decode() if isinstance(k, bytes) else k for k in self.client.smembers(tag_key)]
+        self.client.delete(tag_key)
+        self.delete(*keys)
+
+@lru_cache
+def get_cache() -> Optional[CacheBackend]:
+    """Backend de caché configurado (`CACHE_BACKEND`), o `None` si está desactivada."""
+    from config import get_settings
+    settings = get_settings()
+    if settings.cache_backend == "none":
+        return None
+    if settings.cache_backend == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requiere el paquete `redis` (pip install redis)")
+        return RedisCache(redis.Redis.from_url(settings.redis_url or "redis://localhost:6379/0"), ttl=settings.cache_ttl)
+    if settings.web_concurrency > 1:
+        # Las invalidaciones de un worker no llegan a la caché en memoria de los demás: servirían datos viejos
+        raise RuntimeError(
+            f"CACHE_BACKEND=memory no admite varios workers (WEB_CONCURRENCY={settings.web_concurrency}): "
+            "usar CACHE_BACKEND=redis o CACHE_BACKEND=none"
+        )
+    return LRUCache(maxsize=settings.cache_maxsize, ttl=settings.cache_ttl)
+
+# Repositorios con caché
+# Envuelven a los repositorios de la base: las lecturas por id / chasis se sirven desde la caché y
+# las escrituras invalidan las entradas afectadas. El resto de los métodos se delega sin cambios.
+class CachedAutoRepository:
+
+    def __init__(self, repo: PostgresAutoRepository, cache: CacheBackend):
+        self.repo = repo
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.repo, name)
+
+    def _store(self, auto: Auto) -> None:
+        data = auto.model_dump()
+        self.cache.set(f"auto:{auto.id}", data)
+        self.cache.set(f"auto:chasis:{auto.numero_chasis}", data)
+
+    def _invalidate(self, auto_id: int, *numeros_chasis: str) -> None:
+        self.cache.delete(f"auto:{auto_id}", *[f"auto:chasis:{n}" for n in numeros_chasis if n])
+
+    def get_by_id(self, auto_id: int, with_ventas: bool = False) -> Optional[Auto]:
+        if with_ventas:
+            return self.repo.get_by_id(auto_id, with_ventas=True)
+        data = self.cache.get(f"auto:{auto_id}")
+        if data is not None:
+            return Auto.model_validate(data)
+        auto = self.repo.get_by_id(auto_id)
+        self._store(auto)
+        return auto
+
+    def get_by_chasis(self, numero_chasis: str) -> Optional[Auto]:
+        data = self.cache.get(f"auto:chasis:{numero_chasis}")
+        if data is not None:
+            return Auto.model_validate(data)
+        auto = self.repo.get_by_chasis(numero_chasis)
+        if auto:
+            self._store(auto)
+        return auto
+
+    def get_many(self, ids: Optional[List[int]] = None, numeros_chasis: Optional[List[str]] = None) -> List[Optional[Auto]]:
+        # Las claves que no están en la caché se consultan juntas con un solo `IN`
+        prefijo, claves = ("auto:", ids) if ids is not None else ("auto:chasis:", numeros_chasis)
+        encontrados = {}
+        for clave in dict.fromkeys(claves):
+            data = self.cache.get(f"{prefijo}{clave}")
+            if data is not None:
+                encontrados[clave] = Auto.model_validate(data)
+        faltantes = [clave for clave in dict.fromkeys(claves) if clave not in encontrados]
+        if faltantes:
+            kwargs = {"ids": faltantes} if ids is not None else {"numeros_chasis": faltantes}
+            for clave, auto in zip(faltantes, self.repo.get_many(**kwargs)):
+                if auto:
+                    self._store(auto)
+                    encontrados[clave] = auto
+        return [encontrados.get(clave) for clave in claves]
+
+    # El chasis anterior sale de la base (no de la caché: la entrada por id puede haberse desalojado antes que
+    # la entrada por chasis, que quedaría sirviendo un auto renombrado o eliminado)
+    def update(self, auto_id: int, auto_update: AutoUpdate, expected_versions: Optional[Sequence[int]] = None) -> Auto:
+        auto, chasis_anterior = self.repo.update_returning_chasis(auto_id, auto_update, expected_versions)
+        self._invalidate(auto_id, chasis_anterior, auto.numero_chasis)
+        return auto
+
+    def delete(self, auto_id: int) -> bool:
+        numero_chasis = self.repo.delete_returning_chasis(auto_id)
+        if numero_chasis is None:
+            return False
+        self._invalidate(auto_id, numero_chasis)
+        # Las ventas del auto se eliminaron en cascada
+        self.cache.invalidate_tag(f"auto:{auto_id}")
+        return True
+
+class CachedVentaRepository:
+
+    def __init__(self, repo: PostgresVentaRepository, cache: CacheBackend):
+        self.repo = repo
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.repo, name)
+
+    def get_by_id(self, venta_id: int, with_auto: bool = False) -> Optional[Venta]:
+        if with_auto:
+            return self.repo.get_by_id(venta_id, with_auto=True)
+        data = self.cache.get(f"venta:{venta_id}")
+        if data is not None:
+            return Venta.model_validate(data)
+        venta = self.repo.get_by_id(venta_id)
+        self.cache.set(f"venta:{venta_id}", venta.model_dump(), tags=[f"auto:{venta.auto_id}"])
+        return venta
+
+    def get_many(self, ids: List[int]) -> List[Optional[Venta]]:
+        encontradas = {}
+        for id in dict.fromkeys(ids):
+            data = self.cache.get(f"venta:{id}")
+            if data is not None:
+                encontradas[id] = Venta.model_validate(data)
+        faltantes = [id for id in dict.fromkeys(ids) if id not in encontradas]
+        if faltantes:
+            for id, venta in zip(faltantes, self.repo.get_many(faltantes)):
+                if venta:
+                    self.cache.set(f"venta:{id}", venta.model_dump(), tags=[f"auto:{venta.auto_id}"])
+                    encontradas[id] = venta
+        return [encontradas.get(id) for id in ids]
+
+    def update(self, venta_id: int, venta_update: VentaUpdate, expected_versions: Optional[Sequence[int]] = None) -> Venta:
+        venta = self.repo.update(venta_id, venta_update, expected_versions)
+        self.cache.delete(f"venta:{venta_id}")
+        return venta
+
+    def delete(self, venta_id: int) -> bool:
+        eliminada = self.repo.delete(venta_id)
+        if eliminada:
+            self.cache.delete(f"venta:{venta_id}")
+        return eliminada
+
+# Fábricas usadas por los repositorios asíncronos
+def auto_repository(session: Session):
+    cache = get_cache()
+    repo = PostgresAutoRepository(session)
+    return CachedAutoRepository(repo, cache) if cache is not None else repo
+
+def venta_repository(session: Session):
+    cache = get_cache()
+    repo = PostgresVentaRepository(session)
+    return CachedVentaRepository(repo, cache) if cache is not None else repo
@@ -0,0 +1,99 @@
+"""
+Compresión de respuestas negociada con `Accept-Encoding` (brotli o gzip) a partir de un tamaño mínimo.
+
+Reutiliza los responders de `starlette.middleware.gzip`, que ya resuelven las respuestas completas y en
+streaming (exportaciones), y agrega brotli cuando el paquete `brotli` está instalado.
+"""
+import gzip
+import io
+from typing import List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from serialization import quality_values
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Nivel de gzip y calidad de brotli: equilibrio entre tamaño y CPU para contenido generado en cada request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+class GZipResponder(IdentityResponder):
+    content_encoding = "gzip"
+
+    def __init__(self, app: ASGIApp, minimum_size: int):
+        super().__init__(app, minimum_size)
+        self.buffer = io.BytesIO()
+        self.gzip_file = gzip.GzipFile(mode="wb", fileobj=self.buffer, compresslevel=GZIP_LEVEL)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        with self.buffer, self.gzip_file:
+            await super().__call__(scope, receive, send)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        self.gzip_file.write(body)
+        if not more_body:
+            self.gzip_file.close()
+        else:
+            # En streaming cada lote se envía comprimido sin esperar al siguiente
+            self.gzip_file.flush()
+        body = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return body
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        comprimido = self.compressor.process(body)
+        return comprimido + (self.compressor.flush() if more_body else self.compressor.finish())
+
+RESPONDERS = {"br": BrotliResponder, "gzip": GZipResponder}
+
+def available_encodings() -> List[str]:
+    """Codificaciones soportadas, en orden de preferencia del servidor."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Codificación elegida según los q-values de `Accept-Encoding` (`None`: sin comprimir)."""
+    pesos = quality_values(accept_encoding)
+    candidatas = [(pesos.get(codificacion, pesos.get("*", 0.0)), codificacion) for codificacion in available_encodings()]
+    aceptables = [(q, -i, codificacion) for i, (q, codificacion) in enumerate(candidatas) if q > 0]
+    return max(aceptables)[2] if aceptables else None
+
+class CompressionMiddleware:
+    """
+    Comprime las respuestas de al menos `minimum_size` bytes con la codificación que prefiera el cliente.
+    Las más chicas se envían tal cual: el costo de comprimirlas no compensa los bytes ahorrados.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        codificacion = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+
+        async def send_weak_etag(message: Message) -> None:
+            # Un ETag fuerte identifica los bytes exactos: la versión comprimida sólo puede llevar uno débil
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                etag = headers.get("etag")
+                if codificacion and etag and not etag.startswith("W/") and headers.get("content-encoding") == codificacion:
+                    headers["etag"] = f"W/{etag}"
+            await send(message)
+
+        # Sin codificación aceptable se usa IdentityResponder, que igual agrega `Vary: Accept-Encoding`.
+        # Las respuestas que ya traen Content-Encoding y los text/event-stream se envían sin tocar.
+        responder = RESPONDERS.get(codificacion, IdentityResponder)
+        await responder(self.app, self.minimum_size)(scope, receive, send_weak_etag)
@@ -0,0 +1,115 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# Lectura de variables de entorno
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "si", "on")
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+def _schema_mode(value: str) -> str:
+    value = value.strip().lower() or "migrate"
+    if value not in ("migrate", "verify"):
+        raise ValueError(f"SCHEMA_MODE inválido: {value!r} (valores posibles: migrate, verify)")
+    return value
+
+# Configuración de la aplicación
+@dataclass(frozen=True)
+class Settings:
+    database_url: str
+    # Pool de conexiones
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    # Conexiones del pool asíncrono que se abren al iniciar (0: ninguna, se abren con los primeros requests)
+    db_pool_warmup: int = 1
+    # Réplicas de lectura (ver replicas.py)
+    replica_urls: Tuple[str, ...] = ()
+    replica_health_interval: float = 5.0
+    replica_max_lag: float = 30.0
+    # Segundos que un cliente lee de la primaria después de escribir (0: desactivado)
+    replica_sticky_seconds: int = 0
+    # Altas de ventas por lotes (ver batching.py)
+    venta_batching: bool = False
+    venta_batch_max_wait_ms: float = 5.0
+    venta_batch_max_size: int = 500
+    # Particiones de venta que se crean por adelantado (ver partitions.py)
+    venta_partitions_ahead: int = 3
+    # Claves de idempotencia de las altas (ver idempotency.py): segundos que se guarda la respuesta y
+    # segundos que un alta en curso retiene la clave
+    idempotency_ttl: float = 86400.0
+    idempotency_lock_timeout: float = 30.0
+    # Log de cada sentencia SQL (sólo para desarrollo: es sincrónico y agrega latencia)
+    db_echo: bool = False
+    # Caché de lecturas por id / chasis: "memory", "redis" o "none"
+    cache_backend: str = "memory"
+    cache_ttl: float = 300.0
+    cache_maxsize: int = 10_000
+    redis_url: Optional[str] = None
+    # Workers del servidor (`WEB_CONCURRENCY`, la variable que leen uvicorn y gunicorn): la caché en memoria
+    # exige uno solo
+    web_concurrency: int = 1
+    # Métricas por request (/metrics y header Server-Timing)
+    metrics_enabled: bool = False
+    # Token de /metrics y /internal/* (header `Authorization: Bearer <token>`); sin token sólo responden a localhost
+    internal_token: Optional[str] = None
+    # Presupuesto del COUNT(*) de los listados filtrados (PostgreSQL); si se excede, el total se estima
+    count_timeout_ms: int = 200
+    # Compresión de respuestas (gzip / brotli) a partir de un tamaño mínimo en bytes
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    # Esquema al iniciar: "migrate" aplica las migraciones pendientes, "verify" sólo verifica que no falte ninguna
+    schema_mode: str = "migrate"
+
+@lru_cache
+def get_settings() -> Settings:
+    """Lee la configuración desde el entorno (y el archivo `.env`) una sola vez, en el primer uso."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL no está configurada en el entorno o .env")
+    return Settings(
+        database_url=database_url,
+        db_pool_size=_env_int("DB_POOL_SIZE", 5),
+        db_max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+        db_pool_timeout=_env_float("DB_POOL_TIMEOUT", 30.0),
+        db_pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+        db_pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+        db_pool_warmup=_env_int("DB_POOL_WARMUP", 1),
+        replica_urls=tuple(url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()),
+        replica_health_interval=_env_float("REPLICA_HEALTH_INTERVAL", 5.0),
+        replica_max_lag=_env_float("REPLICA_MAX_LAG", 30.0),
+        replica_sticky_seconds=_env_int("REPLICA_STICKY_SECONDS", 0),
+        venta_batching=_env_bool("VENTA_BATCHING", False),
+        venta_batch_max_wait_ms=_env_float("VENTA_BATCH_MAX_WAIT_MS", 5.0),
+        venta_batch_max_size=_env_int("VENTA_BATCH_MAX_SIZE", 500),
+        venta_partitions_ahead=_env_int("VENTA_PARTITIONS_AHEAD", 3),
+        idempotency_ttl=_env_float("IDEMPOTENCY_TTL", 86400.0),
+        idempotency_lock_timeout=_env_float("IDEMPOTENCY_LOCK_TIMEOUT", 30.0),
+        db_echo=_env_bool("DB_ECHO", False),
+        cache_backend=os.environ.get("CACHE_BACKEND", "memory").strip().lower(),
+        cache_ttl=_env_float("CACHE_TTL", 300.0),
+        cache_maxsize=_env_int("CACHE_MAXSIZE", 10_000),
+        redis_url=os.environ.get("REDIS_URL") or None,
+        web_concurrency=_env_int("WEB_CONCURRENCY", 1),
+        metrics_enabled=_env_bool("METRICS_ENABLED", False),
+        internal_token=os.environ.get("INTERNAL_TOKEN") or None,
+        count_timeout_ms=_env_int("COUNT_TIMEOUT_MS", 200),
+        compression_enabled=_env_bool("COMPRESSION_ENABLED", True),
+        compression_min_size=_env_int("COMPRESSION_MIN_SIZE", 1024),
+        schema_mode=_schema_mode(os.environ.get("SCHEMA_MODE", "migrate")),
+    )
@@ -1,35 +1,198 @@
-import os
+import asyncio
+import time
 from contextlib import contextmanager
-from dotenv import load_dotenv
+from functools import lru_cache
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import create_engine, Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from config import get_settings
+from metrics import record_query, record_pool_wait
 
-# Variables de Entorno
-load_dotenv()
+# Drivers asíncronos equivalentes a cada backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
 
-# Dirección de la DB
-DATABASE_URL = os.environ.get("DATABASE_URL")
-print("DATABASE_URL =>", repr(DATABASE_URL))
+def _async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
 
+# Pools instrumentados
+class _PoolWaitStatsMixin:
+    """Cuenta las esperas por conexión: pedidos que llegan con el pool agotado (sin conexiones libres ni overflow disponible)."""
 
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL no está configurada en el entorno o .env")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_max_overflow = kwargs.get("max_overflow", 10)
+        self.waits = 0
+        self.wait_seconds = 0.0
 
-# Motor de la DB
-engine = create_engine(
-    DATABASE_URL, 
-    echo=True,
-    connect_args={ "options": "-c client_encoding=utf8"}
+    def _do_get(self):
+        agotado = self._stats_max_overflow >= 0 and self.checkedin() == 0 and self.overflow() >= self._stats_max_overflow
+        if not agotado:
+            return super()._do_get()
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            espera = time.perf_counter() - inicio
+            self.waits += 1
+            self.wait_seconds += espera
+            record_pool_wait(espera)
 
-)
+class InstrumentedQueuePool(_PoolWaitStatsMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_PoolWaitStatsMixin, AsyncAdaptedQueuePool):
+    pass
+
+def _pool_kwargs(poolclass, url: str) -> dict:
+    settings = get_settings()
+    url = make_url(url)
+    # SQLite en memoria usa un pool de una sola conexión: no admite tamaño ni overflow
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+# SQLite sólo verifica las claves foráneas si se activa en cada conexión (los repositorios dependen de ellas)
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+# Contabilidad de consultas por request (ver metrics.py)
+def _instrument(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._inicio_consulta = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_query(statement, time.perf_counter() - context._inicio_consulta)
+
+def _configure(sync_engine):
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _sqlite_foreign_keys)
+    if get_settings().metrics_enabled:
+        _instrument(sync_engine)
+
+def _is_postgres(url: str) -> bool:
+    return make_url(url).get_backend_name() == "postgresql"
+
+def sync_connect_args(url: str) -> dict:
+    """`connect_args` de psycopg2: la conexión usa UTF-8 aunque la base se haya creado con otra codificación (SQL_ASCII)."""
+    return {"options": "-c client_encoding=utf8"} if _is_postgres(url) else {}
+
+# Motores de la DB
+# Se crean en el primer uso y no al importar el módulo: importar la app (workers, scripts, herramientas)
+# no lee la configuración ni prepara pools que quizás no se usen.
+@lru_cache
+def get_engine():
+    """Motor sincrónico (migraciones, scripts y tareas de mantenimiento)."""
+    settings = get_settings()
+    engine = create_engine(
+        settings.database_url,
+        echo=settings.db_echo,
+        connect_args=sync_connect_args(settings.database_url),
+        **_pool_kwargs(InstrumentedQueuePool, settings.database_url)
+    )
+    _configure(engine)
+    return engine
+
+def create_async_engine_for(url: str):
+    """Motor asíncrono con el pool y la instrumentación de la app (la primaria o una réplica, ver replicas.py)."""
+    settings = get_settings()
+    async_engine = create_async_engine(
+        _async_url(url),
+        echo=settings.db_echo,
+        connect_args={"server_settings": {"client_encoding": "utf8"}} if _is_postgres(url) else {},
+        **_pool_kwargs(InstrumentedAsyncQueuePool, url)
+    )
+    _configure(async_engine.sync_engine)
+    return async_engine
+
+@lru_cache
+def get_async_engine():
+    """Motor asíncrono de la base primaria (usado por los endpoints)."""
+    return create_async_engine_for(get_settings().database_url)
+
+@lru_cache
+def get_async_sessionmaker() -> async_sessionmaker:
+    return async_sessionmaker(get_async_engine(), class_=AsyncSession, expire_on_commit=False)
+
+# Compatibilidad: `from database import engine` sigue funcionando y crea el motor recién al pedirlo
+_LAZY = {"engine": get_engine, "async_engine": get_async_engine, "AsyncSessionLocal": get_async_sessionmaker}
+
+def __getattr__(nombre: str):
+    if nombre in _LAZY:
+        return _LAZY[nombre]()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+# Precalentamiento del pool
+async def warm_up_pool(conexiones: int) -> int:
+    """
+    Abre `conexiones` conexiones del pool asíncrono (hasta su tamaño) y las devuelve al pool, de modo que los
+    primeros requests no paguen el handshake con la base. Devuelve la cantidad de conexiones abiertas.
+    """
+    async_engine = get_async_engine()
+    pool = async_engine.sync_engine.pool
+    if isinstance(pool, QueuePool):
+        conexiones = min(conexiones, pool.size())
+    else:
+        conexiones = min(conexiones, 1)
+    # Se abren en paralelo: el arranque espera un handshake, no `conexiones` seguidos
+    resultados = await asyncio.gather(*(async_engine.connect() for _ in range(conexiones)), return_exceptions=True)
+    abiertas = [r for r in resultados if not isinstance(r, BaseException)]
+    try:
+        errores = [r for r in resultados if isinstance(r, BaseException)]
+        if errores:
+            raise errores[0]
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in abiertas))
+    finally:
+        for conn in abiertas:
+            await conn.close()
+    return len(abiertas)
+
+# Estadísticas de los pools
+def _pool_stats(pool) -> dict:
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "waits": getattr(pool, "waits", None),
+            "wait_seconds": round(getattr(pool, "wait_seconds", 0.0), 6),
+        })
+    return stats
+
+def pool_stats() -> dict:
+    """Estado actual de los pools de conexiones sincrónico y asíncrono."""
+    return {
+        "sync": _pool_stats(get_engine().pool),
+        "async": _pool_stats(get_async_engine().sync_engine.pool),
+    }
 
 # Creación de DB y Tablas
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(get_engine())
     print("Base de datos y tablas creadas exitosamente.")
 
 @contextmanager
 def get_session_context():
-    session = Session(engine)
+    session = Session(get_engine())
     try:
         yield session
     except Exception as e:
@@ -37,8 +200,17 @@ def get_session_context():
         print(f"Error en la sesión. Rollback ejecutado: {e}")
         raise
     finally:
-        session.close
+        session.close()
 
 def get_session():
     with get_session_context() as session:
-        yield session 
\ No newline at end of file
+        yield session
+
+async def get_async_session():
+    async with get_async_sessionmaker()() as session:
+        try:
+            yield session
+        except Exception as e:
+            await session.rollback()
+            print(f"Error en la sesión. Rollback ejecutado: {e}")
+            raise
@@ -0,0 +1,40 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, List, Mapping
+from fastapi.responses import StreamingResponse
+from serialization import dumps
+
+# Filas leídas del cursor del servidor por cada lote
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def _encode(lotes: AsyncIterator[List[Mapping]], formato: str, columnas: List[str]) -> AsyncIterator[bytes]:
+    # Cada lote se serializa y se envía antes de leer el siguiente: la memoria queda acotada al lote
+    if formato == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(columnas)
+        yield buffer.getvalue().encode()
+    async for filas in lotes:
+        if formato == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([[_value(fila[c]) for c in columnas] for fila in filas])
+            yield buffer.getvalue().encode()
+        else:
+            # Mismo serializador que las respuestas JSON (orjson): salida compacta, fechas en ISO 8601
+            yield b"".join(dumps({c: fila[c] for c in columnas}) + b"\n" for fila in filas)
+
+def export_response(lotes: AsyncIterator[List[Mapping]], formato: str, columnas: List[str], nombre: str) -> StreamingResponse:
+    """Respuesta en streaming (NDJSON o CSV) a partir de los lotes de filas que produce el repositorio."""
+    return StreamingResponse(
+        _encode(lotes, formato, columnas),
+        media_type=MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'},
+    )
@@ -0,0 +1,77 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Optional
+from fastapi import Request, Response, status
+
+# Los clientes guardan la respuesta pero la revalidan en cada uso (If-None-Match / If-Modified-Since)
+CACHE_CONTROL = "no-cache"
+
+def entity_etag(entity) -> str:
+    """ETag de una fila versionada (`version` + `updated_at`): cambia con cada `update` del repositorio."""
+    marca = int(entity.updated_at.replace(tzinfo=timezone.utc).timestamp() * 1_000_000)
+    return f'"{entity.version}-{marca:x}"'
+
+# ETag de una fila: "<version>-<updated_at>"
+_ENTITY_ETAG = re.compile(r'"(\d+)-[0-9a-f]+"')
+
+def if_match_versions(request: Request) -> Optional[List[int]]:
+    """
+    Versiones de fila aceptadas por `If-Match`, para el compare-and-swap de `update`. `None` si el request no
+    lo envía o envía `*` (actualización incondicional). La comparación es fuerte (RFC 9110 §13.1.1): un ETag
+    débil (`W/`) o que no es de una fila no coincide con ninguna versión y la actualización responde 412.
+    """
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return None
+    return [int(m.group(1)) for candidato in header.split(",") if (m := _ENTITY_ETAG.fullmatch(candidato.strip()))]
+
+def collection_etag(*validador) -> str:
+    """
+    ETag de un listado a partir de (cantidad, id máximo, última modificación) del conjunto filtrado:
+    un alta cambia la cantidad y el id máximo, una baja la cantidad y una modificación la fecha.
+    """
+    digest = hashlib.sha1("|".join(map(str, validador)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def _http_date(fecha: datetime) -> str:
+    return format_datetime(fecha.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Comparación débil (RFC 9110 §13.1.2): se ignora el prefijo W/
+    if header.strip() == "*":
+        return True
+    opaco = etag.removeprefix("W/")
+    return any(candidato.strip().removeprefix("W/") == opaco for candidato in header.split(","))
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        desde = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        desde = desde.replace(tzinfo=timezone.utc)
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= desde
+
+def conditional(request: Request, response: Response, etag: str, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """
+    Agrega los validadores (ETag / Last-Modified) a la respuesta. Si el cliente ya tiene esa versión
+    devuelve un `304 Not Modified` sin cuerpo, que el endpoint retorna en lugar de la entidad.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        # If-None-Match tiene prioridad sobre If-Modified-Since
+        fresco = _etag_matches(if_none_match, etag)
+    else:
+        fresco = bool(if_modified_since and last_modified and _not_modified_since(if_modified_since, last_modified))
+
+    if fresco:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,231 @@
+"""
+Claves de idempotencia de las altas (`POST /autos/` y `POST /ventas/`).
+
+Un cliente que reintenta un alta después de un timeout no sabe si la primera se registró. Con el header
+`Idempotency-Key` (un valor único por operación, p. ej. un UUID) el reintento no vuelve a ejecutar el alta:
+
+- El primer request toma la clave (una fila de `clave_idempotencia`, en su propia transacción, con un token
+  de propietario), crea la entidad y guarda el código y el cuerpo de la respuesta en la misma transacción del
+  INSERT: si el worker se detiene o el request se cancela, el alta quedó confirmada junto con su respuesta o
+  no se registró.
+- Los reintentos con la misma clave reciben la respuesta guardada con el header `Idempotent-Replayed: true`,
+  sin ejecutar `repo.create`. Los errores del alta (404, 422) también se guardan: el reintento de un alta que
+  se registró recibe el 201 original, no un error de chasis duplicado causado por él mismo.
+- Un duplicado concurrente (la primera todavía en curso) espera ese resultado: se ejecuta un solo INSERT. En el
+  mismo worker espera un evento; entre workers vuelve a consultar la clave con una espera creciente.
+- La misma clave con otro cuerpo responde 422.
+
+Las respuestas se guardan `IDEMPOTENCY_TTL` segundos y una tarea de fondo purga las vencidas. Si el alta falla
+con un error inesperado (5xx) o el request se cancela, la clave se libera y el reintento se ejecuta. Mientras el
+alta sigue en curso su worker renueva el plazo de la clave (`IDEMPOTENCY_LOCK_TIMEOUT`); si el worker se
+detiene, la clave queda retenida hasta que el plazo vence y después la toma el siguiente reintento. Guardar la
+respuesta exige seguir siendo el propietario: si un reintento tomó la clave porque el plazo venció, el alta
+anterior se revierte y espera el resultado del nuevo propietario. Así sólo un INSERT por clave se confirma.
+"""
+import asyncio
+import hashlib
+import uuid
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, delete, or_, update
+from sqlmodel import Session, SQLModel
+from analytics import insert_on_conflict
+from config import get_settings
+from database import get_async_sessionmaker
+from models import ClaveIdempotencia, utcnow
+from serialization import dumps
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# Segundos entre purgas de las claves vencidas
+PURGE_INTERVAL = 600.0
+# Espera máxima entre consultas de un duplicado concurrente que espera a otro worker
+MAX_POLL_INTERVAL = 0.5
+
+class IdempotencyKeyReusedException(HTTPException):
+    """La clave ya se usó con un cuerpo distinto."""
+    def __init__(self, detail: str):
+        super().__init__(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
+
+class _ClavePerdida(Exception):
+    """Otro request tomó la clave (venció el plazo): este ya no puede guardar su respuesta."""
+
+# Altas en curso en este worker: los duplicados esperan su evento en lugar de consultar la base
+_en_curso: Dict[Tuple[str, str], asyncio.Event] = {}
+
+# Operaciones sobre la tabla (cada una en su transacción, independiente de la del alta)
+def _take(session: Session, alcance: str, clave: str, huella: str, propietario: str) -> Tuple[bool, Optional[ClaveIdempotencia]]:
+    """
+    Toma la clave si no existe, venció o quedó en curso con el plazo vencido. Devuelve si la tomó y, si no,
+    la fila vigente (`None` si se liberó entretanto). El INSERT ... ON CONFLICT es atómico: de dos requests
+    simultáneos sólo uno la toma.
+    """
+    settings = get_settings()
+    ahora = utcnow()
+    valores = {
+        "huella": huella,
+        "propietario": propietario,
+        "estado": None,
+        "respuesta": None,
+        "bloqueada_hasta": ahora + timedelta(seconds=settings.idempotency_lock_timeout),
+        "expira": ahora + timedelta(seconds=settings.idempotency_ttl),
+    }
+    statement = insert_on_conflict(session, ClaveIdempotencia).values(alcance=alcance, clave=clave, **valores)
+    statement = statement.on_conflict_do_update(
+        index_elements=["alcance", "clave"],
+        set_=valores,
+        where=or_(
+            ClaveIdempotencia.expira < ahora,
+            and_(ClaveIdempotencia.estado.is_(None), ClaveIdempotencia.bloqueada_hasta < ahora),
+        ),
+    ).returning(ClaveIdempotencia.clave)
+    tomada = session.exec(statement).first() is not None
+    fila = None if tomada else session.get(ClaveIdempotencia, (alcance, clave))
+    session.commit()
+    return tomada, fila
+
+def _owned(alcance: str, clave: str, propietario: str):
+    # La clave sigue en curso y tomada por este request
+    return and_(
+        ClaveIdempotencia.alcance == alcance,
+        ClaveIdempotencia.clave == clave,
+        ClaveIdempotencia.estado.is_(None),
+        ClaveIdempotencia.propietario == propietario,
+    )
+
+def _save(session: Session, alcance: str, clave: str, propietario: str, estado: int, respuesta: str) -> None:
+    """
+    Guarda la respuesta sin confirmar: en el alta exitosa corre dentro de la transacción del INSERT (`on_insert`
+    del repositorio). Si la clave ya no es de `propietario` falla y el alta se revierte. En PostgreSQL el UPDATE
+    bloquea la fila hasta el commit, de modo que un `_take` concurrente espera y ve la respuesta guardada.
+    """
+    resultado = session.exec(update(ClaveIdempotencia).where(_owned(alcance, clave, propietario)).values(estado=estado, respuesta=respuesta))
+    if resultado.rowcount != 1:
+        raise _ClavePerdida()
+
+def _store(session: Session, alcance: str, clave: str, propietario: str, estado: int, respuesta: str) -> None:
+    try:
+        _save(session, alcance, clave, propietario, estado, respuesta)
+    except _ClavePerdida:
+        # El error no se guarda: la clave ya la tiene otro reintento
+        session.rollback()
+        return
+    session.commit()
+
+def _renew(session: Session, alcance: str, clave: str, propietario: str) -> None:
+    bloqueada_hasta = utcnow() + timedelta(seconds=get_settings().idempotency_lock_timeout)
+    session.exec(update(ClaveIdempotencia).where(_owned(alcance, clave, propietario)).values(bloqueada_hasta=bloqueada_hasta))
+    session.commit()
+
+def _release(session: Session, alcance: str, clave: str, propietario: str) -> None:
+    session.exec(delete(ClaveIdempotencia).where(_owned(alcance, clave, propietario)))
+    session.commit()
+
+def purge_expired(session: Session) -> int:
+    """Elimina las claves vencidas (índice `expira`). Devuelve la cantidad eliminada."""
+    eliminadas = session.exec(delete(ClaveIdempotencia).where(ClaveIdempotencia.expira < utcnow())).rowcount
+    session.commit()
+    return eliminadas
+
+async def _run(fn, *args):
+    async with get_async_sessionmaker()() as session:
+        return await session.run_sync(fn, *args)
+
+# Ejecución idempotente
+async def _keep_locked(alcance: str, clave: str, propietario: str) -> None:
+    # Un alta lenta (p. ej. esperando un bloqueo) no pierde la clave mientras su worker sigue vivo
+    intervalo = get_settings().idempotency_lock_timeout / 3
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await _run(_renew, alcance, clave, propietario)
+        except Exception as e:
+            print(f"No se pudo renovar la clave de idempotencia {clave!r}: {e}")
+
+def _replay(fila: ClaveIdempotencia) -> Response:
+    return Response(content=fila.respuesta, status_code=fila.estado, media_type="application/json", headers={REPLAYED_HEADER: "true"})
+
+async def _execute(alcance: str, clave: str, propietario: str, create: Callable[..., Awaitable], response_model: Type[SQLModel], status_code: int):
+    evento = _en_curso[(alcance, clave)] = asyncio.Event()
+    renovacion = asyncio.create_task(_keep_locked(alcance, clave, propietario))
+
+    def guardar(session: Session, entidad: SQLModel) -> None:
+        respuesta = dumps(response_model.model_validate(entidad).model_dump()).decode()
+        _save(session, alcance, clave, propietario, status_code, respuesta)
+
+    try:
+        try:
+            return await create(guardar)
+        except _ClavePerdida:
+            raise
+        except HTTPException as e:
+            if e.status_code >= 500:
+                await _run(_release, alcance, clave, propietario)
+                raise
+            # Errores del alta (auto inexistente, chasis duplicado): el reintento recibe el mismo error
+            await _run(_store, alcance, clave, propietario, e.status_code, dumps({"detail": e.detail}).decode())
+            raise
+        except BaseException:
+            # Error inesperado o request cancelado (`CancelledError` no es `Exception`): el alta se revirtió, o se
+            # confirmó junto con su respuesta y la clave ya no está en curso. Sólo se libera si sigue en curso
+            await asyncio.shield(_run(_release, alcance, clave, propietario))
+            raise
+    finally:
+        renovacion.cancel()
+        if _en_curso.get((alcance, clave)) is evento:
+            del _en_curso[(alcance, clave)]
+        evento.set()
+
+async def idempotent(
+    clave: Optional[str],
+    alcance: str,
+    payload: SQLModel,
+    create: Callable[..., Awaitable],
+    response_model: Type[SQLModel],
+    status_code: int = status.HTTP_201_CREATED,
+) -> Any:
+    """
+    Ejecuta el alta `create` una sola vez por `clave` (el header `Idempotency-Key`) dentro de `alcance`.
+    Sin clave la ejecuta directamente (`create()`); con clave le pasa la escritura de la respuesta, que el
+    repositorio ejecuta antes del commit del alta (`create(on_insert)`). Devuelve la entidad creada o, si la
+    clave ya se usó con el mismo cuerpo, la respuesta guardada.
+    """
+    if clave is None:
+        return await create()
+    # Huella de lo que envió el cliente: sin los valores por defecto (`fecha_venta` sería la hora de cada intento)
+    huella = hashlib.sha256(payload.model_dump_json(exclude_unset=True).encode()).hexdigest()
+    propietario = uuid.uuid4().hex
+    espera = 0.01
+    while True:
+        tomada, fila = await _run(_take, alcance, clave, huella, propietario)
+        if tomada:
+            try:
+                return await _execute(alcance, clave, propietario, create, response_model, status_code)
+            except _ClavePerdida:
+                # Un reintento tomó la clave mientras esta alta seguía: se revirtió y se espera su resultado
+                continue
+        if fila is None:
+            continue
+        if fila.huella != huella:
+            raise IdempotencyKeyReusedException(f"La clave de idempotencia {clave!r} ya se usó con otro cuerpo.")
+        if fila.estado is not None:
+            return _replay(fila)
+        # En curso en otro request: se espera su resultado (o, si es de otro worker, que venza su plazo)
+        evento = _en_curso.get((alcance, clave))
+        if evento is not None:
+            await evento.wait()
+        else:
+            restante = max((fila.bloqueada_hasta - utcnow()).total_seconds(), 0.0) + 0.01
+            await asyncio.sleep(min(espera, restante))
+            espera = min(espera * 2, MAX_POLL_INTERVAL)
+
+async def purge_loop(interval: float = PURGE_INTERVAL) -> None:
+    """Purga periódica de las claves vencidas (tarea de fondo de la app, ver main.py)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await _run(purge_expired)
+        except Exception as e:
+            print(f"No se pudieron purgar las claves de idempotencia: {e}")
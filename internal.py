@@ -0,0 +1,27 @@
+"""
+Acceso a los endpoints operativos (`/metrics` y `/internal/*`).
+
+Exponen el estado de los pools, las réplicas (sus hosts), la caché y los lotes de altas: no son para los
+clientes de la API. Con `INTERNAL_TOKEN` configurado exigen el header `Authorization: Bearer <token>`; sin
+él sólo responden a requests desde la misma máquina (loopback).
+"""
+import hmac
+from typing import Optional
+from fastapi import Header, HTTPException, Request, status
+from config import get_settings
+
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+class InternalAccessDeniedException(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+def require_internal_access(request: Request, authorization: Optional[str] = Header(None)):
+    """Dependencia de los endpoints operativos: token si está configurado, si no sólo loopback."""
+    token = get_settings().internal_token
+    if token is not None:
+        # Comparación en tiempo constante: no revela cuántos caracteres del token coinciden
+        if authorization is None or not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+            raise InternalAccessDeniedException("Token interno inválido o ausente.")
+    elif request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise InternalAccessDeniedException("Endpoint interno: sólo accesible desde localhost o con INTERNAL_TOKEN.")
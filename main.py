@@ -1,24 +1,73 @@
 # main.py
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from contextlib import asynccontextmanager
-from database import create_db_and_tables
+from database import get_engine, pool_stats, warm_up_pool
+from migrations import migrate, verify
+from partitions import rotate as rotate_partitions
+from analytics import ensure_summaries
+from cache import get_cache
+from config import get_settings
+from metrics import MetricsMiddleware, render as render_metrics
+from compression import CompressionMiddleware
+from replicas import ReadYourWritesMiddleware, get_replicas
+from batching import get_venta_writer
+from idempotency import purge_loop
+from internal import require_internal_access
+from serialization import DefaultJSONResponse
+from sqlmodel import Session
 from autos import router as autos_router
 from ventas import router as ventas_router
 
 # --- Ciclo de Vida de la Aplicación ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Iniciando aplicación. Creando tablas de la base de datos...")
-    create_db_and_tables()
+    settings = get_settings()
+    # La caché se construye al iniciar: una configuración inválida (memoria con varios workers) falla acá
+    get_cache()
+    engine = get_engine()
+    if settings.schema_mode == "verify":
+        # Producción: las migraciones son un paso del despliegue, cada worker sólo verifica el esquema
+        print("Iniciando aplicación. Verificando el esquema de la base de datos...")
+        verify(engine)
+    else:
+        print("Iniciando aplicación. Aplicando migraciones de la base de datos...")
+        migrate(engine)
+        # Si venta está particionada, las particiones de los próximos períodos (ver partitions.py)
+        rotate_partitions(engine, settings.venta_partitions_ahead)
+        with Session(engine) as session:
+            ensure_summaries(session)
+    # El motor sincrónico sólo se usa para el esquema: sus conexiones no quedan abiertas en cada worker
+    engine.dispose()
+    if settings.db_pool_warmup > 0:
+        await warm_up_pool(settings.db_pool_warmup)
+    monitor = None
+    if (replicas := get_replicas()) is not None:
+        await replicas.check_all()
+        for replica in replicas.stats():
+            print(f"Réplica {replica['replica']}: {'disponible' if replica['healthy'] else replica['error']}")
+        monitor = asyncio.create_task(replicas.monitor(settings.replica_health_interval))
+    # Claves de idempotencia vencidas (ver idempotency.py)
+    purga = asyncio.create_task(purge_loop())
     yield
+    purga.cancel()
+    if (writer := get_venta_writer()) is not None:
+        await writer.close()
+    if monitor is not None:
+        monitor.cancel()
+        await replicas.dispose()
     print("Apagando aplicación.")
 
 app = FastAPI(
     title="API CRUD de Ventas de Autos (UTN Prog IV)",
     description="API REST completa para la gestión de ventas de autos, usando FastAPI, SQLModel y PostgreSQL.",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=DefaultJSONResponse
 )
 
 origins = [
@@ -32,11 +81,84 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Exact", "ETag", "Last-Modified", "Server-Timing", "Idempotent-Replayed"],
 )
 
+class OptionalMiddleware:
+    """
+    Middlewares que dependen de la configuración. La pila se arma en la primera llamada ASGI (el lifespan o el
+    primer request) y no al importar `main`: importar la app no lee el entorno ni exige DATABASE_URL.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.stack: Optional[ASGIApp] = None
+
+    def build(self) -> ASGIApp:
+        settings = get_settings()
+        stack = self.app
+        # Leer lo propio: después de escribir, el cliente lee de la primaria durante REPLICA_STICKY_SECONDS
+        if settings.replica_urls and settings.replica_sticky_seconds > 0:
+            stack = ReadYourWritesMiddleware(stack, seconds=settings.replica_sticky_seconds)
+        if settings.compression_enabled:
+            stack = CompressionMiddleware(stack, minimum_size=settings.compression_min_size)
+        # Sin METRICS_ENABLED no se agrega el middleware ni los eventos del engine: costo nulo
+        if settings.metrics_enabled:
+            stack = MetricsMiddleware(stack)
+        return stack
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stack is None:
+            self.stack = self.build()
+        await self.stack(scope, receive, send)
+
+app.add_middleware(OptionalMiddleware)
+
 app.include_router(autos_router)
 app.include_router(ventas_router)
 
 @app.get("/", tags=["Root"])
 def read_root():
-    return {"message": "API de Ventas de Autos activa. Visita /docs para ver la documentación."}
\ No newline at end of file
+    return {"message": "API de Ventas de Autos activa. Visita /docs para ver la documentación."}
+
+# Endpoints operativos: fuera de la documentación y protegidos (ver internal.py)
+internal_router = APIRouter(tags=["Internal"], include_in_schema=False, dependencies=[Depends(require_internal_access)])
+
+@internal_router.get("/internal/pool")
+def read_pool_stats():
+    """Estado de los pools de conexiones (conexiones en uso, overflow y esperas)."""
+    return pool_stats()
+
+@internal_router.get("/internal/replicas")
+def read_replica_stats():
+    """Estado de las réplicas de lectura (disponibilidad, retraso de replicación y último error)."""
+    replicas = get_replicas()
+    return {"replicas": replicas.stats() if replicas is not None else []}
+
+@internal_router.get("/internal/batching")
+def read_batching_stats():
+    """Lotes de altas de ventas: cantidad, ventas insertadas y tamaño máximo / promedio."""
+    writer = get_venta_writer()
+    if writer is None:
+        return {"enabled": False}
+    return {"enabled": True, "max_wait_ms": writer.max_wait * 1000, "max_size": writer.max_size, **writer.stats.as_dict()}
+
+@internal_router.get("/internal/cache")
+def read_cache_stats():
+    """Aciertos, fallos, desalojos e invalidaciones de la caché de lecturas por id / chasis."""
+    cache = get_cache()
+    if cache is None:
+        return {"backend": "none"}
+    return {"backend": type(cache).__name__, **cache.stats.as_dict()}
+
+@internal_router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Métricas en formato Prometheus (latencia por ruta, consultas, serialización y pools)."""
+    pools = pool_stats()
+    gauges = {
+        f"db_pool_{campo}": {nombre: stats.get(campo) for nombre, stats in pools.items()}
+        for campo in ("checked_out", "checked_in", "overflow", "waits", "wait_seconds")
+    }
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+app.include_router(internal_router)
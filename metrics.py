@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites de los buckets (segundos), los mismos del cliente oficial de Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+# Repeticiones de un mismo SELECT dentro de un request a partir de las cuales se considera un N+1
+N_PLUS_ONE_THRESHOLD = 10
+
+# Métricas
+class Histogram:
+    """Histograma acumulativo por combinación de etiquetas, en el formato de exposición de Prometheus."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            serie = self._series.get(label_values)
+            if serie is None:
+                # [conteo por bucket..., +Inf, suma]
+                serie = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            serie[bisect_left(self.buckets, value)] += 1
+            serie[-1] += value
+
+    def render(self) -> str:
+        lineas = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_values, serie in sorted(series.items()):
+            etiquetas = _labels(self.labels, label_values)
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), serie[:-1]):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else repr(float(limite))
+                lineas.append(f'{self.name}_bucket{{{etiquetas}{"," if etiquetas else ""}le="{le}"}} {acumulado}')
+            lineas.append(f"{self.name}_sum{{{etiquetas}}} {serie[-1]}")
+            lineas.append(f"{self.name}_count{{{etiquetas}}} {acumulado}")
+        return "\n".join(lineas)
+
+class CounterMetric:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self) -> str:
+        lineas = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            valores = dict(self._values)
+        for label_values, valor in sorted(valores.items()):
+            lineas.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {valor}")
+        return "\n".join(lineas)
+
+def _labels(nombres: Tuple[str, ...], valores: tuple) -> str:
+    return ",".join(f'{n}="{str(v)}"' for n, v in zip(nombres, valores))
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Duración de los requests HTTP.", ("method", "route", "status"))
+DB_DURATION = Histogram("http_request_db_seconds", "Tiempo en la base de datos por request.", ("method", "route"))
+DB_QUERIES = Histogram("http_request_db_queries", "Consultas SQL ejecutadas por request.", ("method", "route"), QUERY_BUCKETS)
+POOL_WAIT = Histogram("http_request_pool_wait_seconds", "Espera por una conexión del pool por request.", ("method", "route"))
+SERIALIZATION_DURATION = Histogram("http_request_serialization_seconds", "Codificación del cuerpo de la respuesta por request.", ("method", "route"))
+N_PLUS_ONE = CounterMetric("http_request_n_plus_one_total", "Requests en los que un mismo SELECT se repitió al menos N_PLUS_ONE_THRESHOLD veces.", ("method", "route"))
+
+# Contabilidad por request
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "pool_wait_seconds", "serialization_seconds", "selects")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.selects: Counter = Counter()
+
+    def n_plus_one(self) -> Optional[str]:
+        """El SELECT más repetido si supera el umbral de N+1."""
+        if not self.selects:
+            return None
+        statement, veces = self.selects.most_common(1)[0]
+        return statement if veces >= N_PLUS_ONE_THRESHOLD else None
+
+    def server_timing(self, total: float) -> str:
+        partes = [
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"',
+            f"ser;dur={self.serialization_seconds * 1000:.2f}",
+            f"app;dur={total * 1000:.2f}",
+        ]
+        if self.pool_wait_seconds:
+            partes.insert(1, f"pool;dur={self.pool_wait_seconds * 1000:.2f}")
+        return ", ".join(partes)
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def record_query(statement: str, seconds: float):
+    """Llamado por los eventos del engine (ver database.py) después de cada sentencia."""
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += seconds
+    if statement.lstrip()[:6].upper() == "SELECT":
+        stats.selects[statement] += 1
+
+def record_pool_wait(seconds: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+def record_serialization(seconds: float):
+    """Llamado por la respuesta JSON por defecto al codificar el cuerpo y por `rows_response` (ver serialization.py)."""
+    stats = _current.get()
+    if stats is not None:
+        stats.serialization_seconds += seconds
+
+# Middleware ASGI
+class MetricsMiddleware:
+    """
+    Mide cada request HTTP: duración por ruta (la plantilla, p. ej. `/autos/{auto_id}`), consultas y tiempo
+    en la base, espera por el pool y serialización. Agrega el header `Server-Timing` a la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        inicio = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing(time.perf_counter() - inicio).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            duracion = time.perf_counter() - inicio
+            route = scope.get("route")
+            # Las rutas inexistentes se agrupan para no crear una serie por cada URL
+            ruta = getattr(route, "path", "<unmatched>")
+            metodo = scope["method"]
+            REQUEST_DURATION.observe(duracion, metodo, ruta, str(status_code))
+            DB_DURATION.observe(stats.db_seconds, metodo, ruta)
+            DB_QUERIES.observe(stats.queries, metodo, ruta)
+            SERIALIZATION_DURATION.observe(stats.serialization_seconds, metodo, ruta)
+            if stats.pool_wait_seconds:
+                POOL_WAIT.observe(stats.pool_wait_seconds, metodo, ruta)
+            repetido = stats.n_plus_one()
+            if repetido:
+                N_PLUS_ONE.inc(metodo, ruta)
+                logger.warning("Posible N+1 en %s %s: %d consultas, SELECT repetido: %s", metodo, ruta, stats.queries, repetido[:200])
+
+# Exposición
+def render(gauges: Dict[str, Dict[str, float]] = None) -> str:
+    """
+    Todas las métricas en el formato de texto de Prometheus.
+    `gauges` agrega valores instantáneos por pool: {"db_pool_checked_out": {"sync": 1, "async": 3}, ...}.
+    """
+    bloques = [m.render() for m in (REQUEST_DURATION, DB_DURATION, DB_QUERIES, POOL_WAIT, SERIALIZATION_DURATION, N_PLUS_ONE)]
+    for nombre, valores in (gauges or {}).items():
+        lineas = [f"# TYPE {nombre} gauge"]
+        lineas += [f'{nombre}{{pool="{pool}"}} {valor}' for pool, valor in valores.items() if valor is not None]
+        bloques.append("\n".join(lineas))
+    return "\n".join(bloques) + "\n"
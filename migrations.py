@@ -0,0 +1,218 @@
+"""
+Migraciones del esquema.
+
+Cada migración tiene un número de versión y se aplica una sola vez: las aplicadas quedan registradas en la
+tabla `schema_version`. `migrate(engine)` se ejecuta al iniciar la aplicación (ver main.py) y también puede
+correrse a mano antes de un despliegue:
+
+    python migrations.py           # aplica las pendientes
+    python migrations.py estado    # lista aplicadas y pendientes
+    python migrations.py verificar # falla si hay pendientes (sin DDL)
+
+Con `SCHEMA_MODE=verify` la aplicación no migra al iniciar: sólo ejecuta `verify(engine)`, una lectura de
+`schema_version`, y las migraciones quedan como un paso del despliegue.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+from sqlalchemy import Column, Connection, DateTime, Engine, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import Session, SQLModel
+from models import Auto, ClaveIdempotencia, ConteoFilas, Venta, utcnow
+from search import create_search_indexes
+from analytics import rebuild_auto_summaries
+
+# Tabla de control, fuera de SQLModel.metadata para que `create_all` no la toque
+_metadata = MetaData()
+schema_version = Table(
+    "schema_version", _metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("nombre", String, nullable=False),
+    Column("aplicada_en", DateTime, nullable=False),
+)
+
+# Clave del advisory lock de PostgreSQL: varias instancias que arrancan a la vez migran de a una
+ADVISORY_LOCK_KEY = 0x56454E544153  # "VENTAS"
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    nombre: str
+    upgrade: Callable[[Connection], None]
+    # Las no transaccionales corren en autocommit en PostgreSQL (CREATE INDEX CONCURRENTLY no admite transacción)
+    transaccional: bool = True
+
+# Migraciones
+def _esquema_inicial(conn: Connection):
+    # En una base nueva crea todo con los índices declarados en models.py; en una existente sólo las tablas faltantes
+    SQLModel.metadata.create_all(conn)
+
+def _version_de_filas(conn: Connection):
+    # Columnas de versionado de user-010 (ETag) en bases creadas antes de existir
+    existentes = {tabla: {c["name"] for c in inspect(conn).get_columns(tabla)} for tabla in ("auto", "venta")}
+    postgres = conn.dialect.name == "postgresql"
+    for tabla, columnas in existentes.items():
+        if "version" not in columnas:
+            conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+        if "updated_at" not in columnas:
+            if postgres:
+                conn.execute(text(
+                    f"ALTER TABLE {tabla} ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc')"
+                ))
+            else:
+                # SQLite no admite defaults no constantes en ADD COLUMN
+                conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT '1970-01-01 00:00:00'"))
+                conn.execute(text(f"UPDATE {tabla} SET updated_at = :ahora"), {"ahora": utcnow()})
+
+# Índices que crea la migración 003: los de models.py cuando se escribió. Los índices declarados después los
+# crea su propia migración (sus columnas pueden no existir todavía al aplicar la 003 en una base anterior)
+_INDICES_003 = {
+    "ix_venta_fecha_venta_id", "ix_venta_auto_id_fecha_venta", "ix_venta_precio", "ix_venta_updated_at",
+    "ix_venta_fecha_venta_brin", "ix_auto_updated_at", "ix_auto_marca", "ix_auto_numero_chasis",
+}
+
+def _indices_de_consultas(conn: Connection):
+    # Índices compuestos / de cobertura de models.py; CONCURRENTLY en PostgreSQL para no bloquear escrituras
+    postgres = conn.dialect.name == "postgresql"
+    for tabla in (Venta.__table__, Auto.__table__):
+        for index in sorted(tabla.indexes, key=lambda i: i.name):
+            if index.name not in _INDICES_003:
+                continue
+            # Los de un método de acceso de PostgreSQL (BRIN) no existen en otros motores
+            if index.dialect_kwargs.get("postgresql_using") and not postgres:
+                continue
+            sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+            if postgres:
+                sql = sql.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+            conn.execute(text(sql))
+    # El índice simple sobre auto_id queda cubierto por (auto_id, fecha_venta)
+    conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if postgres else ''}IF EXISTS ix_venta_auto_id"))
+
+def _busqueda_por_trigramas(conn: Connection):
+    create_search_indexes(conn)
+
+def _conteo_de_filas(conn: Connection):
+    # Contador de autos para el total de los listados; desde acá lo mantiene el repositorio
+    ConteoFilas.__table__.create(conn, checkfirst=True)
+    conn.execute(text("DELETE FROM conteo_filas WHERE tabla = 'auto'"))
+    conn.execute(text("INSERT INTO conteo_filas (tabla, cantidad) SELECT 'auto', COUNT(*) FROM auto"))
+
+def _resumen_de_ventas_por_auto(conn: Connection):
+    # Resumen de ventas de cada auto (ver analytics.py). Corre en autocommit en PostgreSQL: si se interrumpe,
+    # al reintentarla las columnas e índices existentes se saltean y el resumen se vuelve a calcular.
+    postgres = conn.dialect.name == "postgresql"
+    columnas = {c["name"] for c in inspect(conn).get_columns("auto")}
+    nuevas = {
+        "ventas_count": "INTEGER NOT NULL DEFAULT 0",
+        "total_ventas": "FLOAT NOT NULL DEFAULT 0",
+        "ultima_venta_fecha": "TIMESTAMP",
+        "ultimo_precio": "FLOAT",
+    }
+    for columna, tipo in nuevas.items():
+        if columna not in columnas:
+            conn.execute(text(f"ALTER TABLE auto ADD COLUMN {columna} {tipo}"))
+    with Session(bind=conn) as session:
+        rebuild_auto_summaries(session)
+        session.commit()
+    for index in sorted(Auto.__table__.indexes, key=lambda i: i.name):
+        if index.name.startswith(("ix_auto_ventas_count", "ix_auto_total_ventas", "ix_auto_ultima", "ix_auto_ultimo")):
+            sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+            if postgres:
+                sql = sql.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+            conn.execute(text(sql))
+
+def _claves_de_idempotencia(conn: Connection):
+    ClaveIdempotencia.__table__.create(conn, checkfirst=True)
+
+def _propietario_de_claves(conn: Connection):
+    # Token del request que tiene tomada la clave (ver idempotency.py); las claves en curso de antes quedan sin
+    # propietario y las toma el siguiente reintento cuando vence su plazo
+    columnas = {c["name"] for c in inspect(conn).get_columns("clave_idempotencia")}
+    if "propietario" not in columnas:
+        conn.execute(text("ALTER TABLE clave_idempotencia ADD COLUMN propietario VARCHAR(32)"))
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "esquema_inicial", _esquema_inicial),
+    Migration(2, "version_de_filas", _version_de_filas),
+    Migration(3, "indices_de_consultas", _indices_de_consultas, transaccional=False),
+    Migration(4, "busqueda_por_trigramas", _busqueda_por_trigramas),
+    Migration(5, "conteo_de_filas", _conteo_de_filas),
+    Migration(6, "resumen_de_ventas_por_auto", _resumen_de_ventas_por_auto, transaccional=False),
+    Migration(7, "claves_de_idempotencia", _claves_de_idempotencia),
+    Migration(8, "propietario_de_claves", _propietario_de_claves),
+]
+
+# Ejecución
+def applied_versions(conn: Connection) -> set:
+    schema_version.create(conn, checkfirst=True)
+    return {v for (v,) in conn.execute(schema_version.select().with_only_columns(schema_version.c.version))}
+
+def _apply(engine: Engine, migration: Migration):
+    if migration.transaccional or engine.dialect.name != "postgresql":
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(schema_version.insert().values(version=migration.version, nombre=migration.nombre, aplicada_en=utcnow()))
+        return
+    # Si falla a mitad queda sin registrar: los IF NOT EXISTS permiten reintentarla
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        migration.upgrade(conn)
+        conn.execute(schema_version.insert().values(version=migration.version, nombre=migration.nombre, aplicada_en=utcnow()))
+
+def migrate(engine: Engine) -> List[int]:
+    """Aplica en orden las migraciones pendientes y devuelve las versiones aplicadas."""
+    postgres = engine.dialect.name == "postgresql"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock:
+        if postgres:
+            lock.execute(text("SELECT pg_advisory_lock(:k)"), {"k": ADVISORY_LOCK_KEY})
+        try:
+            # Leídas con el lock tomado: otra instancia pudo haber migrado mientras se esperaba
+            aplicadas = applied_versions(lock)
+            pendientes = [m for m in MIGRATIONS if m.version not in aplicadas]
+            for migration in pendientes:
+                print(f"Aplicando migración {migration.version:03d}_{migration.nombre}...")
+                _apply(engine, migration)
+            if not pendientes:
+                print("Esquema al día: no hay migraciones pendientes.")
+            return [m.version for m in pendientes]
+        finally:
+            if postgres:
+                lock.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": ADVISORY_LOCK_KEY})
+
+def verify(engine: Engine) -> None:
+    """Verifica que todas las migraciones estén aplicadas, sin ejecutar DDL. Si faltan, lanza RuntimeError."""
+    with engine.connect() as conn:
+        aplicadas = set()
+        if inspect(conn).has_table(schema_version.name):
+            aplicadas = {v for (v,) in conn.execute(schema_version.select().with_only_columns(schema_version.c.version))}
+    pendientes = [f"{m.version:03d}_{m.nombre}" for m in MIGRATIONS if m.version not in aplicadas]
+    if pendientes:
+        raise RuntimeError(
+            f"Esquema desactualizado, migraciones pendientes: {', '.join(pendientes)}. Ejecutar `python migrations.py`"
+        )
+
+def status(engine: Engine) -> List[dict]:
+    with engine.begin() as conn:
+        schema_version.create(conn, checkfirst=True)
+        aplicadas = {fila.version: fila.aplicada_en for fila in conn.execute(schema_version.select())}
+    return [
+        {"version": m.version, "nombre": m.nombre, "aplicada_en": aplicadas.get(m.version)}
+        for m in MIGRATIONS
+    ]
+
+if __name__ == "__main__":
+    import sys
+    from database import engine
+
+    if sys.argv[1:] == ["estado"]:
+        for fila in status(engine):
+            fecha = fila["aplicada_en"]
+            estado = fecha.isoformat(timespec="seconds") if isinstance(fecha, datetime) else "pendiente"
+            print(f"{fila['version']:03d}_{fila['nombre']:<28} {estado}")
+    elif sys.argv[1:] == ["verificar"]:
+        try:
+            verify(engine)
+        except RuntimeError as e:
+            sys.exit(str(e))
+        print("Esquema al día.")
+    else:
+        migrate(engine)
@@ -1,9 +1,13 @@
-from typing import Optional, List
-from datetime import datetime
-from pydantic import Field, validator
-from sqlmodel import SQLModel, Field, Relationship
+from typing import Optional, List, Union
+from datetime import datetime, timezone
+from pydantic import Field, validator, model_validator
+from sqlmodel import SQLModel, Field, Relationship, Index
 import re
 
+def utcnow() -> datetime:
+    # Marca de tiempo en UTC sin zona horaria (las columnas DateTime no guardan zona)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 ## Modelo Auto
 # Modelo Base
 class AutoBase(SQLModel):
@@ -35,7 +39,8 @@ class VentaBase(SQLModel):
     nombre_comprador: str
     precio: float = Field(gt=0)
     fecha_venta: datetime = Field(default_factory=datetime.now)
-    auto_id: int = Field(foreign_key="auto.id", index=True)
+    # Sin índice propio: lo cubre el índice compuesto (auto_id, fecha_venta) de la tabla
+    auto_id: int = Field(foreign_key="auto.id")
 
     @validator('nombre_comprador')
     def comprador_no_vacio(cls, value):
@@ -61,11 +66,47 @@ class VentaUpdate(SQLModel):
 
 # Modelos de Tablas y relaciones
 class Venta(VentaBase, table=True):
+    # Índices según las consultas del repositorio (en una base existente los crea migrations.py)
+    __table_args__ = (
+        # Paginación por keyset y filtros por rango de fechas
+        Index("ix_venta_fecha_venta_id", "fecha_venta", "id"),
+        # Ventas de un auto ordenadas por fecha; `precio` incluido para sumar sin leer la tabla (resúmenes)
+        Index("ix_venta_auto_id_fecha_venta", "auto_id", "fecha_venta", postgresql_include=["precio"]),
+        # Filtros min_precio / max_precio
+        Index("ix_venta_precio", "precio"),
+        # ETag de los listados (máxima fecha de modificación)
+        Index("ix_venta_updated_at", "updated_at"),
+        # Exportaciones y estadísticas por rangos de fechas amplios: un BRIN ocupa pocas páginas y las ventas
+        # se insertan en orden aproximado de fecha (sólo PostgreSQL)
+        Index("ix_venta_fecha_venta_brin", "fecha_venta", postgresql_using="brin").ddl_if(dialect="postgresql"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Versión de la fila: la incrementa `update` del repositorio (ETag / Last-Modified)
+    version: int = Field(default=1)
+    updated_at: datetime = Field(default_factory=utcnow)
     auto: "Auto" = Relationship(back_populates="ventas") # Relación Many-to-one
 
 class Auto(AutoBase, table=True):
+    __table_args__ = (
+        # ETag de los listados (máxima fecha de modificación)
+        Index("ix_auto_updated_at", "updated_at"),
+        # Orden de `GET /autos/` por el resumen de ventas (keyset sobre (clave, id))
+        Index("ix_auto_ventas_count_id", "ventas_count", "id"),
+        Index("ix_auto_total_ventas_id", "total_ventas", "id"),
+        Index("ix_auto_ultima_venta_fecha_id", "ultima_venta_fecha", "id"),
+        Index("ix_auto_ultimo_precio_id", "ultimo_precio", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Versión de la fila: la incrementa `update` del repositorio (ETag / Last-Modified)
+    version: int = Field(default=1)
+    updated_at: datetime = Field(default_factory=utcnow)
+    # Resumen de las ventas del auto: lo actualizan las escrituras de ventas en su misma transacción (ver analytics.py)
+    ventas_count: int = Field(default=0)
+    total_ventas: float = Field(default=0.0)
+    ultima_venta_fecha: Optional[datetime] = None
+    ultimo_precio: Optional[float] = None
     ventas: List[Venta] = Relationship(
         back_populates="auto",
         sa_relationship_kwargs={
@@ -73,6 +114,47 @@ class Auto(AutoBase, table=True):
         }
     ) # Relación One-to-many
 
+# Tablas de resumen de ventas (mantenidas de forma incremental por el repositorio de ventas)
+class ResumenVentasModelo(SQLModel, table=True):
+    __tablename__ = "resumen_ventas_modelo"
+    marca: str = Field(primary_key=True)
+    modelo: str = Field(primary_key=True)
+    cantidad: int = 0
+    total: float = 0
+
+class ResumenVentasMensual(SQLModel, table=True):
+    __tablename__ = "resumen_ventas_mensual"
+    periodo: str = Field(primary_key=True) # "YYYY-MM"
+    cantidad: int = 0
+    total: float = 0
+
+# Contadores de filas (mantenidos por los repositorios) para el total de los listados sin COUNT(*).
+# Las ventas no lo necesitan: su total es la suma de `resumen_ventas_mensual`.
+class ConteoFilas(SQLModel, table=True):
+    __tablename__ = "conteo_filas"
+    tabla: str = Field(primary_key=True)
+    cantidad: int = 0
+
+# Claves de idempotencia de las altas (`Idempotency-Key`, ver idempotency.py)
+class ClaveIdempotencia(SQLModel, table=True):
+    __tablename__ = "clave_idempotencia"
+    __table_args__ = (
+        # Purga de las claves vencidas
+        Index("ix_clave_idempotencia_expira", "expira"),
+    )
+    alcance: str = Field(primary_key=True) # endpoint: "autos" / "ventas"
+    clave: str = Field(primary_key=True, max_length=255)
+    # SHA-256 del cuerpo validado: la misma clave con otro cuerpo se rechaza
+    huella: str
+    # Respuesta guardada; `estado` es None mientras el alta está en curso
+    estado: Optional[int] = None
+    respuesta: Optional[str] = None
+    # Mientras está en curso, otro request puede tomar la clave recién cuando vence este plazo
+    bloqueada_hasta: datetime
+    # Token del request que tomó la clave: sólo él guarda la respuesta, renueva el plazo o la libera
+    propietario: Optional[str] = Field(default=None, max_length=32)
+    expira: datetime
+
 # Modelos de respuesta API
 class VentaResponse(VentaBase):
     id: int
@@ -86,10 +168,81 @@ class AutoResponse(AutoBase):
     class Config:
         from_attributes: True
 
+class AutoResponseConResumen(AutoResponse):
+    # Resumen de ventas del auto: sólo con `resumen_ventas=true` u `orden` por uno de estos campos en `GET /autos/`
+    ventas_count: Optional[int] = None
+    total_ventas: Optional[float] = None
+    ultima_venta_fecha: Optional[datetime] = None
+    ultimo_precio: Optional[float] = None
+
 class AutoResponseWithVentas(AutoResponse):
     ventas: List[VentaResponse] = []
 
 class VentaResponseWithAuto(VentaResponse):
     auto: AutoResponse
 
-
+# Modelos de consulta por lotes
+MAX_BATCH_SIZE = 500
+
+class AutoBatchGet(SQLModel):
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=MAX_BATCH_SIZE)
+    numeros_chasis: Optional[List[str]] = Field(None, min_length=1, max_length=MAX_BATCH_SIZE)
+
+    @model_validator(mode="after")
+    def una_sola_clave(self):
+        if (self.ids is None) == (self.numeros_chasis is None):
+            raise ValueError("Se debe enviar `ids` o `numeros_chasis` (uno de los dos).")
+        return self
+
+class VentaBatchGet(SQLModel):
+    ids: List[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+class AutoBatchItem(SQLModel):
+    clave: Union[int, str]
+    encontrado: bool
+    auto: Optional[AutoResponse] = None
+
+class VentaBatchItem(SQLModel):
+    clave: int
+    encontrado: bool
+    venta: Optional[VentaResponse] = None
+
+# Modelos de importación masiva
+class BulkImportError(SQLModel):
+    fila: int
+    error: str
+
+class BulkImportResult(SQLModel):
+    total: int
+    insertados: int
+    rechazados: int
+    errores: List[BulkImportError] = []
+
+# Modelos de estadísticas
+class VentasPorMarca(SQLModel):
+    marca: str
+    cantidad: int
+    total: float
+    promedio: float
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+
+class VentasPorModelo(SQLModel):
+    marca: str
+    modelo: str
+    cantidad: int
+    total: float
+    promedio: float
+
+class VentasMensuales(SQLModel):
+    periodo: str
+    cantidad: int
+    total: float
+    promedio: float
+
+class InventarioPorMarca(SQLModel):
+    marca: str
+    autos: int
+    vendidos: int
+    disponibles: int
+    anio_promedio: float
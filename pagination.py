@@ -0,0 +1,42 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Type
+from fastapi import HTTPException, Response, status
+
+# Excepciones
+class InvalidCursorException(HTTPException):
+    def __init__(self, detail: str = "Cursor de paginación inválido"):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+# Cursores opacos
+def encode_cursor(*values: Any) -> str:
+    """Codifica los valores de la clave de ordenamiento de la última fila en un cursor opaco."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, types: Sequence[Type], nullable: bool = False) -> List[Any]:
+    """
+    Decodifica un cursor generado por `encode_cursor` validando la cantidad y el tipo de cada valor. Con
+    `nullable` se aceptan valores nulos (claves de orden que pueden ser NULL).
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise ValueError("cantidad de valores inesperada")
+        return [
+            None if v is None and nullable else datetime.fromisoformat(v) if t is datetime else t(v)
+            for v, t in zip(payload, types)
+        ]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorException(f"Cursor de paginación inválido: {e}")
+
+# Totales
+def set_total(response: Response, total: Optional[int], exacto: bool):
+    """Headers `X-Total-Count` (total de resultados del filtro) y `X-Total-Count-Exact` (`false` si es una estimación)."""
+    if total is None:
+        return
+    response.headers["X-Total-Count"] = str(total)
+    response.headers["X-Total-Count-Exact"] = "true" if exacto else "false"
@@ -0,0 +1,302 @@
+"""
+Particionado de `venta` por rango de `fecha_venta` (sólo PostgreSQL).
+
+La tabla se convierte una vez en una tabla particionada por mes o por año. Desde ahí, las consultas con
+filtros de fecha sólo leen las particiones del rango (partition pruning), y archivar ventas viejas es
+separar particiones completas (DETACH), no un DELETE fila por fila.
+
+    python partitions.py convertir --por mes     # conversión inicial (copia la tabla; requiere una ventana de mantenimiento)
+    python partitions.py rotar                   # crea las particiones de los próximos períodos
+    python partitions.py archivar --antes 2020-01 [--esquema archivo | --eliminar]
+    python partitions.py estado
+
+- **Rotación:** al iniciar en modo `migrate`, la app crea las particiones del período actual y de los
+  `VENTA_PARTITIONS_AHEAD` siguientes; en modo `verify`, se programa `python partitions.py rotar` (cron).
+  Una partición por defecto (`venta_default`) recibe las ventas fuera de rango, así un alta nunca falla
+  por falta de partición; al crear la partición de ese rango, sus filas se mueven a ella.
+- **Claves:** la clave primaria pasa a ser (`id`, `fecha_venta`), porque PostgreSQL exige que incluya la
+  columna de partición; `id` sigue saliendo de la misma secuencia.
+- **Archivo:** al separar particiones se descuentan sus ventas de los resúmenes, para que estadísticas y
+  totales reflejen sólo las ventas de la tabla.
+"""
+import re
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy import Connection, Engine, text
+from sqlalchemy.schema import CreateIndex
+from models import Auto, Venta
+from analytics import last_sale_update
+from search import create_search_indexes
+
+TABLA = "venta"
+DEFAULT = f"{TABLA}_default"
+GRANULARIDADES = ("mes", "anio")
+
+# Clave del advisory lock de la rotación: varias instancias que arrancan a la vez crean las particiones de a una
+ADVISORY_LOCK_KEY = 0x5041525449  # "PARTI"
+# Espera máxima por el lock de `venta` al separar o agregar particiones: no se encolan los requests detrás
+LOCK_TIMEOUT = "5s"
+
+class Particion(NamedTuple):
+    nombre: str
+    desde: Optional[datetime]
+    hasta: Optional[datetime]
+    filas_estimadas: int
+
+    @property
+    def default(self) -> bool:
+        return self.desde is None
+
+# Períodos
+def _inicio(fecha: datetime, granularidad: str) -> datetime:
+    return datetime(fecha.year, fecha.month if granularidad == "mes" else 1, 1)
+
+def _siguiente(inicio: datetime, granularidad: str) -> datetime:
+    if granularidad == "anio":
+        return datetime(inicio.year + 1, 1, 1)
+    return datetime(inicio.year + (inicio.month == 12), inicio.month % 12 + 1, 1)
+
+def _nombre(inicio: datetime, granularidad: str) -> str:
+    return f"{TABLA}_p{inicio:%Y_%m}" if granularidad == "mes" else f"{TABLA}_p{inicio:%Y}"
+
+def _periodos(desde: datetime, hasta: datetime, granularidad: str) -> List[Tuple[datetime, datetime]]:
+    """Períodos (inicio, fin) que cubren [desde, hasta]."""
+    periodos, inicio = [], _inicio(desde, granularidad)
+    while inicio <= hasta:
+        fin = _siguiente(inicio, granularidad)
+        periodos.append((inicio, fin))
+        inicio = fin
+    return periodos
+
+def _periodos_adelante(ahora: datetime, adelante: int, granularidad: str) -> List[Tuple[datetime, datetime]]:
+    inicio = _inicio(ahora, granularidad)
+    periodos = []
+    for _ in range(adelante + 1):
+        fin = _siguiente(inicio, granularidad)
+        periodos.append((inicio, fin))
+        inicio = fin
+    return periodos
+
+# Consultas al catálogo
+def _requiere_postgres(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        raise RuntimeError("El particionado de ventas sólo está disponible en PostgreSQL")
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:t))"
+    ), {"t": TABLA}).scalar_one()
+
+_LIMITES = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+def list_partitions(conn: Connection) -> List[Particion]:
+    """Particiones de `venta` ordenadas por fecha (la partición por defecto al final)."""
+    filas = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:t)
+    """), {"t": TABLA}).all()
+    particiones = []
+    for nombre, limites, filas_estimadas in filas:
+        m = _LIMITES.search(limites)
+        desde, hasta = (datetime.fromisoformat(m.group(1)), datetime.fromisoformat(m.group(2))) if m else (None, None)
+        particiones.append(Particion(nombre, desde, hasta, filas_estimadas))
+    return sorted(particiones, key=lambda p: (p.default, p.desde or datetime.min))
+
+def granularity(particiones: List[Particion]) -> str:
+    """Granularidad con la que se convirtió la tabla, deducida de sus particiones."""
+    for p in particiones:
+        if not p.default:
+            return "anio" if p.hasta.year > p.desde.year and p.hasta.month == p.desde.month else "mes"
+    raise RuntimeError(f"La tabla {TABLA} no tiene particiones por rango")
+
+# Creación de particiones
+def _create_partition(conn: Connection, inicio: datetime, fin: datetime, granularidad: str) -> str:
+    nombre = _nombre(inicio, granularidad)
+    limites = {"desde": inicio, "hasta": fin}
+    en_default = conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT} WHERE fecha_venta >= :desde AND fecha_venta < :hasta)"
+    ), limites).scalar_one()
+    if not en_default:
+        conn.execute(text(
+            f"CREATE TABLE {nombre} PARTITION OF {TABLA} "
+            f"FOR VALUES FROM ('{inicio.isoformat(' ')}') TO ('{fin.isoformat(' ')}')"
+        ))
+        return nombre
+    # La partición por defecto ya tiene ventas del período: se mueven a la nueva antes de adjuntarla
+    conn.execute(text(f"CREATE TABLE {nombre} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(
+        f"WITH movidas AS (DELETE FROM {DEFAULT} WHERE fecha_venta >= :desde AND fecha_venta < :hasta RETURNING *) "
+        f"INSERT INTO {nombre} SELECT * FROM movidas"
+    ), limites)
+    conn.execute(text(
+        f"ALTER TABLE {TABLA} ATTACH PARTITION {nombre} "
+        f"FOR VALUES FROM ('{inicio.isoformat(' ')}') TO ('{fin.isoformat(' ')}')"
+    ))
+    return nombre
+
+def rotate(engine: Engine, adelante: int = 3, ahora: Optional[datetime] = None) -> List[str]:
+    """
+    Crea las particiones faltantes del período actual y de los `adelante` siguientes. Devuelve las creadas.
+    Si `venta` no está particionada (o la base no es PostgreSQL) no hace nada.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": ADVISORY_LOCK_KEY})
+        conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        particiones = list_partitions(conn)
+        granularidad = granularity(particiones)
+        existentes = {p.desde for p in particiones}
+        creadas = [
+            _create_partition(conn, inicio, fin, granularidad)
+            for inicio, fin in _periodos_adelante(ahora or datetime.now(), adelante, granularidad)
+            if inicio not in existentes
+        ]
+    for nombre in creadas:
+        print(f"Partición creada: {nombre}")
+    return creadas
+
+# Conversión inicial
+def convert(engine: Engine, granularidad: str, adelante: int = 3) -> List[str]:
+    """
+    Convierte `venta` en una tabla particionada por `granularidad` ("mes" o "anio"): crea la tabla nueva con
+    las particiones del rango de fechas existente (más `adelante` períodos), copia las filas, elimina la
+    original y recrea la clave primaria y los índices. Todo en una transacción, con `venta` bloqueada.
+    """
+    if granularidad not in GRANULARIDADES:
+        raise ValueError(f"Granularidad inválida: {granularidad!r} (valores posibles: {', '.join(GRANULARIDADES)})")
+    with engine.begin() as conn:
+        _requiere_postgres(conn)
+        if is_partitioned(conn):
+            raise RuntimeError(f"La tabla {TABLA} ya está particionada")
+        conn.execute(text(f"LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE"))
+        primera, ultima = conn.execute(text(f"SELECT MIN(fecha_venta), MAX(fecha_venta) FROM {TABLA}")).one()
+        ahora = datetime.now()
+        periodos = _periodos(min(primera or ahora, ahora), max(ultima or ahora, ahora), granularidad)
+        periodos += [p for p in _periodos_adelante(ahora, adelante, granularidad) if p not in periodos]
+
+        anterior = f"{TABLA}_sin_particionar"
+        conn.execute(text(f"ALTER TABLE {TABLA} RENAME TO {anterior}"))
+        conn.execute(text(
+            f"CREATE TABLE {TABLA} (LIKE {anterior} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (fecha_venta)"
+        ))
+        conn.execute(text(f"CREATE TABLE {DEFAULT} PARTITION OF {TABLA} DEFAULT"))
+        creadas = [_create_partition(conn, inicio, fin, granularidad) for inicio, fin in periodos]
+        conn.execute(text(f"INSERT INTO {TABLA} SELECT * FROM {anterior}"))
+        # La secuencia de `id` pertenece a la columna de la tabla original: se transfiere antes de eliminarla
+        secuencia = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": anterior}).scalar_one()
+        if secuencia:
+            conn.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY {TABLA}.id"))
+        conn.execute(text(f"DROP TABLE {anterior}"))
+
+        # Índices después de la carga (más rápido que mantenerlos fila por fila); se propagan a cada partición
+        conn.execute(text(f"ALTER TABLE {TABLA} ADD PRIMARY KEY (id, fecha_venta)"))
+        conn.execute(text(f"ALTER TABLE {TABLA} ADD FOREIGN KEY (auto_id) REFERENCES auto (id)"))
+        for index in sorted(Venta.__table__.indexes, key=lambda i: i.name):
+            conn.execute(CreateIndex(index, if_not_exists=True))
+        create_search_indexes(conn)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"ANALYZE {TABLA}"))
+    return creadas
+
+# Archivo
+def _descontar_resumenes(conn: Connection, particion: str) -> None:
+    # Las ventas de la partición dejan de contar en los resúmenes por modelo y por mes
+    conn.execute(text(f"""
+        UPDATE resumen_ventas_modelo r SET cantidad = r.cantidad - p.cantidad, total = r.total - p.total
+        FROM (
+            SELECT a.marca, a.modelo, COUNT(*) AS cantidad, SUM(v.precio) AS total
+            FROM {particion} v JOIN auto a ON a.id = v.auto_id
+            GROUP BY a.marca, a.modelo
+        ) p
+        WHERE r.marca = p.marca AND r.modelo = p.modelo
+    """))
+    conn.execute(text(f"""
+        UPDATE resumen_ventas_mensual r SET cantidad = r.cantidad - p.cantidad, total = r.total - p.total
+        FROM (
+            SELECT to_char(fecha_venta, 'YYYY-MM') AS periodo, COUNT(*) AS cantidad, SUM(precio) AS total
+            FROM {particion} GROUP BY 1
+        ) p
+        WHERE r.periodo = p.periodo
+    """))
+    conn.execute(text("DELETE FROM resumen_ventas_modelo WHERE cantidad <= 0"))
+    conn.execute(text("DELETE FROM resumen_ventas_mensual WHERE cantidad <= 0"))
+    # Y en el resumen de cada auto (la última venta se recalcula después del DETACH, ver `archive`)
+    conn.execute(text(f"""
+        UPDATE auto a SET ventas_count = a.ventas_count - p.cantidad, total_ventas = a.total_ventas - p.total,
+            updated_at = now() at time zone 'utc'
+        FROM (SELECT auto_id, COUNT(*) AS cantidad, SUM(precio) AS total FROM {particion} GROUP BY auto_id) p
+        WHERE a.id = p.auto_id
+    """))
+
+def archive(engine: Engine, antes: datetime, esquema: Optional[str] = None, eliminar: bool = False) -> List[str]:
+    """
+    Separa de `venta` las particiones que terminan antes de `antes` y descuenta sus ventas de los resúmenes
+    (incluido el de cada auto), en una sola transacción. Las particiones separadas quedan como tablas sueltas
+    (en `esquema`, si se indica) o se eliminan con `eliminar`. Devuelve los nombres de las particiones separadas.
+    """
+    with engine.begin() as conn:
+        _requiere_postgres(conn)
+        if not is_partitioned(conn):
+            raise RuntimeError(f"La tabla {TABLA} no está particionada (ver `python partitions.py convertir`)")
+        conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        viejas = [p for p in list_partitions(conn) if not p.default and p.hasta <= antes]
+        if esquema:
+            conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{esquema}"'))
+        for particion in viejas:
+            _descontar_resumenes(conn, particion.nombre)
+            conn.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {particion.nombre}"))
+            if eliminar:
+                conn.execute(text(f"DROP TABLE {particion.nombre}"))
+            elif esquema:
+                conn.execute(text(f'ALTER TABLE {particion.nombre} SET SCHEMA "{esquema}"'))
+        if viejas:
+            # Autos cuya última venta quedó en una partición separada: la última pasa a ser la anterior que quede
+            conn.execute(last_sale_update().where(Auto.__table__.c.ultima_venta_fecha < antes))
+    return [p.nombre for p in viejas]
+
+if __name__ == "__main__":
+    import argparse
+    from config import get_settings
+
+    parser = argparse.ArgumentParser(description="Particionado de la tabla venta por fecha_venta (PostgreSQL)")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    convertir = comandos.add_parser("convertir", help="Convierte venta en una tabla particionada")
+    convertir.add_argument("--por", choices=GRANULARIDADES, default="mes")
+    comandos.add_parser("rotar", help="Crea las particiones de los próximos períodos")
+    archivar = comandos.add_parser("archivar", help="Separa las particiones anteriores a una fecha")
+    archivar.add_argument("--antes", required=True, type=lambda v: datetime.strptime(v, "%Y-%m"), help="Primer mes que se conserva (YYYY-MM)")
+    destino = archivar.add_mutually_exclusive_group()
+    destino.add_argument("--esquema", help="Esquema al que se mueven las particiones separadas")
+    destino.add_argument("--eliminar", action="store_true", help="Elimina las particiones separadas")
+    comandos.add_parser("estado", help="Lista las particiones y sus filas estimadas")
+    args = parser.parse_args()
+    from database import engine
+
+    adelante = get_settings().venta_partitions_ahead
+    try:
+        if args.comando == "convertir":
+            creadas = convert(engine, args.por, adelante)
+            print(f"Tabla {TABLA} particionada por {args.por}: {len(creadas)} particiones más {DEFAULT}.")
+        elif args.comando == "rotar":
+            if not rotate(engine, adelante):
+                print("No hay particiones que crear.")
+        elif args.comando == "archivar":
+            separadas = archive(engine, args.antes, args.esquema, args.eliminar)
+            print(f"Particiones separadas: {', '.join(separadas) or 'ninguna'}")
+        else:
+            with engine.connect() as conn:
+                _requiere_postgres(conn)
+                if not is_partitioned(conn):
+                    raise RuntimeError(f"La tabla {TABLA} no está particionada.")
+                for p in list_partitions(conn):
+                    rango = "DEFAULT" if p.default else f"{p.desde:%Y-%m-%d} .. {p.hasta:%Y-%m-%d}"
+                    print(f"{p.nombre:<24} {rango:<26} ~{p.filas_estimadas} filas")
+    except RuntimeError as e:
+        raise SystemExit(str(e))
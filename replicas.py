@@ -0,0 +1,172 @@
+"""
+Réplicas de lectura.
+
+Con `DATABASE_REPLICA_URLS` (URLs separadas por coma) las lecturas pesadas de los repositorios asíncronos
+(listados, totales, búsquedas, exportaciones, autos con ventas y estadísticas) se ejecutan en una réplica,
+elegida en turnos entre las que están sanas. Las escrituras y las lecturas por id / chasis siguen en la
+primaria: estas últimas llenan la caché, y una réplica atrasada la llenaría con datos viejos hasta el TTL.
+
+- **Salud:** una tarea de fondo consulta cada réplica cada `REPLICA_HEALTH_INTERVAL` segundos. Se descarta
+  la que no responde o, en PostgreSQL, la que tiene más de `REPLICA_MAX_LAG` segundos de retraso.
+- **Fallback:** si una lectura falla por un error de conexión, se repite en la primaria y se vuelve a
+  verificar la réplica. Sin réplicas sanas, todo se lee de la primaria.
+- **Leer lo propio:** con `REPLICA_STICKY_SECONDS`, después de una escritura exitosa el cliente recibe una
+  cookie con la que sus lecturas van a la primaria durante ese tiempo, hasta que las réplicas se pongan al día.
+"""
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from http.cookies import SimpleCookie
+from typing import AsyncIterator, List, Optional
+from fastapi import Depends, Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import get_settings
+from database import create_async_engine_for, get_async_session, get_async_sessionmaker
+
+# Cookie del modo "leer lo propio": timestamp hasta el que el cliente lee de la primaria
+STICKY_COOKIE = "leer_primaria_hasta"
+
+# Retraso de replicación en segundos (0 si la réplica reprodujo todo lo recibido o si es una primaria)
+_LAG_POSTGRES = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+@dataclass
+class Replica:
+    engine: AsyncEngine
+    healthy: bool = True
+    lag: Optional[float] = None
+    error: Optional[str] = None
+    checked_at: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        # Sin la contraseña: se muestra en /internal/replicas y en los logs
+        return self.engine.url.render_as_string(hide_password=True)
+
+class ReplicaSet:
+
+    def __init__(self, engines: List[AsyncEngine], max_lag: float):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.max_lag = max_lag
+        self._turnos = itertools.count()
+
+    def pick(self) -> Optional[AsyncEngine]:
+        """Réplica sana para la próxima lectura (en turnos), o `None` si no hay ninguna."""
+        sanas = [r for r in self.replicas if r.healthy]
+        if not sanas:
+            return None
+        return sanas[next(self._turnos) % len(sanas)].engine
+
+    @staticmethod
+    async def _lag(engine: AsyncEngine) -> float:
+        async with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                return float((await conn.execute(_LAG_POSTGRES)).scalar_one())
+            await conn.execute(text("SELECT 1"))
+            return 0.0
+
+    async def check(self, replica: Replica, timeout: float = 2.0) -> bool:
+        try:
+            replica.lag = await asyncio.wait_for(self._lag(replica.engine), timeout)
+            atrasada = replica.lag > self.max_lag
+            replica.error = f"retraso de {replica.lag:.1f} s" if atrasada else None
+            replica.healthy = not atrasada
+        except Exception as e:
+            replica.healthy, replica.lag, replica.error = False, None, f"{type(e).__name__}: {e}"
+        replica.checked_at = time.time()
+        return replica.healthy
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self.check(r) for r in self.replicas))
+
+    async def report_failure(self, engine: AsyncEngine) -> None:
+        """Una lectura falló por un error de conexión: se verifica ya, sin esperar al próximo chequeo."""
+        for replica in self.replicas:
+            if replica.engine is engine:
+                healthy = await self.check(replica)
+                if not healthy:
+                    print(f"Réplica {replica.name} fuera de servicio: {replica.error}")
+
+    async def monitor(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            antes = [r.healthy for r in self.replicas]
+            await self.check_all()
+            for replica, estaba_sana in zip(self.replicas, antes):
+                if replica.healthy != estaba_sana:
+                    estado = "disponible" if replica.healthy else f"fuera de servicio ({replica.error})"
+                    print(f"Réplica {replica.name} {estado}")
+
+    async def dispose(self) -> None:
+        await asyncio.gather(*(r.engine.dispose() for r in self.replicas))
+
+    def stats(self) -> List[dict]:
+        return [
+            {"replica": r.name, "healthy": r.healthy, "lag_seconds": r.lag, "error": r.error, "checked_at": r.checked_at}
+            for r in self.replicas
+        ]
+
+@lru_cache
+def get_replicas() -> Optional[ReplicaSet]:
+    """Réplicas configuradas (`DATABASE_REPLICA_URLS`), o `None` si todas las lecturas van a la primaria."""
+    settings = get_settings()
+    if not settings.replica_urls:
+        return None
+    return ReplicaSet([create_async_engine_for(url) for url in settings.replica_urls], settings.replica_max_lag)
+
+# Sesión de lectura
+def reads_primary(request: Request) -> bool:
+    """El cliente escribió hace menos de `REPLICA_STICKY_SECONDS`: lee de la primaria."""
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+async def get_read_session(request: Request, session: AsyncSession = Depends(get_async_session)) -> AsyncIterator[AsyncSession]:
+    """
+    Sesión para las lecturas pesadas: sobre una réplica sana, o la misma sesión de la primaria si no hay
+    réplicas, ninguna está sana o el cliente debe leer lo que acaba de escribir.
+    """
+    replicas = get_replicas()
+    engine = replicas.pick() if replicas is not None and not reads_primary(request) else None
+    if engine is None:
+        yield session
+        return
+    async with get_async_sessionmaker()(bind=engine) as replica_session:
+        yield replica_session
+
+class ReadYourWritesMiddleware:
+    """
+    Después de una escritura exitosa (método distinto de GET / HEAD / OPTIONS con estado < 400) envía la
+    cookie `leer_primaria_hasta`: durante `seconds` segundos las lecturas de ese cliente van a la primaria.
+    Los `POST .../batch-get` son lecturas y no la envían.
+    """
+
+    def __init__(self, app: ASGIApp, seconds: int):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS") or scope["path"].endswith("/batch-get"):
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = SimpleCookie()
+                cookie[STICKY_COOKIE] = f"{time.time() + self.seconds:.3f}"
+                cookie[STICKY_COOKIE].update({"max-age": self.seconds, "path": "/", "httponly": True, "samesite": "Lax"})
+                MutableHeaders(raw=message["headers"]).append("set-cookie", cookie.output(header="").strip())
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,9 +1,25 @@
-from typing import Optional, List, Protocol
+import json
+from typing import Callable, NamedTuple, NoReturn, Optional, List, Protocol, Sequence, Tuple, Union
+from sqlalchemy import Row, text, union_all
 from datetime import datetime
-from sqlmodel import Session, select, func
+from sqlalchemy.exc import DBAPIError, IntegrityError as DBIntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import Session, SQLModel, select, func, tuple_, insert, update
 from pydantic import ValidationError
-from models import Auto, Venta, AutoCreate, AutoUpdate, VentaCreate, VentaUpdate
+from models import Auto, Venta, AutoCreate, AutoUpdate, VentaCreate, VentaUpdate, AutoResponse, VentaResponse, ConteoFilas, ResumenVentasMensual, utcnow
 from fastapi import HTTPException, status
+from pagination import encode_cursor, decode_cursor
+from search import contains, search_autos, search_ventas
+from analytics import VentaDeltas, insert_on_conflict, add_row_count
+from config import get_settings
+
+# Columnas de las respuestas: las lecturas de listados y las exportaciones las seleccionan sin entidades ORM
+AUTO_COLUMNS = [getattr(Auto, campo) for campo in AutoResponse.model_fields]
+# Resumen de ventas de cada auto (`resumen_ventas=true` en `GET /autos/`)
+AUTO_SUMMARY_COLUMNS = [Auto.ventas_count, Auto.total_ventas, Auto.ultima_venta_fecha, Auto.ultimo_precio]
+# Claves de orden del listado de autos, con el tipo de su valor en el cursor (`-clave`: descendente)
+AUTO_SORT_KEYS = {"id": int, "ventas_count": int, "total_ventas": float, "ultima_venta_fecha": datetime, "ultimo_precio": float}
+VENTA_COLUMNS = [getattr(Venta, campo) for campo in VentaResponse.model_fields]
 
 # Excepciones
 class NotFoundException(HTTPException):
@@ -14,23 +30,121 @@ class IntegrityError(HTTPException):
     def __init__(self, detail: str):
         super().__init__(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
 
+class PreconditionFailedException(HTTPException):
+    """`If-Match` con una versión que ya no es la actual: otro cliente modificó la fila."""
+    def __init__(self, detail: str):
+        super().__init__(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=detail)
+
+class ConflictException(HTTPException):
+    """La fila cambió en cada reintento de la actualización (sin `If-Match`)."""
+    def __init__(self, detail: str):
+        super().__init__(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+# Restricciones de la base
+# Los INSERT/UPDATE no verifican antes la unicidad del chasis ni la existencia del auto: lo hacen el índice
+# único y la clave foránea, en el mismo round trip y sin la ventana de carrera de "consultar y después insertar".
+UNIQUE_VIOLATION = "23505"
+FOREIGN_KEY_VIOLATION = "23503"
+QUERY_CANCELED = "57014"
+
+# Actualizaciones con compare-and-swap sobre `version`: reintentos si otra escritura gana la carrera
+UPDATE_RETRIES = 3
+
+def _sqlstate(error: DBAPIError) -> Optional[str]:
+    # psycopg2 lo expone como `pgcode`; asyncpg (a través del adaptador de SQLAlchemy) como `sqlstate`
+    return getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+
+def _violation(error: DBIntegrityError) -> Optional[str]:
+    """SQLSTATE de la restricción violada: el código de PostgreSQL, o el equivalente según el mensaje de SQLite."""
+    codigo = _sqlstate(error)
+    if codigo:
+        return codigo
+    mensaje = str(error.orig)
+    if "UNIQUE constraint failed" in mensaje:
+        return UNIQUE_VIOLATION
+    if "FOREIGN KEY constraint failed" in mensaje:
+        return FOREIGN_KEY_VIOLATION
+    return None
+
+# Totales de los listados
+class CollectionVersion(NamedTuple):
+    """Valores de los que se deriva el ETag de un listado, y su total (`None` si el conteo excedió el presupuesto)."""
+    validador: tuple
+    total: Optional[int]
+
+def _count_within_budget(session: Session, statement) -> Optional[Row]:
+    """
+    Ejecuta el agregado (COUNT, MAX) de un listado filtrado con un `statement_timeout` de COUNT_TIMEOUT_MS en
+    PostgreSQL, para que un filtro poco selectivo no recorra millones de filas en cada request. Devuelve `None`
+    si lo excede. En SQLite (desarrollo) el conteo es siempre exacto.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return session.exec(statement).one()
+    # En un SAVEPOINT: al volver a él se deshace el SET LOCAL (y la cancelación, si la hubo) sin tocar la
+    # transacción del request ni lo que ya tenga pendiente
+    savepoint = session.begin_nested()
+    try:
+        session.exec(text(f"SET LOCAL statement_timeout = {int(get_settings().count_timeout_ms)}"))
+        return session.exec(statement).one()
+    except DBAPIError as e:
+        if _sqlstate(e) == QUERY_CANCELED:
+            return None
+        raise
+    finally:
+        savepoint.rollback()
+
+def _estimate_rows(session: Session, statement) -> Optional[int]:
+    """Filas que el planificador de PostgreSQL estima para `statement` (EXPLAIN, sin ejecutarla). `None` en otros motores."""
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return None
+    compiled = statement.compile(dialect=bind.dialect)
+    parametros = compiled.construct_params()
+    if compiled.positional:
+        parametros = tuple(parametros[nombre] for nombre in compiled.positiontup)
+    plan = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", parametros).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+# Escrituras que se confirman en la misma transacción que un alta, con la fila recién insertada (p. ej. la
+# respuesta guardada de una `Idempotency-Key`, ver idempotency.py). Si fallan, el alta se revierte
+OnInsert = Callable[[Session, SQLModel], None]
+
 # Interfaces
 class AutoRepository(Protocol):
-    def create(self, auto: AutoCreate) -> Auto: ...
-    def get_by_id(self, auto_id: int) -> Optional[Auto]: ...
-    def get_all(self, skip: int,limit: int, marca: Optional[str] = None, modelo: Optional[str] = None ) -> List[Auto]: ...
-    def update(self, auto_id: int, auto_update: AutoUpdate) -> Optional[Auto]: ...
+    def create(self, auto: AutoCreate, on_insert: Optional[OnInsert] = None) -> Auto: ...
+    def get_by_id(self, auto_id: int, with_ventas: bool = False) -> Optional[Auto]: ...
+    def get_all(self, skip: int,limit: int, marca: Optional[str] = None, modelo: Optional[str] = None, cursor: Optional[str] = None, with_ventas: bool = False ) -> List[Auto]: ...
+    def get_rows(self, skip: int, limit: int, marca: Optional[str] = None, modelo: Optional[str] = None, cursor: Optional[str] = None, orden: str = "id", resumen: bool = False) -> List[Row]: ...
+    def next_cursor(self, autos: List[Auto], limit: int, orden: str = "id") -> Optional[str]: ...
+    def collection_version(self, marca: Optional[str] = None, modelo: Optional[str] = None, with_total: bool = False) -> CollectionVersion: ...
+    def estimate_count(self, marca: Optional[str] = None, modelo: Optional[str] = None) -> Optional[int]: ...
+    def update(self, auto_id: int, auto_update: AutoUpdate, expected_versions: Optional[Sequence[int]] = None) -> Optional[Auto]: ...
+    def update_returning_chasis(self, auto_id: int, auto_update: AutoUpdate, expected_versions: Optional[Sequence[int]] = None) -> Tuple[Auto, Optional[str]]: ...
     def delete(self, auto_id: int) -> bool: ...
+    def delete_returning_chasis(self, auto_id: int) -> Optional[str]: ...
     def get_by_chasis(self, numero_chasis:str) -> Optional[Auto]: ...
+    def get_many(self, ids: Optional[List[int]] = None, numeros_chasis: Optional[List[str]] = None) -> List[Optional[Auto]]: ...
+    def search(self, q: str, limit: int) -> List[Auto]: ...
+    def bulk_create(self, autos: List[AutoCreate]) -> List[Optional[str]]: ...
 
 class VentaRepository(Protocol):
-    def create(self, venta: VentaCreate) -> Venta: ...
-    def get_by_id(self, venta_id: int) -> Optional[Venta]: ...
-    def get_all(self, skip: int, limit: int, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None,fecha_fin: Optional[datetime] = None) -> List[Venta]: ...
-    def update(self, venta_id: int, venta_update: VentaUpdate) -> Optional[Venta]: ...
+    def create(self, venta: VentaCreate, on_insert: Optional[OnInsert] = None) -> Venta: ...
+    def get_by_id(self, venta_id: int, with_auto: bool = False) -> Optional[Venta]: ...
+    def get_many(self, ids: List[int]) -> List[Optional[Venta]]: ...
+    def get_all(self, skip: int, limit: int, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None,fecha_fin: Optional[datetime] = None, cursor: Optional[str] = None) -> List[Venta]: ...
+    def get_rows(self, skip: int, limit: int, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, cursor: Optional[str] = None) -> List[Row]: ...
+    def next_cursor(self, ventas: List[Venta], limit: int) -> Optional[str]: ...
+    def collection_version(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, with_total: bool = False) -> CollectionVersion: ...
+    def estimate_count(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> Optional[int]: ...
+    def update(self, venta_id: int, venta_update: VentaUpdate, expected_versions: Optional[Sequence[int]] = None) -> Optional[Venta]: ...
     def delete(self, venta_id: int) -> bool: ...
     def get_by_auto_id(self, auto_id: int) -> List[Venta]: ...
     def get_by_comprador(self, nombre: str) -> List[Venta]: ...
+    def search(self, q: str, limit: int) -> List[Venta]: ...
+    def bulk_create(self, ventas: List[VentaCreate]) -> List[Optional[str]]: ...
+    def create_many(self, ventas: List[VentaCreate]) -> List[Union[Venta, HTTPException]]: ...
     
 # Clases
 class PostgresAutoRepository:
@@ -38,71 +152,286 @@ class PostgresAutoRepository:
     def __init__(self, session: Session):
         self.session = session 
     
-    def create(self, auto:AutoCreate) -> Auto:
-        if self.get_by_chasis(auto.numero_chasis):
-            raise IntegrityError(f"Ya existe un auto con el número de chasis: {auto.numero_chasis}")
-        
-        db_auto = Auto.model_validate(auto)
+    def create(self, auto:AutoCreate, on_insert: Optional[OnInsert] = None) -> Auto:
+        # INSERT ... RETURNING: la fila creada vuelve en el mismo round trip (sin SELECT previo ni refresh)
+        statement = insert(Auto).values(**auto.model_dump()).returning(Auto)
         try:
-            self.session.add(db_auto)
+            db_auto = self.session.exec(statement).scalars().one()
+            add_row_count(self.session, "auto", 1)
+            if on_insert is not None:
+                on_insert(self.session, db_auto)
             self.session.commit()
-            self.session.refresh(db_auto)
             return db_auto
-        except Exception as e:
+        except DBIntegrityError as e:
+            self.session.rollback()
+            if _violation(e) == UNIQUE_VIOLATION:
+                raise IntegrityError(f"Ya existe un auto con el número de chasis: {auto.numero_chasis}")
+            raise IntegrityError(f"Error al crear el auto: {e.orig}")
+        except Exception:
             self.session.rollback()
-            raise IntegrityError(f"Error al crear el auto: {e}")
+            raise
     
-    def get_by_id(self, auto_id: int) -> Optional[Auto]:
+    def get_by_id(self, auto_id: int, with_ventas: bool = False) -> Optional[Auto]:
         statement = select(Auto).where(Auto.id == auto_id)
+        if with_ventas:
+            statement = statement.options(selectinload(Auto.ventas))
         result = self.session.exec(statement).first()
         if not result:
             raise NotFoundException(f"Auto con ID {auto_id} no encontrado")
         return result
     
-    def get_all(self, skip: int = 0, limit: int = 100, marca: Optional[str] = None, modelo: Optional[str] = None) -> List[Auto]:
-        statement = select(Auto).offset(skip).limit(limit)
+    def get_all(self, skip: int = 0, limit: int = 100, marca: Optional[str] = None, modelo: Optional[str] = None, cursor: Optional[str] = None, with_ventas: bool = False) -> List[Auto]:
+        statement = self._paged(select(Auto), skip, limit, cursor)
+        if with_ventas:
+            # Una sola consulta adicional (IN) para las ventas de toda la página, en lugar de una por auto
+            statement = statement.options(selectinload(Auto.ventas))
+        statement = self._filtered(statement, marca=marca, modelo=modelo)
+        return self.session.exec(statement).all()
+
+    def get_rows(self, skip: int = 0, limit: int = 100, marca: Optional[str] = None, modelo: Optional[str] = None, cursor: Optional[str] = None, orden: str = "id", resumen: bool = False) -> List[Row]:
+        """
+        Como `get_all`, pero sólo las columnas de `AutoResponse` como filas (`Row`): no se crean entidades ORM
+        ni pasan por el identity map de la sesión. Para los listados de sólo lectura.
+
+        Con `resumen` (o un `orden` distinto de `id`, ver `AUTO_SORT_KEYS`) se agregan las columnas del resumen
+        de ventas de cada auto.
+        """
+        columnas = AUTO_COLUMNS + (AUTO_SUMMARY_COLUMNS if resumen or orden != "id" else [])
+        statement = self._filtered(select(*columnas), marca=marca, modelo=modelo)
+        if orden == "id":
+            return self.session.exec(self._paged(statement, skip, limit, cursor)).all()
+        return self.session.exec(self._sorted(statement, orden, skip, limit, cursor)).all()
+
+    @staticmethod
+    def _paged(statement, skip: int, limit: int, cursor: Optional[str]):
+        # Con cursor se pagina por keyset sobre `id` (se ignora `skip`); sin cursor se mantiene skip/limit
+        statement = statement.order_by(Auto.id).limit(limit)
+        if cursor:
+            (last_id,) = decode_cursor(cursor, (int,))
+            return statement.where(Auto.id > last_id)
+        return statement.offset(skip)
+
+    @staticmethod
+    def _sorted(statement, orden: str, skip: int, limit: int, cursor: Optional[str]):
+        """
+        Página ordenada por una columna del resumen de ventas y por `id`, con keyset sobre (clave, id). Los
+        autos sin ventas (clave nula) van al final en orden ascendente y al principio en descendente: el orden
+        en que se recorre el índice (clave, id) hacia adelante o hacia atrás.
+        """
+        descendente = orden.startswith("-")
+        nombre = orden.lstrip("-")
+        clave = getattr(Auto, nombre)
+        orden_sql = (clave.desc().nulls_first(), Auto.id.desc()) if descendente else (clave.asc().nulls_last(), Auto.id)
+        if not cursor:
+            return statement.order_by(*orden_sql).offset(skip).limit(limit)
+
+        valor, last_id = decode_cursor(cursor, (AUTO_SORT_KEYS[nombre], int), nullable=True)
+        no_nulas = statement.where(
+            tuple_(clave, Auto.id) < tuple_(valor, last_id) if descendente else tuple_(clave, Auto.id) > tuple_(valor, last_id)
+        ).order_by(*orden_sql)
+        nulas = statement.where(clave.is_(None)).order_by(Auto.id.desc() if descendente else Auto.id)
+        if valor is None:
+            # El cursor quedó entre los autos sin ventas: se siguen por id (y, en descendente, después las no nulas)
+            nulas = nulas.where(Auto.id < last_id if descendente else Auto.id > last_id)
+            if not descendente:
+                return nulas.limit(limit)
+            no_nulas = statement.where(clave.isnot(None)).order_by(*orden_sql)
+        elif descendente or not Auto.__table__.c[nombre].nullable:
+            return no_nulas.limit(limit)
+        # La página puede cruzar el límite entre no nulas y nulas: cada parte usa el índice y se unen a lo sumo 2 x limit filas
+        partes = [no_nulas, nulas] if not descendente else [nulas, no_nulas]
+        pagina = union_all(*(select(parte.limit(limit).subquery()) for parte in partes)).subquery()
+        clave_pagina = pagina.c[nombre]
+        orden_pagina = (clave_pagina.desc().nulls_first(), pagina.c.id.desc()) if descendente else (clave_pagina.asc().nulls_last(), pagina.c.id)
+        return select(*pagina.c).order_by(*orden_pagina).limit(limit)
+
+    def _filtered(self, statement, marca: Optional[str] = None, modelo: Optional[str] = None):
         if marca:
-            statement = statement.where(func.lower(Auto.marca).like(f"%{marca.lower()}%"))
+            statement = statement.where(contains(self.session, Auto, "marca", marca))
         if modelo:
-            statement = statement.where(func.lower(Auto.modelo).like(f"%{modelo.lower()}%"))
-        return self.session.exec(statement).all()
+            statement = statement.where(contains(self.session, Auto, "modelo", modelo))
+        return statement
+
+    def export_statement(self, marca: Optional[str] = None, modelo: Optional[str] = None):
+        """Consulta de sólo columnas (sin entidades ORM) para exportar con los mismos filtros que `get_all`."""
+        statement = select(*AUTO_COLUMNS).order_by(Auto.id)
+        return self._filtered(statement, marca=marca, modelo=modelo)
+
+    def collection_version(self, marca: Optional[str] = None, modelo: Optional[str] = None, with_total: bool = False) -> CollectionVersion:
+        """
+        (cantidad, id máximo, última modificación) de los autos que cumplen los filtros, para el ETag y el total del listado.
+
+        - **Sin filtros:** la cantidad sale del contador de filas y los máximos de los índices de `id` / `updated_at`.
+        - **Con filtros y `with_total`:** un único agregado con presupuesto de tiempo. Si lo excede se usa el
+          validador de toda la tabla (cambia con cualquier alta, baja o modificación) y el total queda sin calcular.
+        - **Con filtros, sin `with_total`:** el validador de toda la tabla, sin contar las filas del filtro.
+        """
+        if not (marca or modelo):
+            return self._table_version()
+        if not with_total:
+            return CollectionVersion(("tabla", *self._table_version().validador), None)
+        statement = select(func.count(Auto.id), func.max(Auto.id), func.max(Auto.updated_at))
+        fila = _count_within_budget(self.session, self._filtered(statement, marca=marca, modelo=modelo))
+        if fila is None:
+            return CollectionVersion(("tabla", *self._table_version().validador), None)
+        return CollectionVersion(tuple(fila), fila[0])
+
+    def _table_version(self) -> CollectionVersion:
+        conteo = select(ConteoFilas.cantidad).where(ConteoFilas.tabla == "auto").scalar_subquery()
+        fila = self.session.exec(select(func.coalesce(conteo, 0), func.max(Auto.id), func.max(Auto.updated_at))).one()
+        return CollectionVersion(tuple(fila), fila[0])
+
+    def estimate_count(self, marca: Optional[str] = None, modelo: Optional[str] = None) -> Optional[int]:
+        """Cantidad estimada de autos que cumplen los filtros, para cuando el conteo exacto excede el presupuesto."""
+        return _estimate_rows(self.session, self._filtered(select(Auto.id), marca=marca, modelo=modelo))
+
+    @staticmethod
+    def next_cursor(autos: List[Auto], limit: int, orden: str = "id") -> Optional[str]:
+        # Página incompleta: no hay más resultados
+        if not autos or len(autos) < limit:
+            return None
+        if orden == "id":
+            return encode_cursor(autos[-1].id)
+        return encode_cursor(getattr(autos[-1], orden.lstrip("-")), autos[-1].id)
     
-    def update(self, auto_id: int, auto_update: AutoUpdate) -> Auto:
-        
-        db_auto = self.session.get(Auto, auto_id)
+    def update(self, auto_id: int, auto_update: AutoUpdate, expected_versions: Optional[Sequence[int]] = None) -> Auto:
+        """
+        Actualiza el auto con un `UPDATE ... WHERE version IN (:expected_versions)` (compare-and-swap): si otro
+        cliente lo modificó después de leerlo, no se pisan sus cambios y se responde 412. Sin
+        `expected_versions` la actualización es incondicional.
+        """
+        return self.update_returning_chasis(auto_id, auto_update, expected_versions)[0]
 
-        if not db_auto:
-            raise NotFoundException(f"Auto con ID {auto_id} no encontrado")
-        
-        if auto_update.numero_chasis and auto_update.numero_chasis != db_auto.numero_chasis :
-            if self.get_by_chasis(auto_update.numero_chasis):
-                raise IntegrityError(f"Ya existe un auto con el número de chasis: {auto_update.numero_chasis}")
-        
-        for key, value in auto_update.model_dump(exclude_unset=True).items():
-            setattr(db_auto, key, value)
-        
+    def update_returning_chasis(self, auto_id: int, auto_update: AutoUpdate, expected_versions: Optional[Sequence[int]] = None) -> Tuple[Auto, Optional[str]]:
+        """
+        Como `update`, y además devuelve el número de chasis anterior si el cambio lo modifica (`None` si no),
+        leído de la base en la misma transacción (para invalidar la caché por chasis, ver cache.py).
+        """
+        cambios = auto_update.model_dump(exclude_unset=True)
+        deltas = VentaDeltas()
+        condicion = [Auto.id == auto_id]
+        if expected_versions is not None:
+            condicion.append(Auto.version.in_(expected_versions))
+        chasis_anterior = None
+        if "marca" in cambios or "modelo" in cambios or "numero_chasis" in cambios:
+            # Las ventas del auto pasan a contabilizarse bajo la nueva marca/modelo: hace falta la marca/modelo anterior
+            # (y el chasis anterior, para la caché). El bloqueo frena las altas de ventas del auto y otros cambios
+            # hasta el commit; una versión vieja no llega a tomarlo.
+            anterior = self.session.exec(
+                select(Auto.marca, Auto.modelo, Auto.numero_chasis).where(*condicion).with_for_update()
+            ).first()
+            if not anterior:
+                self._update_failed(auto_id)
+            if cambios.get("numero_chasis", anterior.numero_chasis) != anterior.numero_chasis:
+                chasis_anterior = anterior.numero_chasis
+            nueva = (cambios.get("marca", anterior.marca), cambios.get("modelo", anterior.modelo))
+            if nueva != (anterior.marca, anterior.modelo):
+                cantidad, total = self.session.exec(
+                    select(func.count(Venta.id), func.coalesce(func.sum(Venta.precio), 0)).where(Venta.auto_id == auto_id)
+                ).one()
+                deltas.add_modelo(anterior.marca, anterior.modelo, -cantidad, -total)
+                deltas.add_modelo(*nueva, cantidad, total)
+
+        # Un único UPDATE ... RETURNING; la unicidad del chasis la verifica el índice
+        statement = (
+            update(Auto)
+            .where(*condicion)
+            .values(**cambios, version=Auto.version + 1, updated_at=utcnow())
+            .returning(Auto)
+            # Si el auto ya estaba cargado en la sesión, RETURNING debe pisar sus atributos
+            .execution_options(populate_existing=True)
+        )
         try:
-            self.session.add(db_auto)
+            db_auto = self.session.exec(statement).scalars().first()
+            if not db_auto:
+                self._update_failed(auto_id)
+            deltas.apply(self.session)
             self.session.commit()
-            self.session.refresh(db_auto)
-            return db_auto
-        except Exception as e:
+            return db_auto, chasis_anterior
+        except DBIntegrityError as e:
             self.session.rollback()
-            raise IntegrityError(f"Error al actualizar el auto: {e}")
+            if _violation(e) == UNIQUE_VIOLATION:
+                raise IntegrityError(f"Ya existe un auto con el número de chasis: {auto_update.numero_chasis}")
+            raise IntegrityError(f"Error al actualizar el auto: {e.orig}")
+
+    def _update_failed(self, auto_id: int) -> NoReturn:
+        # El UPDATE no afectó filas: el auto no existe o su versión ya no es la esperada
+        self.session.rollback()
+        if self.session.exec(select(Auto.id).where(Auto.id == auto_id)).first() is None:
+            raise NotFoundException(f"Auto con ID {auto_id} no encontrado")
+        raise PreconditionFailedException(f"El auto con ID {auto_id} fue modificado por otro cliente: volver a leerlo y reintentar")
         
     def delete(self, auto_id: int) -> bool:
-        
+        return self.delete_returning_chasis(auto_id) is not None
+
+    def delete_returning_chasis(self, auto_id: int) -> Optional[str]:
+        """Como `delete`, pero devuelve el número de chasis del auto eliminado (`None` si no existía)."""
         db_auto = self.session.get(Auto, auto_id)
 
         if not db_auto:
-            return False    
+            return None
+        numero_chasis = db_auto.numero_chasis
+        # Las ventas se eliminan en cascada: se descuentan de los resúmenes
+        deltas = VentaDeltas()
+        deltas.add_auto(self.session, db_auto, signo=-1)
+        deltas.apply(self.session)
+        add_row_count(self.session, "auto", -1)
         self.session.delete(db_auto)
         self.session.commit()
-        return True
+        return numero_chasis
     
     def get_by_chasis(self, numero_chasis: str) -> Optional[Auto]:
         statement = select(Auto).where(Auto.numero_chasis == numero_chasis)
         return self.session.exec(statement).first()
+
+    def get_many(self, ids: Optional[List[int]] = None, numeros_chasis: Optional[List[str]] = None) -> List[Optional[Auto]]:
+        """
+        Autos por id o por número de chasis con una sola consulta `IN`.
+        Devuelve, alineado con las claves pedidas, el auto o `None` si no existe.
+        """
+        columna, claves = (Auto.id, ids) if ids is not None else (Auto.numero_chasis, numeros_chasis)
+        statement = select(Auto).where(columna.in_(set(claves)))
+        encontrados = {getattr(auto, columna.key): auto for auto in self.session.exec(statement).all()}
+        return [encontrados.get(clave) for clave in claves]
+
+    def search(self, q: str, limit: int = 20) -> List[Auto]:
+        return search_autos(self.session, q, limit)
+
+    def bulk_create(self, autos: List[AutoCreate]) -> List[Optional[str]]:
+        """
+        Inserta un lote de autos con un único `INSERT ... ON CONFLICT DO NOTHING RETURNING`.
+        Devuelve, alineado con `autos`, el error de cada fila o `None` si se insertó.
+        """
+        errores: List[Optional[str]] = [None] * len(autos)
+        pendientes = {}
+        for i, auto in enumerate(autos):
+            if auto.numero_chasis in pendientes:
+                errores[i] = f"Número de chasis repetido en el lote: {auto.numero_chasis}"
+            else:
+                pendientes[auto.numero_chasis] = i
+        if not pendientes:
+            return errores
+
+        statement = (
+            insert_on_conflict(self.session, Auto)
+            .values([autos[i].model_dump() for i in pendientes.values()])
+            .on_conflict_do_nothing(index_elements=["numero_chasis"])
+            .returning(Auto.numero_chasis)
+        )
+        try:
+            insertados = set(self.session.exec(statement).scalars().all())
+            add_row_count(self.session, "auto", len(insertados))
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            for i in pendientes.values():
+                errores[i] = f"Error al crear el auto: {e}"
+            return errores
+
+        for numero_chasis, i in pendientes.items():
+            if numero_chasis not in insertados:
+                errores[i] = f"Ya existe un auto con el número de chasis: {numero_chasis}"
+        return errores
     
 class PostgresVentaRepository:
     
@@ -110,32 +439,65 @@ class PostgresVentaRepository:
         self.session = session
         self.auto_repo = PostgresAutoRepository(session)
 
-    def create(self, venta: VentaCreate) -> Venta:
-        
-        if not self.auto_repo.session.get(Auto, venta.auto_id):
-            raise NotFoundException(f"No se puede crear la venta: Auto con ID {venta.auto_id} no encontrado.")
-
-        db_venta = Venta.model_validate(venta)
+    def create(self, venta: VentaCreate, on_insert: Optional[OnInsert] = None) -> Venta:
+        # La existencia del auto la verifica la clave foránea en el mismo INSERT ... RETURNING
+        statement = insert(Venta).values(**venta.model_dump()).returning(Venta)
         try:
-            self.session.add(db_venta)
+            db_venta = self.session.exec(statement).scalars().one()
+            deltas = VentaDeltas()
+            deltas.add_venta(db_venta.auto_id, db_venta.fecha_venta, db_venta.precio)
+            deltas.apply(self.session)
+            if on_insert is not None:
+                on_insert(self.session, db_venta)
             self.session.commit()
-            self.session.refresh(db_venta)
             return db_venta
-        except Exception as e:
+        except DBIntegrityError as e:
+            self.session.rollback()
+            if _violation(e) == FOREIGN_KEY_VIOLATION:
+                raise NotFoundException(f"No se puede crear la venta: Auto con ID {venta.auto_id} no encontrado.")
+            raise IntegrityError(f"Error al crear la venta: {e.orig}")
+        except Exception:
             self.session.rollback()
-            raise IntegrityError(f"Error al crear la venta: {e}")
+            raise
 
-    def get_by_id(self, venta_id: int) -> Optional[Venta]:
+    def get_by_id(self, venta_id: int, with_auto: bool = False) -> Optional[Venta]:
         statement = select(Venta).where(Venta.id == venta_id)
+        if with_auto:
+            statement = statement.options(joinedload(Venta.auto))
         result = self.session.exec(statement).first()
         if not result:
             raise NotFoundException(f"Venta con ID {venta_id} no encontrada")
         return result
 
-    def get_all(self, skip: int = 0, limit: int = 100, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> List[Venta]:
+    def get_many(self, ids: List[int]) -> List[Optional[Venta]]:
+        """Ventas por id con una sola consulta `IN`, alineadas con `ids` (`None` si no existe)."""
+        statement = select(Venta).where(Venta.id.in_(set(ids)))
+        encontradas = {venta.id: venta for venta in self.session.exec(statement).all()}
+        return [encontradas.get(id) for id in ids]
 
-        statement = select(Venta).offset(skip).limit(limit)
+    def get_all(self, skip: int = 0, limit: int = 100, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, cursor: Optional[str] = None) -> List[Venta]:
+        statement = self._paged(select(Venta), skip, limit, cursor)
+        statement = self._filtered(statement, min_precio, max_precio, fecha_inicio, fecha_fin)
+        return self.session.exec(statement).all()
 
+    def get_rows(self, skip: int = 0, limit: int = 100, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, cursor: Optional[str] = None) -> List[Row]:
+        """Como `get_all`, pero sólo las columnas de `VentaResponse` como filas (`Row`), sin entidades ORM."""
+        statement = self._paged(select(*VENTA_COLUMNS), skip, limit, cursor)
+        return self.session.exec(self._filtered(statement, min_precio, max_precio, fecha_inicio, fecha_fin)).all()
+
+    @staticmethod
+    def _paged(statement, skip: int, limit: int, cursor: Optional[str]):
+        # Con cursor se pagina por keyset sobre (fecha_venta, id) (se ignora `skip`); sin cursor se mantiene skip/limit
+        statement = statement.order_by(Venta.fecha_venta, Venta.id).limit(limit)
+        if cursor:
+            last_fecha, last_id = decode_cursor(cursor, (datetime, int))
+            # `fecha_venta >= ...` es redundante con la comparación de tuplas, pero es la que el planificador
+            # usa para descartar particiones anteriores (ver partitions.py)
+            return statement.where(Venta.fecha_venta >= last_fecha, tuple_(Venta.fecha_venta, Venta.id) > tuple_(last_fecha, last_id))
+        return statement.offset(skip)
+
+    @staticmethod
+    def _filtered(statement, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None):
         if min_precio is not None:
             statement = statement.where(Venta.precio >= min_precio)
         if max_precio is not None:
@@ -144,41 +506,198 @@ class PostgresVentaRepository:
             statement = statement.where(Venta.fecha_venta >= fecha_inicio)
         if fecha_fin:
             statement = statement.where(Venta.fecha_venta <= fecha_fin)
+        return statement
 
-        return self.session.exec(statement).all()
+    def export_statement(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None):
+        """Consulta de sólo columnas (sin entidades ORM) para exportar con los mismos filtros que `get_all`."""
+        statement = select(*VENTA_COLUMNS).order_by(Venta.fecha_venta, Venta.id)
+        return self._filtered(statement, min_precio, max_precio, fecha_inicio, fecha_fin)
 
-    def update(self, venta_id: int, venta_update: VentaUpdate) -> Venta:
+    def collection_version(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None, with_total: bool = False) -> CollectionVersion:
+        """
+        (cantidad, id máximo, última modificación) de las ventas que cumplen los filtros, para el ETag y el total
+        del listado. Como en autos: sin filtros la cantidad sale de los resúmenes mensuales; con filtros, un
+        agregado con presupuesto de tiempo sólo si se pide el total (`with_total`), si no el validador de la tabla.
+        """
+        if min_precio is None and max_precio is None and not fecha_inicio and not fecha_fin:
+            return self._table_version()
+        if not with_total:
+            return CollectionVersion(("tabla", *self._table_version().validador), None)
+        statement = select(func.count(Venta.id), func.max(Venta.id), func.max(Venta.updated_at))
+        fila = _count_within_budget(self.session, self._filtered(statement, min_precio, max_precio, fecha_inicio, fecha_fin))
+        if fila is None:
+            return CollectionVersion(("tabla", *self._table_version().validador), None)
+        return CollectionVersion(tuple(fila), fila[0])
 
-        db_venta = self.session.get(Venta, venta_id)
+    def _table_version(self) -> CollectionVersion:
+        # Los resúmenes mensuales ya cuentan todas las ventas (unas pocas filas por año)
+        conteo = select(func.sum(ResumenVentasMensual.cantidad)).scalar_subquery()
+        fila = self.session.exec(select(func.coalesce(conteo, 0), func.max(Venta.id), func.max(Venta.updated_at))).one()
+        return CollectionVersion(tuple(fila), fila[0])
 
-        if not db_venta:
-            raise NotFoundException(f"Venta con ID {venta_id} no encontrada")
+    def estimate_count(self, min_precio: Optional[float] = None, max_precio: Optional[float] = None, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> Optional[int]:
+        """Cantidad estimada de ventas que cumplen los filtros, para cuando el conteo exacto excede el presupuesto."""
+        return _estimate_rows(self.session, self._filtered(select(Venta.id), min_precio, max_precio, fecha_inicio, fecha_fin))
 
-        for key, value in venta_update.model_dump(exclude_unset=True).items():
-            setattr(db_venta, key, value)
+    @staticmethod
+    def next_cursor(ventas: List[Venta], limit: int) -> Optional[str]:
+        # Página incompleta: no hay más resultados
+        if not ventas or len(ventas) < limit:
+            return None
+        return encode_cursor(ventas[-1].fecha_venta, ventas[-1].id)
 
-        try:
-            self.session.add(db_venta)
+    def update(self, venta_id: int, venta_update: VentaUpdate, expected_versions: Optional[Sequence[int]] = None) -> Venta:
+        """
+        Actualiza la venta con compare-and-swap sobre `version`, sin bloquear la fila. Con `expected_versions`
+        (`If-Match`) una versión vieja responde 412. Si cambian el precio o la fecha se leen antes los valores
+        anteriores para los resúmenes y el UPDATE exige que la fila siga en la versión leída; si otra escritura
+        ganó la carrera se vuelve a leer (hasta `UPDATE_RETRIES` veces, luego 409).
+        """
+        cambios = venta_update.model_dump(exclude_unset=True)
+        for _ in range(UPDATE_RETRIES):
+            condicion = [Venta.id == venta_id]
+            if expected_versions is not None:
+                condicion.append(Venta.version.in_(expected_versions))
+            anterior = None
+            if "precio" in cambios or "fecha_venta" in cambios:
+                # Los resúmenes necesitan el precio y la fecha anteriores
+                anterior = self.session.exec(
+                    select(Venta.auto_id, Venta.fecha_venta, Venta.precio, Venta.version).where(*condicion)
+                ).first()
+                if not anterior:
+                    self._update_failed(venta_id)
+                condicion.append(Venta.version == anterior.version)
+
+            statement = (
+                update(Venta)
+                .where(*condicion)
+                .values(**cambios, version=Venta.version + 1, updated_at=utcnow())
+                .returning(Venta)
+                # Si la venta ya estaba cargada en la sesión, RETURNING debe pisar sus atributos (resúmenes, ETag)
+                .execution_options(populate_existing=True)
+            )
+            try:
+                db_venta = self.session.exec(statement).scalars().first()
+            except DBIntegrityError as e:
+                self.session.rollback()
+                raise IntegrityError(f"Error al actualizar la venta: {e.orig}")
+            if not db_venta:
+                if anterior is None:
+                    self._update_failed(venta_id)
+                # Otra escritura cambió la fila entre la lectura y el UPDATE: se vuelve a leer
+                self.session.rollback()
+                continue
+            if anterior:
+                deltas = VentaDeltas()
+                deltas.add_venta(anterior.auto_id, anterior.fecha_venta, anterior.precio, signo=-1)
+                deltas.add_venta(db_venta.auto_id, db_venta.fecha_venta, db_venta.precio)
+                deltas.apply(self.session)
             self.session.commit()
-            self.session.refresh(db_venta)
             return db_venta
-        except Exception as e:
-            self.session.rollback()
-            raise IntegrityError(f"Error al actualizar la venta: {e}")
+        raise ConflictException(f"La venta con ID {venta_id} cambió durante la actualización: reintentar")
+
+    def _update_failed(self, venta_id: int) -> NoReturn:
+        # El UPDATE no afectó filas: la venta no existe o su versión ya no es la esperada
+        self.session.rollback()
+        if self.session.exec(select(Venta.id).where(Venta.id == venta_id)).first() is None:
+            raise NotFoundException(f"Venta con ID {venta_id} no encontrada")
+        raise PreconditionFailedException(f"La venta con ID {venta_id} fue modificada por otro cliente: volver a leerla y reintentar")
 
     def delete(self, venta_id: int) -> bool:
         db_venta = self.session.get(Venta, venta_id)
         if not db_venta:
             return False
 
+        deltas = VentaDeltas()
+        deltas.add(db_venta.auto.marca, db_venta.auto.modelo, db_venta.fecha_venta, db_venta.precio, signo=-1, auto_id=db_venta.auto_id)
+        # Primero el DELETE: el resumen del auto busca su última venta entre las que quedan
         self.session.delete(db_venta)
+        self.session.flush()
+        deltas.apply(self.session)
         self.session.commit()
         return True
 
     def get_by_auto_id(self, auto_id: int) -> List[Venta]:
-        statement = select(Venta).where(Venta.auto_id == auto_id)
+        # Ordenadas por fecha: se leen en orden del índice (auto_id, fecha_venta), sin ordenar
+        statement = select(Venta).where(Venta.auto_id == auto_id).order_by(Venta.fecha_venta)
         return self.session.exec(statement).all()
 
     def get_by_comprador(self, nombre: str) -> List[Venta]:
-        statement = select(Venta).where(func.lower(Venta.nombre_comprador).like(f"%{nombre.lower()}%"))
-        return self.session.exec(statement).all()
\ No newline at end of file
+        statement = select(Venta).where(contains(self.session, Venta, "nombre_comprador", nombre))
+        return self.session.exec(statement).all()
+
+    def search(self, q: str, limit: int = 20) -> List[Venta]:
+        return search_ventas(self.session, q, limit)
+
+    def create_many(self, ventas: List[VentaCreate]) -> List[Union[Venta, HTTPException]]:
+        """
+        Crea varias ventas como `create`, pero en una transacción: valida todos los `auto_id` con una consulta
+        y las inserta con un único INSERT multi-fila ... RETURNING. Devuelve, alineado con `ventas`, la venta
+        creada o la excepción que `create` habría lanzado para esa venta (ver batching.py).
+        """
+        resultados: List[Union[Venta, HTTPException]] = [None] * len(ventas)
+        auto_ids = {venta.auto_id for venta in ventas}
+        statement = select(Auto.id, Auto.marca, Auto.modelo).where(Auto.id.in_(auto_ids))
+        existentes = {id: (marca, modelo) for id, marca, modelo in self.session.exec(statement).all()}
+
+        validas = []
+        deltas = VentaDeltas()
+        for i, venta in enumerate(ventas):
+            if venta.auto_id in existentes:
+                validas.append(i)
+                deltas.add(*existentes[venta.auto_id], venta.fecha_venta, venta.precio, auto_id=venta.auto_id)
+            else:
+                resultados[i] = NotFoundException(f"No se puede crear la venta: Auto con ID {venta.auto_id} no encontrado.")
+        if not validas:
+            return resultados
+
+        # `sort_by_parameter_order`: las filas de RETURNING vuelven en el orden de los parámetros
+        statement = insert(Venta).returning(Venta, sort_by_parameter_order=True)
+        try:
+            creadas = self.session.scalars(statement, [ventas[i].model_dump() for i in validas]).all()
+            deltas.apply(self.session)
+            self.session.commit()
+        except DBIntegrityError:
+            # Un auto se eliminó entre la validación y el INSERT: cada venta se reintenta sola para aislar el error
+            self.session.rollback()
+            for i in validas:
+                try:
+                    resultados[i] = self.create(ventas[i])
+                except HTTPException as e:
+                    resultados[i] = e
+            return resultados
+        for i, venta in zip(validas, creadas):
+            resultados[i] = venta
+        return resultados
+
+    def bulk_create(self, ventas: List[VentaCreate]) -> List[Optional[str]]:
+        """
+        Inserta un lote de ventas validando todos los `auto_id` con una sola consulta y
+        un único INSERT multi-fila. Devuelve, alineado con `ventas`, el error de cada fila o `None`.
+        """
+        errores: List[Optional[str]] = [None] * len(ventas)
+        auto_ids = {venta.auto_id for venta in ventas}
+        statement = select(Auto.id, Auto.marca, Auto.modelo).where(Auto.id.in_(auto_ids))
+        existentes = {id: (marca, modelo) for id, marca, modelo in self.session.exec(statement).all()} if auto_ids else {}
+
+        validas = []
+        deltas = VentaDeltas()
+        for i, venta in enumerate(ventas):
+            if venta.auto_id in existentes:
+                validas.append(i)
+                deltas.add(*existentes[venta.auto_id], venta.fecha_venta, venta.precio, auto_id=venta.auto_id)
+            else:
+                errores[i] = f"No se puede crear la venta: Auto con ID {venta.auto_id} no encontrado."
+        if not validas:
+            return errores
+
+        try:
+            self.session.exec(insert(Venta).values([ventas[i].model_dump() for i in validas]))
+            deltas.apply(self.session)
+            self.session.commit()
+        except DBIntegrityError as e:
+            # Un auto se eliminó entre la validación y el INSERT: se rechaza el lote completo
+            self.session.rollback()
+            for i in validas:
+                errores[i] = f"Error al crear la venta: {e.orig}"
+        return errores
@@ -0,0 +1,174 @@
+import re
+import weakref
+from typing import List, Set, Union
+from sqlalchemy import Connection, Engine, column, literal_column, or_, table, text
+from sqlmodel import Session, select, func
+from models import Auto, Venta
+
+# Columnas indexadas por trigramas: tabla -> columnas
+TRIGRAM_COLUMNS = {
+    "auto": ("marca", "modelo"),
+    "venta": ("nombre_comprador",),
+}
+
+# Los trigramas necesitan al menos 3 caracteres para poder usar el índice
+MIN_TRIGRAM_LENGTH = 3
+# Similitud mínima de una coincidencia aproximada (el umbral por defecto del operador `%` de pg_trgm)
+SIMILARITY_THRESHOLD = 0.3
+# Candidatos que la búsqueda aproximada de SQLite lee del índice FTS5 para calcular su similitud
+FUZZY_CANDIDATES = 1000
+
+_fts_available = weakref.WeakKeyDictionary()
+
+# Creación de índices
+def create_search_indexes(bind: Union[Engine, Connection]) -> None:
+    """
+    Crea los índices de búsqueda por trigramas (en una transacción propia si recibe un `Engine`).
+
+    - **PostgreSQL:** extensión `pg_trgm` e índices GIN sobre `lower(columna)`, que también aceleran los `LIKE '%x%'`.
+    - **SQLite:** tablas FTS5 con tokenizer `trigram` sincronizadas por triggers (`<tabla>_trgm`).
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return create_search_indexes(conn)
+    conn = bind
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for tabla, columnas in TRIGRAM_COLUMNS.items():
+            for col in columnas:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{tabla}_{col}_trgm "
+                    f"ON {tabla} USING gin (lower({col}) gin_trgm_ops)"
+                ))
+    elif conn.dialect.name == "sqlite":
+        for tabla, columnas in TRIGRAM_COLUMNS.items():
+            _create_sqlite_fts(conn, tabla, columnas)
+    _fts_available.clear()
+
+def _create_sqlite_fts(conn, tabla: str, columnas) -> None:
+    fts = f"{tabla}_trgm"
+    existe = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": fts}).first()
+    if existe:
+        return
+    cols = ", ".join(columnas)
+    new_vals = ", ".join(f"new.{c}" for c in columnas)
+    old_vals = ", ".join(f"old.{c}" for c in columnas)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{tabla}', content_rowid='id', tokenize='trigram')"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {tabla} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {tabla} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {tabla} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+    ))
+    # Indexa las filas existentes
+    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+def _uses_fts(session: Session, tabla: str) -> bool:
+    engine = session.get_bind()
+    if engine.dialect.name != "sqlite":
+        return False
+    disponibles = _fts_available.get(engine)
+    if disponibles is None:
+        filas = session.exec(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%\\_trgm' ESCAPE '\\'")).all()
+        disponibles = _fts_available[engine] = {nombre for (nombre,) in filas}
+    return f"{tabla}_trgm" in disponibles
+
+# Filtros y búsquedas
+def contains(session: Session, model, campo: str, valor: str):
+    """
+    Condición `campo` contiene `valor` (sin distinguir mayúsculas) que aprovecha el índice de trigramas.
+    En PostgreSQL el índice GIN cubre directamente el `LIKE`; en SQLite se resuelve contra la tabla FTS5.
+    """
+    patron = f"%{valor.lower()}%"
+    tabla = model.__tablename__
+    if len(valor) >= MIN_TRIGRAM_LENGTH and _uses_fts(session, tabla):
+        fts = table(f"{tabla}_trgm", column("rowid"), column(campo))
+        ids = select(fts.c.rowid).where(fts.c[campo].like(patron))
+        return model.id.in_(ids)
+    return func.lower(getattr(model, campo)).like(patron)
+
+def _trigrams(valor: str) -> Set[str]:
+    # Los trigramas de pg_trgm: cada palabra en minúsculas, con dos espacios adelante y uno atrás
+    trigramas = set()
+    for palabra in re.findall(r"\w+", valor.lower()):
+        palabra = f"  {palabra} "
+        trigramas.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return trigramas
+
+def similarity(a: str, b: str) -> float:
+    """Trigramas en común sobre trigramas totales, como `similarity()` de pg_trgm."""
+    ta, tb = _trigrams(a), _trigrams(b)
+    return len(ta & tb) / len(ta | tb) if ta and tb else 0.0
+
+def _fuzzy_sqlite(session: Session, model, campos, q: str, limit: int, excluir: Set[int]):
+    # Candidatos: las filas que comparten al menos un trigrama con `q` (índice FTS5); la similitud se calcula
+    # sobre ellos, con la misma fórmula y umbral que PostgreSQL
+    fts = f"{model.__tablename__}_trgm"
+    trigramas = {q[i:i + 3] for i in range(len(q) - 2)}
+    consulta = " OR ".join('"' + t.replace('"', '""') + '"' for t in sorted(trigramas))
+    candidatos = session.exec(
+        select(model)
+        .join(table(fts, column("rowid")), literal_column(f"{fts}.rowid") == model.id)
+        .where(literal_column(fts).op("MATCH")(consulta))
+        .order_by(func.bm25(literal_column(fts)))
+        .limit(FUZZY_CANDIDATES)
+    ).all()
+    puntajes = [
+        (max(similarity(getattr(fila, c) or "", q) for c in campos), fila)
+        for fila in candidatos if fila.id not in excluir
+    ]
+    puntajes = [(p, fila) for p, fila in puntajes if p >= SIMILARITY_THRESHOLD]
+    puntajes.sort(key=lambda par: (-par[0], par[1].id))
+    return [fila for _, fila in puntajes[:limit]]
+
+def _ranked(session: Session, model, q: str, limit: int):
+    tabla = model.__tablename__
+    campos = TRIGRAM_COLUMNS[tabla]
+    q = q.strip().lower()
+    dialecto = session.get_bind().dialect.name
+
+    if dialecto == "postgresql":
+        columnas = [func.lower(getattr(model, c)) for c in campos]
+        # `%` es el operador de similitud de pg_trgm: también encuentra resultados con errores de tipeo
+        condicion = or_(*[c.like(f"%{q}%") for c in columnas], *[c.op("%")(q) for c in columnas])
+        score = func.greatest(*[func.similarity(c, q) for c in columnas]) if len(columnas) > 1 else func.similarity(columnas[0], q)
+        statement = select(model).where(condicion).order_by(score.desc(), model.id)
+    elif len(q) >= MIN_TRIGRAM_LENGTH and _uses_fts(session, tabla):
+        fts = f"{tabla}_trgm"
+        frase = '"' + q.replace('"', '""') + '"'
+        statement = (
+            select(model)
+            .join(table(fts, column("rowid")), literal_column(f"{fts}.rowid") == model.id)
+            .where(literal_column(fts).op("MATCH")(frase))
+            .order_by(func.bm25(literal_column(fts)), model.id)
+        )
+        exactas = session.exec(statement.limit(limit)).all()
+        if len(exactas) >= limit:
+            return exactas
+        # Primero las coincidencias exactas; el resto de la página, con las aproximadas (errores de tipeo)
+        return exactas + _fuzzy_sqlite(session, model, campos, q, limit - len(exactas), {fila.id for fila in exactas})
+    else:
+        statement = select(model).where(or_(*[contains(session, model, c, q) for c in campos])).order_by(model.id)
+
+    return session.exec(statement.limit(limit)).all()
+
+def search_autos(session: Session, q: str, limit: int = 20) -> List[Auto]:
+    """
+    Autos cuya marca o modelo contiene `q` o se le parece (similitud de trigramas de al menos
+    `SIMILARITY_THRESHOLD`), ordenados por similitud. En SQLite, primero las coincidencias exactas; la
+    tolerancia a errores de tipeo requiere que `q` tenga al menos 3 caracteres.
+    """
+    return _ranked(session, Auto, q, limit)
+
+def search_ventas(session: Session, q: str, limit: int = 20) -> List[Venta]:
+    """Ventas cuyo nombre de comprador contiene `q` o se le parece, ordenadas por similitud (ver `search_autos`)."""
+    return _ranked(session, Venta, q, limit)
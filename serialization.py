@@ -0,0 +1,116 @@
+"""
+Serialización de las respuestas.
+
+Los listados leen sólo las columnas de la respuesta como filas (`get_rows` en los repositorios). Como esas
+filas ya tienen los tipos del response_model, se serializan sin construir modelos Pydantic ni pasar por
+`jsonable_encoder`: el `response_model` del endpoint queda sólo para la documentación OpenAPI.
+
+Los listados se pueden pedir, vía `Accept`, en tres representaciones:
+
+- `application/json` (por defecto): lista de objetos.
+- `application/vnd.columnar+json`: `{"columnas": [...], "filas": [[...], ...]}`, sin repetir los nombres de campo.
+- `application/msgpack` (requiere el paquete `msgpack`): la misma lista de objetos en MessagePack.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic_core import to_json
+from sqlalchemy import Row
+from metrics import record_serialization
+
+try:
+    import orjson
+except ImportError:
+    # Sin orjson se usa el serializador de pydantic-core, que escribe las fechas en el mismo formato ISO 8601
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Respuesta por defecto de la app: orjson es varias veces más rápido que `json.dumps` con la misma salida
+_BaseJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+class DefaultJSONResponse(_BaseJSONResponse):
+    """Respuesta JSON de los endpoints con `response_model`: registra el tiempo de codificar el cuerpo (ver metrics.py)."""
+
+    def render(self, content: Any) -> bytes:
+        inicio = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            record_serialization(time.perf_counter() - inicio)
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.columnar+json"
+MSGPACK = "application/msgpack"
+# Nombres alternativos con los que los clientes piden MessagePack
+_ALIASES = {"application/x-msgpack": MSGPACK}
+# Documentación OpenAPI de las representaciones alternativas de los listados (`responses=` del endpoint)
+LIST_FORMATS_DOC = {200: {"content": {COLUMNAR_JSON: {}, MSGPACK: {}}}}
+
+def dumps(contenido: Any) -> bytes:
+    return orjson.dumps(contenido) if orjson is not None else to_json(contenido)
+
+def _msgpack_default(valor):
+    # Las fechas viajan como texto ISO 8601, igual que en JSON (son naive: el tipo Timestamp exige zona horaria)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable en MessagePack: {type(valor).__name__}")
+
+# Negociación
+def quality_values(header: str) -> Dict[str, float]:
+    """Valores de un header `Accept` / `Accept-Encoding` con su q-value (`{"br": 1.0, "gzip": 0.8}`)."""
+    pesos: Dict[str, float] = {}
+    for parte in header.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.strip().partition("=")
+            if clave.strip() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        if nombre:
+            pesos[nombre.strip().lower()] = q
+    return pesos
+
+def available_formats() -> List[str]:
+    """Representaciones de los listados, en orden de preferencia del servidor."""
+    return [JSON, COLUMNAR_JSON] + ([MSGPACK] if msgpack is not None else [])
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Representación del listado según `Accept`: para cada formato se toma el q-value del rango más específico
+    que lo incluye (`tipo/subtipo`, `tipo/*`, `*/*`). Sin `Accept` o sin coincidencias, JSON.
+    """
+    if not accept:
+        return JSON
+    pesos = {_ALIASES.get(rango, rango): q for rango, q in quality_values(accept).items()}
+    elegido, mejor = JSON, 0.0
+    for formato in available_formats():
+        tipo = formato.split("/")[0]
+        q = next((pesos[r] for r in (formato, f"{tipo}/*", "*/*") if r in pesos), 0.0)
+        if q > mejor:
+            elegido, mejor = formato, q
+    return elegido
+
+# Respuestas
+def rows_response(filas: Sequence[Row], columnas: List[str], response: Response, formato: str = JSON) -> Response:
+    """Respuesta con las filas del listado (en el orden de `columnas`) en `formato`, con los headers ya puestos en `response`."""
+    inicio = time.perf_counter()
+    if formato == COLUMNAR_JSON:
+        cuerpo = dumps({"columnas": columnas, "filas": [tuple(fila) for fila in filas]})
+    elif formato == MSGPACK:
+        cuerpo = msgpack.packb([dict(zip(columnas, fila)) for fila in filas], default=_msgpack_default)
+    else:
+        cuerpo = dumps([dict(zip(columnas, fila)) for fila in filas])
+    record_serialization(time.perf_counter() - inicio)
+    # `response` es la respuesta temporal que FastAPI inyecta al endpoint: sólo se copian los headers agregados
+    headers = {clave: valor for clave, valor in response.headers.items() if clave != "content-length"}
+    headers["Vary"] = "Accept"
+    return Response(cuerpo, media_type=formato, headers=headers)
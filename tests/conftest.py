@@ -0,0 +1,40 @@
+"""Fixtures de las pruebas: la app completa sobre una base SQLite temporal con datos de ejemplo."""
+import os
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Datos de ejemplo (ver benchmarks/seed.py): más autos que el `limit` más grande que se pide en las pruebas
+AUTOS = 250
+VENTAS = 2_000
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    """`TestClient` con el lifespan de la app ya corrido (migraciones) y la base cargada."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path_factory.mktemp('db') / 'pruebas.db'}"
+    os.environ["CACHE_BACKEND"] = "none"
+    from fastapi.testclient import TestClient
+    from database import get_engine
+    from main import app
+    from benchmarks.seed import seed
+
+    with TestClient(app) as client:
+        seed(get_engine(), AUTOS, VENTAS)
+        yield client
+
+class ContadorDeSentencias:
+    """Cuenta los eventos `before_cursor_execute` de todos los motores (la primaria y las réplicas)."""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.total += 1
+
+@pytest.fixture
+def sentencias():
+    contador = ContadorDeSentencias()
+    # Escucha a nivel de clase: cubre los motores que la app crea de forma diferida
+    event.listen(Engine, "before_cursor_execute", contador)
+    yield contador
+    event.remove(Engine, "before_cursor_execute", contador)
@@ -0,0 +1,48 @@
+"""Actualizaciones concurrentes: el compare-and-swap de `If-Match` rechaza con 412 una versión vieja (lost update)."""
+import pytest
+
+# Sin compresión: un ETag débil (`W/`) no coincide con `If-Match`
+SIN_COMPRESION = {"accept-encoding": "identity"}
+
+@pytest.fixture
+def auto(client):
+    r = client.post("/autos/", json={"marca": "Fiat", "modelo": "Uno", "anio": 2015, "numero_chasis": "IFMATCH0001"})
+    assert r.status_code == 201, r.text
+    yield r.json()
+    client.delete(f"/autos/{r.json()['id']}")
+
+@pytest.fixture
+def venta(client, auto):
+    r = client.post("/ventas/", json={"nombre_comprador": "Ana", "precio": 1000, "fecha_venta": "2021-06-01T00:00:00", "auto_id": auto["id"]})
+    assert r.status_code == 201, r.text
+    return r.json()
+
+@pytest.mark.parametrize("recurso, cambio_a, cambio_b", [
+    ("auto", {"modelo": "Palio"}, {"modelo": "Siena"}),
+    ("venta", {"precio": 2000}, {"precio": 3000}),
+])
+def test_version_vieja_responde_412(request, client, recurso, cambio_a, cambio_b):
+    url = f"/{recurso}s/{request.getfixturevalue(recurso)['id']}"
+    # Dos clientes leen la misma versión
+    etag = client.get(url, headers=SIN_COMPRESION).headers["etag"]
+
+    primero = client.put(url, json=cambio_a, headers={"If-Match": etag})
+    assert primero.status_code == 200, primero.text
+    assert primero.headers["etag"] != etag
+
+    # El segundo escribe sobre la versión que leyó: no pisa el cambio del primero
+    segundo = client.put(url, json=cambio_b, headers={"If-Match": etag})
+    assert segundo.status_code == 412, segundo.text
+    actual = client.get(url, headers=SIN_COMPRESION)
+    assert actual.json() | cambio_a == actual.json()
+    assert actual.headers["etag"] == primero.headers["etag"]
+
+    # Con la versión nueva sí se aplica
+    reintento = client.put(url, json=cambio_b, headers={"If-Match": primero.headers["etag"]})
+    assert reintento.status_code == 200, reintento.text
+
+def test_etag_debil_no_coincide(client, auto):
+    url = f"/autos/{auto['id']}"
+    etag = client.get(url, headers=SIN_COMPRESION).headers["etag"]
+    r = client.put(url, json={"modelo": "Palio"}, headers={"If-Match": f"W/{etag}"})
+    assert r.status_code == 412, r.text
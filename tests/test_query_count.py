@@ -0,0 +1,16 @@
+"""Regresión de consultas N+1: la cantidad de sentencias de un request no depende de las filas que devuelve."""
+import pytest
+from benchmarks.query_count_check import ENDPOINTS
+
+@pytest.mark.parametrize("ruta, maximo", ENDPOINTS)
+def test_endpoint_sin_n_mas_uno(client, sentencias, ruta, maximo):
+    sentencias.total = 0
+    r = client.get(ruta)
+    assert r.status_code == 200, r.text
+    assert sentencias.total <= maximo, f"{ruta}: {sentencias.total} sentencias (máximo {maximo}): ¿N+1?"
+
+def test_autos_con_ventas_trae_la_pagina_completa(client):
+    # Sin esto la prueba anterior pasaría con una página vacía
+    autos = client.get("/autos/with-ventas?limit=200").json()
+    assert len(autos) == 200
+    assert any(auto["ventas"] for auto in autos)
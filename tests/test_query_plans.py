@@ -0,0 +1,11 @@
+"""Planes de las consultas de los repositorios (ver benchmarks/explain_check.py): usan índices, sin recorrer tablas."""
+from benchmarks.explain_check import _consultas, check_plans
+
+def test_consultas_usan_indices(client):
+    from database import get_engine
+
+    resultados = check_plans(get_engine())
+    # Cada consulta emitió al menos un SELECT: si no, la verificación no cubriría nada
+    assert {nombre for nombre, _, _ in resultados} == {nombre for nombre, _ in _consultas()}
+    fallas = [f"{nombre}: {plan} ({'; '.join(problemas)})" for nombre, plan, problemas in resultados if problemas]
+    assert not fallas, "consultas sin un índice adecuado:\n" + "\n".join(fallas)
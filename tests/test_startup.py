@@ -0,0 +1,30 @@
+"""Arranque en frío de un worker (ver benchmarks/startup_profile.py): dentro del presupuesto y sin I/O al importar."""
+import os
+import statistics
+import subprocess
+import sys
+import pytest
+from benchmarks.startup_profile import RAIZ, cold_start
+
+# Mediana del arranque en frío (import, lifespan y primer request), en ms. STARTUP_BUDGET_MS lo ajusta al runner de CI
+PRESUPUESTO_MS = float(os.environ.get("STARTUP_BUDGET_MS", 2500))
+REPETICIONES = 3
+
+@pytest.fixture(scope="module")
+def db_url(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('startup') / 'startup.db'}"
+    # Esquema al día: el modo verify no inicia sobre una base sin migrar
+    subprocess.run([sys.executable, "migrations.py"], cwd=RAIZ, env={**os.environ, "DATABASE_URL": url}, check=True, capture_output=True)
+    return url
+
+@pytest.mark.parametrize("modo", ["migrate", "verify"])
+def test_arranque_en_frio_dentro_del_presupuesto(db_url, modo):
+    mediana = statistics.median(cold_start(db_url, modo)["total"] for _ in range(REPETICIONES)) * 1000
+    assert mediana <= PRESUPUESTO_MS, f"arranque en frío ({modo}): {mediana:.0f} ms, presupuesto {PRESUPUESTO_MS:.0f} ms"
+
+def test_importar_main_no_lee_la_configuracion():
+    # Sin DATABASE_URL `get_settings()` falla: el import no debe llamarla
+    entorno = {k: v for k, v in os.environ.items() if k != "DATABASE_URL"}
+    codigo = "import main, config; assert config.get_settings.cache_info().currsize == 0"
+    r = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=entorno, capture_output=True, text=True)
+    assert r.returncode == 0, r.stderr
@@ -1,22 +1,36 @@
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, Query, status
-from sqlmodel import Session
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, status, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from models import (
-    VentaCreate, VentaResponse, VentaUpdate, VentaResponseWithAuto
+    VentaCreate, VentaResponse, VentaUpdate, VentaResponseWithAuto, BulkImportResult,
+    VentasPorMarca, VentasPorModelo, VentasMensuales, VentaBatchGet, VentaBatchItem
 )
 from repository import (
-    PostgresVentaRepository, NotFoundException, IntegrityError
+    NotFoundException, IntegrityError, PreconditionFailedException, ConflictException
 )
-from database import get_session
+from database import get_async_session
+from replicas import get_read_session
+from bulk import detect_format, import_rows
+from export import export_response
+from http_cache import conditional, entity_etag, collection_etag, if_match_versions
+from idempotency import IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, idempotent
+from serialization import LIST_FORMATS_DOC, negotiate_format, rows_response
+from pagination import set_total
+from analytics import ventas_by_marca, ventas_by_modelo, ventas_monthly
+from async_repository import AsyncPostgresVentaRepository
 
 router = APIRouter(prefix="/ventas", tags=["Ventas"])
 
 
-def get_venta_repo(session: Session = Depends(get_session)) -> PostgresVentaRepository:
+def get_venta_repo(
+    session: AsyncSession = Depends(get_async_session),
+    read_session: AsyncSession = Depends(get_read_session)
+) -> AsyncPostgresVentaRepository:
     """Proporciona una instancia del repositorio de Venta."""
-    return PostgresVentaRepository(session)
+    return AsyncPostgresVentaRepository(session, read_session)
 
 # Endpoints
 
@@ -26,89 +40,242 @@ def get_venta_repo(session: Session = Depends(get_session)) -> PostgresVentaRepo
     status_code=status.HTTP_201_CREATED,
     summary="Crear una nueva Venta"
 )
-def create_venta(
+async def create_venta(
     venta: VentaCreate,
-    repo: PostgresVentaRepository = Depends(get_venta_repo)
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, min_length=1, max_length=MAX_KEY_LENGTH, description="Clave única de la operación: los reintentos con la misma clave reciben la respuesta original"),
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
 ):
     """
     Registra una nueva venta de vehículo.
 
     - **Valida** que el `auto_id` referencie un auto existente.
     - **Valida** que el precio sea mayor a 0 y la fecha no sea futura.
+    - Con `Idempotency-Key`, un reintento no vuelve a registrar la venta: recibe la respuesta original.
     """
-    try:
-        return repo.create(venta)
-    except (NotFoundException, IntegrityError) as e:
-        raise e
+    async def crear(on_insert=None):
+        try:
+            return await repo.create(venta, on_insert)
+        except ValueError as e:
+            # Como en `POST /autos/`: los errores inesperados se propagan (5xx) y liberan la clave de idempotencia
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return await idempotent(idempotency_key, "ventas", venta, crear, VentaResponse)
+
+@router.post(
+    "/bulk",
+    response_model=BulkImportResult,
+    summary="Importación Masiva de Ventas"
+)
+async def bulk_import_ventas(
+    request: Request,
+    formato: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Formato del archivo. Por defecto se deduce del `Content-Type`"),
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
+):
+    """
+    Importa ventas desde un archivo CSV (con encabezado) o NDJSON enviado como cuerpo del request.
+
+    - **Valida** cada fila con las mismas reglas que `POST /ventas/`.
+    - **Inserta** en lotes y verifica la existencia de los `auto_id` por lote.
+    - Las filas con error se informan en `errores` (número de línea y motivo) sin abortar el resto del archivo.
+    """
+    return await import_rows(
+        request.stream(),
+        detect_format(request.headers.get("content-type"), formato),
+        VentaCreate,
+        repo.bulk_create
+    )
+
+@router.post(
+    "/batch-get",
+    response_model=List[VentaBatchItem],
+    summary="Obtener Varias Ventas por ID"
+)
+async def batch_get_ventas(
+    consulta: VentaBatchGet,
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
+):
+    """
+    Obtiene varias ventas en un solo request (hasta 500 `ids`).
+
+    - Los resultados respetan el orden de los ids pedidos.
+    - Los ids inexistentes se informan con `encontrado: false`.
+    """
+    ventas = await repo.get_many(consulta.ids)
+    return [VentaBatchItem(clave=id, encontrado=venta is not None, venta=venta) for id, venta in zip(consulta.ids, ventas)]
 
 @router.get(
     "/",
     response_model=List[VentaResponse],
+    responses=LIST_FORMATS_DOC,
     summary="Listar Ventas con Paginación y Filtros"
 )
-def list_ventas(
-    repo: PostgresVentaRepository = Depends(get_venta_repo),
+async def list_ventas(
+    request: Request,
+    response: Response,
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo),
     skip: int = Query(0, ge=0, description="Número de registros a omitir (Paginación)"),
     limit: int = Query(100, le=1000, description="Número máximo de registros a devolver"),
     min_precio: Optional[float] = Query(None, ge=0, description="Filtro por precio mínimo"),
     max_precio: Optional[float] = Query(None, ge=0, description="Filtro por precio máximo"),
     fecha_inicio: Optional[datetime] = Query(None, description="Filtro por rango de fechas (Inicio)"),
     fecha_fin: Optional[datetime] = Query(None, description="Filtro por rango de fechas (Fin)"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la página siguiente (header `X-Next-Cursor`). Si se envía, se ignora `skip`"),
+    include_total: bool = Query(False, description="Informar el total de ventas del filtro en el header `X-Total-Count`"),
 ):
     """
     Obtiene la lista de ventas con paginación y filtros por rango de precios o fechas.
+
+    - **Orden:** por `fecha_venta` y luego `id`.
+    - **Paginación por cursor:** si hay más resultados, el header `X-Next-Cursor` trae el cursor de la página siguiente.
+    - **ETag:** con `If-None-Match` responde `304 Not Modified` si ninguna venta cambió, sin leer la página. Con
+      filtros y sin `include_total`, el ETag cubre toda la tabla (no cuenta las filas del filtro).
+    - Las filas se leen sólo con las columnas de la respuesta y se serializan directamente (sin entidades ORM).
+    - **Total:** con `include_total=true`, `X-Total-Count` trae el total del filtro. Si el conteo exacto excede
+      el presupuesto de tiempo, es una estimación y `X-Total-Count-Exact` vale `false`.
+    - **Formato:** según `Accept`, JSON (por defecto), JSON columnar (`application/vnd.columnar+json`) o MessagePack (`application/msgpack`).
     """
-    return repo.get_all(
-        skip=skip,
-        limit=limit,
-        min_precio=min_precio,
-        max_precio=max_precio,
-        fecha_inicio=fecha_inicio,
-        fecha_fin=fecha_fin
+    filtros = {"min_precio": min_precio, "max_precio": max_precio, "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
+    version = await repo.collection_version(**filtros, with_total=include_total)
+    formato = negotiate_format(request.headers.get("accept"))
+    # Cada representación es una variante distinta del recurso: su ETag también
+    if not_modified := conditional(request, response, collection_etag(*version.validador, formato)):
+        return not_modified
+    if include_total:
+        total = version.total if version.total is not None else await repo.estimate_count(**filtros)
+        set_total(response, total, exacto=version.total is not None)
+    ventas = await repo.get_rows(skip=skip, limit=limit, cursor=cursor, **filtros)
+    next_cursor = repo.next_cursor(ventas, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows_response(ventas, list(VentaResponse.model_fields), response, formato)
+
+@router.get(
+    "/search",
+    response_model=List[VentaResponse],
+    summary="Búsqueda Aproximada de Ventas por Comprador"
+)
+async def search_ventas(
+    q: str = Query(..., min_length=1, description="Texto a buscar en el nombre del comprador"),
+    limit: int = Query(20, ge=1, le=100, description="Número máximo de resultados"),
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
+):
+    """Busca ventas por nombre de comprador (tolera errores de tipeo), ordenadas por similitud."""
+    return await repo.search(q, limit)
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    summary="Exportar Ventas (NDJSON o CSV)"
+)
+async def export_ventas(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato de salida"),
+    min_precio: Optional[float] = Query(None, ge=0, description="Filtro por precio mínimo"),
+    max_precio: Optional[float] = Query(None, ge=0, description="Filtro por precio máximo"),
+    fecha_inicio: Optional[datetime] = Query(None, description="Filtro por rango de fechas (Inicio)"),
+    fecha_fin: Optional[datetime] = Query(None, description="Filtro por rango de fechas (Fin)"),
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
+):
+    """
+    Exporta todas las ventas que cumplen los filtros (mismos que el listado), ordenadas por `fecha_venta`, en streaming.
+    Las filas se leen de la base en lotes con un cursor del servidor, por lo que el consumo de memoria no depende del total exportado.
+    """
+    return export_response(
+        repo.export(min_precio=min_precio, max_precio=max_precio, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin),
+        formato,
+        list(VentaResponse.model_fields),
+        "ventas"
     )
 
+@router.get(
+    "/stats/by-marca",
+    response_model=List[VentasPorMarca],
+    summary="Estadísticas de Ventas por Marca"
+)
+async def stats_by_marca(
+    percentiles: bool = Query(False, description="Incluir percentiles 50 y 90 del precio (se calculan sobre todas las ventas)"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Cantidad, total facturado y precio promedio por marca, leídos de los resúmenes incrementales."""
+    return await session.run_sync(lambda s: ventas_by_marca(s, percentiles))
+
+@router.get(
+    "/stats/by-modelo",
+    response_model=List[VentasPorModelo],
+    summary="Estadísticas de Ventas por Modelo"
+)
+async def stats_by_modelo(
+    marca: Optional[str] = Query(None, description="Filtrar por marca (exacta)"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Cantidad, total facturado y precio promedio por marca y modelo."""
+    return await session.run_sync(lambda s: ventas_by_modelo(s, marca))
+
+@router.get(
+    "/stats/monthly",
+    response_model=List[VentasMensuales],
+    summary="Estadísticas de Ventas por Mes"
+)
+async def stats_monthly(
+    desde: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes inicial (YYYY-MM)"),
+    hasta: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes final (YYYY-MM)"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Cantidad, total facturado y precio promedio por mes."""
+    return await session.run_sync(lambda s: ventas_monthly(s, desde, hasta))
+
 @router.get(
     "/{venta_id}",
     response_model=VentaResponse,
     summary="Obtener Venta por ID"
 )
-def get_venta(
+async def get_venta(
     venta_id: int,
-    repo: PostgresVentaRepository = Depends(get_venta_repo)
+    request: Request,
+    response: Response,
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
 ):
-    """Busca y retorna una venta específica por su ID."""
+    """Busca y retorna una venta específica por su ID. Soporta `If-None-Match` / `If-Modified-Since` (304)."""
     try:
-        return repo.get_by_id(venta_id)
+        venta = await repo.get_by_id(venta_id)
     except NotFoundException as e:
         raise e
+    return conditional(request, response, entity_etag(venta), venta.updated_at) or venta
 
 @router.put(
     "/{venta_id}",
     response_model=VentaResponse,
     summary="Actualizar Venta"
 )
-def update_venta(
+async def update_venta(
     venta_id: int,
     venta_update: VentaUpdate,
-    repo: PostgresVentaRepository = Depends(get_venta_repo)
+    request: Request,
+    response: Response,
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
 ):
-    """Actualiza la información de una venta existente."""
+    """
+    Actualiza la información de una venta existente. Con `If-Match` (el `ETag` de un GET) la actualización sólo se
+    aplica si nadie modificó la venta desde esa lectura; si no, responde `412 Precondition Failed`.
+    La respuesta incluye el `ETag` de la nueva versión.
+    """
     try:
-        return repo.update(venta_id, venta_update)
-    except NotFoundException as e:
+        venta = await repo.update(venta_id, venta_update, if_match_versions(request))
+    except (NotFoundException, IntegrityError, PreconditionFailedException, ConflictException) as e:
         raise e
+    response.headers["ETag"] = entity_etag(venta)
+    return venta
 
 @router.delete(
     "/{venta_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Eliminar Venta"
 )
-def delete_venta(
+async def delete_venta(
     venta_id: int,
-    repo: PostgresVentaRepository = Depends(get_venta_repo)
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
 ):
     """Elimina una venta por su ID."""
-    if not repo.delete(venta_id):
+    if not await repo.delete(venta_id):
         raise NotFoundException(f"Venta con ID {venta_id} no encontrada para eliminar")
     return
 
@@ -117,37 +284,37 @@ def delete_venta(
     response_model=List[VentaResponse],
     summary="Ventas por ID de Auto"
 )
-def get_ventas_by_auto_id(
+async def get_ventas_by_auto_id(
     auto_id: int,
-    repo: PostgresVentaRepository = Depends(get_venta_repo)
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
 ):
     """Lista todas las ventas asociadas a un ID de auto específico."""
-    return repo.get_by_auto_id(auto_id)
+    return await repo.get_by_auto_id(auto_id)
 
 @router.get(
     "/comprador/{nombre}",
     response_model=List[VentaResponse],
     summary="Ventas por Nombre de Comprador"
 )
-def get_ventas_by_comprador(
+async def get_ventas_by_comprador(
     nombre: str,
-    repo: PostgresVentaRepository = Depends(get_venta_repo)
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
 ):
     """Busca ventas por el nombre del comprador (búsqueda parcial)."""
-    return repo.get_by_comprador(nombre)
+    return await repo.get_by_comprador(nombre)
 
 @router.get(
     "/{venta_id}/with-auto",
     response_model=VentaResponseWithAuto,
     summary="Venta con Información de Auto"
 )
-def get_venta_with_auto(
+async def get_venta_with_auto(
     venta_id: int,
-    repo: PostgresVentaRepository = Depends(get_venta_repo)
+    repo: AsyncPostgresVentaRepository = Depends(get_venta_repo)
 ):
     """Retorna una venta junto con la información completa del auto vendido."""
     try:
-        venta = repo.get_by_id(venta_id)
+        venta = await repo.get_with_auto(venta_id)
         return venta
     except NotFoundException as e:
         raise e
\ No newline at end of file